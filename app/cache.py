@@ -0,0 +1,258 @@
+# cache.py
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+from app.metrics import computedGauge, counter, gauge, hitRatio
+
+load_dotenv()
+
+CACHE_REQUESTS = counter(
+    "cache_requests_total",
+    "Cache lookups by result: hit, miss or coalesced (joined an in-flight miss).",
+    ["cache", "result"],
+)
+CACHE_EVICTIONS = counter(
+    "cache_evictions_total", "Entries evicted for size or TTL.", ["cache"]
+)
+CACHE_ENTRIES = gauge("cache_entries", "Entries currently cached.", ["cache"])
+SEMANTIC_CACHE_REQUESTS = counter(
+    "semantic_cache_requests_total",
+    "Semantic answer cache lookups by intent and result (hit or miss).",
+    ["intent", "result"],
+)
+# A coalesced lookup didn't start a computation, it counts as a hit.
+CACHE_HIT_RATIO = computedGauge(
+    "cache_hit_ratio",
+    "Share of cache lookups answered without a new computation.",
+    ["cache"],
+    hitRatio(CACHE_REQUESTS, hits=("hit", "coalesced")),
+)
+SEMANTIC_CACHE_HIT_RATIO = computedGauge(
+    "semantic_cache_hit_ratio",
+    "Share of semantic answer cache lookups that hit.",
+    ["intent"],
+    hitRatio(SEMANTIC_CACHE_REQUESTS),
+)
+
+
+def normalizeQuery(text: str) -> str:
+    """Case and whitespace insensitive cache key for user questions."""
+    return " ".join(text.lower().split()).strip(" ?!.")
+
+
+class AsyncCache:
+    """
+    Bounded LRU cache with TTL for async computations.
+    Concurrent misses of one key share a single computation (single flight),
+    the computation runs as its own task so a cancelled caller doesn't cancel it.
+    """
+
+    def __init__(self, name: str, maxSize: int = 10000, ttl: float = 3600.0) -> None:
+        self.name = name
+        self.__maxSize = max(1, maxSize)
+        self.__ttl = ttl
+        self.__entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.__inFlight: Dict[Hashable, asyncio.Task] = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.monotonic():
+                del self.__entries[key]
+                CACHE_EVICTIONS.inc(cache=self.name)
+                return default
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + self.__ttl, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__maxSize:
+                self.__entries.popitem(last=False)
+                CACHE_EVICTIONS.inc(cache=self.name)
+            CACHE_ENTRIES.set(len(self.__entries), cache=self.name)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            CACHE_ENTRIES.set(0, cache=self.name)
+
+    async def getOrCompute(
+        self, key: Hashable, factory: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+            return value
+
+        task = self.__inFlight.get(key)
+        if task is not None:
+            CACHE_REQUESTS.inc(cache=self.name, result="coalesced")
+            return await asyncio.shield(task)
+
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        task = asyncio.ensure_future(factory())
+        self.__inFlight[key] = task
+
+        def done(t: asyncio.Task) -> None:
+            self.__inFlight.pop(key, None)
+            if not t.cancelled() and t.exception() is None:
+                self.set(key, t.result())
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+
+class SemanticPartition:
+    """
+    Answers of one (intent, version) as rows of a preallocated matrix, used
+    as a ring: each store writes one row in place, the oldest row is
+    overwritten once `capacity` rows are filled.
+    """
+
+    __slots__ = ("capacity", "matrix", "expires", "answers", "inserted", "live")
+
+    def __init__(self, dim: int, capacity: int) -> None:
+        self.capacity = capacity
+        rows = min(capacity, 64)
+        self.matrix = np.zeros((rows, dim), dtype=np.float32)
+        # 0 marks an empty or evicted row.
+        self.expires = np.zeros(rows, dtype=np.float64)
+        self.answers: list[Optional[str]] = [None] * rows
+        self.inserted = 0
+        self.live = 0
+
+    def __grow(self) -> None:
+        rows = min(self.capacity, 2 * len(self.matrix))
+        matrix = np.zeros((rows, self.matrix.shape[1]), dtype=np.float32)
+        matrix[: len(self.matrix)] = self.matrix
+        expires = np.zeros(rows, dtype=np.float64)
+        expires[: len(self.expires)] = self.expires
+        self.matrix, self.expires = matrix, expires
+        self.answers.extend([None] * (rows - len(self.answers)))
+
+    def store(self, vector: np.ndarray, answer: str, expiresAt: float) -> int:
+        """Write one row, returns the number of live entries it overwrote (0 or 1)."""
+        row = self.inserted % self.capacity
+        if row >= len(self.matrix):
+            self.__grow()
+        evicted = 1 if self.expires[row] > 0 else 0
+        self.matrix[row] = vector
+        self.expires[row] = expiresAt
+        self.answers[row] = answer
+        self.inserted += 1
+        self.live += 1 - evicted
+        return evicted
+
+    def expire(self, now: float) -> int:
+        rows = min(self.inserted, len(self.matrix))
+        expired = np.flatnonzero((self.expires[:rows] > 0) & (self.expires[:rows] < now))
+        for row in expired:
+            self.expires[row] = 0.0
+            self.answers[row] = None
+        self.live -= len(expired)
+        return len(expired)
+
+    def best(self, vector: np.ndarray) -> tuple[float, Optional[str]]:
+        rows = min(self.inserted, len(self.matrix))
+        if not self.live or not rows:
+            return -1.0, None
+        scores = self.matrix[:rows] @ vector
+        scores[self.expires[:rows] == 0] = -np.inf
+        row = int(np.argmax(scores))
+        return float(scores[row]), self.answers[row]
+
+
+class SemanticCache:
+    """
+    Previous answers looked up by query embedding similarity.
+    Entries are partitioned by (intent, document version), a lookup returns
+    the best answer whose cosine similarity is at least `threshold`.
+    Oldest entries are evicted past `maxSize`, expired ones on lookup.
+    """
+
+    def __init__(
+        self,
+        intents: set[str],
+        threshold: float = 0.95,
+        maxSize: int = 5000,
+        ttl: float = 3600.0,
+    ) -> None:
+        self.__intents = intents
+        self.__threshold = threshold
+        self.__maxSize = max(1, maxSize)
+        self.__ttl = ttl
+        self.__partitions: Dict[tuple, SemanticPartition] = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def fromEnv(cls) -> "SemanticCache":
+        intents = os.getenv("SEMANTIC_CACHE_INTENTS", "Support,General")
+        return cls(
+            intents={i.strip() for i in intents.split(",") if i.strip()},
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            maxSize=int(os.getenv("SEMANTIC_CACHE_SIZE", "5000")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+        )
+
+    def enabled(self, intent: str) -> bool:
+        return intent in self.__intents
+
+    @staticmethod
+    def __unit(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, intent: str, version: int, embedding: list[float]) -> Optional[str]:
+        vector = self.__unit(embedding)
+        answer = None
+        with self.__lock:
+            partition = self.__partitions.get((intent, version))
+            if partition is not None and partition.matrix.shape[1] == len(vector):
+                expired = partition.expire(time.monotonic())
+                if expired:
+                    CACHE_EVICTIONS.inc(expired, cache="semantic")
+                    self.__countEntries()
+                score, best = partition.best(vector)
+                if score >= self.__threshold:
+                    answer = best
+        SEMANTIC_CACHE_REQUESTS.inc(intent=intent, result="hit" if answer else "miss")
+        return answer
+
+    def store(self, intent: str, version: int, embedding: list[float], answer: str) -> None:
+        key = (intent, version)
+        vector = self.__unit(embedding)
+        with self.__lock:
+            # Answers of older document versions can never be hit again.
+            for staleKey in [k for k in self.__partitions if k[0] == intent and k[1] != version]:
+                del self.__partitions[staleKey]
+            partition = self.__partitions.get(key)
+            if partition is None or partition.matrix.shape[1] != len(vector):
+                partition = self.__partitions[key] = SemanticPartition(
+                    len(vector), self.__maxSize
+                )
+            if partition.store(vector, answer, time.monotonic() + self.__ttl):
+                CACHE_EVICTIONS.inc(cache="semantic")
+            self.__countEntries()
+
+    def __countEntries(self) -> None:
+        CACHE_ENTRIES.set(sum(p.live for p in self.__partitions.values()), cache="semantic")
+
+
+SEMANTIC_CACHE = SemanticCache.fromEnv()
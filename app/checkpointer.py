@@ -0,0 +1,300 @@
+# checkpointer.py
+
+import asyncio
+import copy
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional, Sequence
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from app.metrics import counter, histogram
+from app.sqlitePool import SqlitePool
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Pydantic models stored inside graph state and interrupts.
+STATE_TYPES = [
+    ("app.utility", "OrderDetails"),
+    ("app.utility", "InterruptState"),
+]
+
+CHECKPOINT_COMMITS = counter(
+    "checkpoint_commits_total", "Checkpoint transactions committed."
+)
+CHECKPOINT_BATCH_SIZE = histogram(
+    "checkpoint_batch_size",
+    "Checkpoint writes grouped into one transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+CHECKPOINT_PRUNED = counter(
+    "checkpoint_pruned_total", "Old checkpoints removed by the background pruner."
+)
+
+
+class BatchedSqliteSaver(AsyncSqliteSaver):
+    """
+    AsyncSqliteSaver on a shared SqlitePool with group commit.
+    Checkpoint and pending writes are queued and flushed by one writer task,
+    everything queued within `batchWindow` seconds (max `batchSize` writes)
+    lands in a single transaction. Callers still wait for their own commit.
+    Reads go through the pool readers, old checkpoints are pruned in the background.
+    """
+
+    def __init__(
+        self,
+        pool: SqlitePool,
+        *,
+        batchWindow: float = 0.002,
+        batchSize: int = 128,
+        keepCheckpoints: int = 20,
+        pruneInterval: float = 300.0,
+    ) -> None:
+        super().__init__(
+            pool.writer,
+            serde=JsonPlusSerializer(allowed_msgpack_modules=STATE_TYPES),
+        )
+        self.__pool = pool
+        self.__batchWindow = batchWindow
+        self.__batchSize = batchSize
+        self.__keepCheckpoints = keepCheckpoints
+        self.__pruneInterval = pruneInterval
+        self.__queue: asyncio.Queue[tuple[str, list[tuple], asyncio.Future]] = (
+            asyncio.Queue()
+        )
+        self.__flusher: Optional[asyncio.Task] = None
+        self.__pruner: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.setup()
+        self.__flusher = asyncio.create_task(self.__flushLoop())
+        if self.__pruneInterval > 0:
+            self.__pruner = asyncio.create_task(self.__pruneLoop())
+
+    async def stop(self) -> None:
+        for task in (self.__pruner, self.__flusher):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        # Flush anything queued after the writer task stopped.
+        batch = []
+        while not self.__queue.empty():
+            batch.append(self.__queue.get_nowait())
+        if batch:
+            await self.__commit(batch)
+
+    async def __enqueue(self, sql: str, rows: list[tuple]) -> None:
+        future = asyncio.get_running_loop().create_future()
+        if self.__flusher is None or self.__flusher.done():
+            # Not started (or stopped), write through.
+            await self.__commit([(sql, rows, future)])
+        else:
+            self.__queue.put_nowait((sql, rows, future))
+        await future
+
+    async def __flushLoop(self) -> None:
+        while True:
+            batch = [await self.__queue.get()]
+            if self.__batchWindow > 0:
+                await asyncio.sleep(self.__batchWindow)
+            while len(batch) < self.__batchSize and not self.__queue.empty():
+                batch.append(self.__queue.get_nowait())
+            await self.__commit(batch)
+
+    async def __commit(self, batch: list[tuple[str, list[tuple], asyncio.Future]]) -> None:
+        try:
+            async with self.lock:
+                for sql, rows, _ in batch:
+                    await self.conn.executemany(sql, rows)
+                await self.conn.commit()
+            CHECKPOINT_COMMITS.inc()
+            CHECKPOINT_BATCH_SIZE.observe(len(batch))
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+        except Exception as err:
+            logger.exception(
+                "Checkpointer level exception. %s", err, extra={"method": "commit"}
+            )
+            try:
+                await self.conn.rollback()
+            except Exception:
+                pass
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+
+    async def __pruneLoop(self) -> None:
+        while True:
+            await asyncio.sleep(self.__pruneInterval)
+            try:
+                await self.prune()
+            except Exception as err:
+                logger.exception(
+                    "Checkpointer level exception. %s", err, extra={"method": "prune"}
+                )
+
+    async def prune(self) -> int:
+        """Keep only the newest `keepCheckpoints` checkpoints of every thread."""
+        async with self.lock:
+            cursor = await self.conn.execute(
+                """
+DELETE FROM checkpoints WHERE rowid IN (
+    SELECT rowid FROM (
+        SELECT rowid, ROW_NUMBER() OVER (
+            PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+        ) AS rn
+        FROM checkpoints
+    ) WHERE rn > ?
+);
+""",
+                (self.__keepCheckpoints,),
+            )
+            removed = cursor.rowcount
+            await self.conn.execute(
+                """
+DELETE FROM writes WHERE NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = writes.thread_id
+    AND c.checkpoint_ns = writes.checkpoint_ns
+    AND c.checkpoint_id = writes.checkpoint_id
+);
+"""
+            )
+            await self.conn.commit()
+        if removed > 0:
+            CHECKPOINT_PRUNED.inc(removed)
+            logger.info("Checkpointer pruned %s old checkpoints", removed)
+        return removed
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """AsyncSqliteSaver.aget_tuple, served by a pool reader instead of the writer."""
+        await self.setup()
+        async with self.__pool.reader() as conn:
+            # Same saver bound to the reader, its own lock so reads don't queue
+            # behind the writer.
+            reader = copy.copy(self)
+            reader.conn = conn
+            reader.lock = asyncio.Lock()
+            return await super(BatchedSqliteSaver, reader).aget_tuple(config)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        await self.setup()
+        threadId = str(config["configurable"]["thread_id"])
+        checkpointNs = config["configurable"]["checkpoint_ns"]
+        type_, serializedCheckpoint = self.serde.dumps_typed(checkpoint)
+        serializedMetadata = json.dumps(
+            get_checkpoint_metadata(config, metadata), ensure_ascii=False
+        ).encode("utf-8", "ignore")
+        await self.__enqueue(
+            "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    threadId,
+                    checkpointNs,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serializedCheckpoint,
+                    serializedMetadata,
+                )
+            ],
+        )
+        return {
+            "configurable": {
+                "thread_id": threadId,
+                "checkpoint_ns": checkpointNs,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self.setup()
+        verb = (
+            "INSERT OR REPLACE"
+            if all(w[0] in WRITES_IDX_MAP for w in writes)
+            else "INSERT OR IGNORE"
+        )
+        await self.__enqueue(
+            f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, task_path, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    str(config["configurable"]["thread_id"]),
+                    str(config["configurable"]["checkpoint_ns"]),
+                    str(config["configurable"]["checkpoint_id"]),
+                    task_id,
+                    task_path,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    *self.serde.dumps_typed(value),
+                )
+                for idx, (channel, value) in enumerate(writes)
+            ],
+        )
+
+
+@asynccontextmanager
+async def openCheckpointer() -> AsyncIterator[BaseCheckpointSaver]:
+    """
+    Checkpointer backend selected by CHECKPOINTER env, opened for the app lifespan.
+    `memory`: InMemorySaver, single process only.
+    `sqlite`: BatchedSqliteSaver on CHECKPOINT_DB_PATH.
+    """
+    backend = os.getenv("CHECKPOINTER", "sqlite").lower()
+    if backend == "memory":
+        yield InMemorySaver(
+            serde=JsonPlusSerializer(allowed_msgpack_modules=STATE_TYPES)
+        )
+        return
+    if backend != "sqlite":
+        raise ValueError(f"Unknown checkpointer backend: {backend}")
+
+    pool = SqlitePool(
+        os.getenv("CHECKPOINT_DB_PATH", "sqldb/checkpoints.db"),
+        readers=int(os.getenv("CHECKPOINT_DB_READERS", "4")),
+    )
+    await pool.open()
+    saver = BatchedSqliteSaver(
+        pool,
+        batchWindow=float(os.getenv("CHECKPOINT_BATCH_WINDOW_MS", "2")) / 1000,
+        batchSize=int(os.getenv("CHECKPOINT_BATCH_SIZE", "128")),
+        keepCheckpoints=int(os.getenv("CHECKPOINT_KEEP", "20")),
+        pruneInterval=float(os.getenv("CHECKPOINT_PRUNE_INTERVAL", "300")),
+    )
+    try:
+        await saver.start()
+        logger.info("Sqlite checkpointer ready, %s", pool.path)
+        yield saver
+    finally:
+        await saver.stop()
+        await pool.close()
@@ -0,0 +1,266 @@
+# embeddings.py
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+import httpx
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from app.metrics import counter, histogram
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = histogram(
+    "embedding_batch_size",
+    "Texts sent per embedding request.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+EMBED_REQUEST_SECONDS = histogram(
+    "embedding_request_seconds", "Embedding backend request latency.", ["backend"]
+)
+EMBED_QUERIES = counter(
+    "embedding_queries_total", "Single query embeddings requested.", ["backend"]
+)
+
+
+class QueryBatcher:
+    """
+    Coalesce concurrent single text embeddings into batches.
+    The first pending text opens a `batchWindow` second window, the batch is
+    flushed when the window closes or `maxBatch` texts are pending.
+    """
+
+    def __init__(self, embedBatch, batchWindow: float, maxBatch: int) -> None:
+        self.__embedBatch = embedBatch  # async (list[str]) -> list[list[float]]
+        self.__batchWindow = batchWindow
+        self.__maxBatch = max(1, maxBatch)
+        self.__pending: list[tuple[str, asyncio.Future]] = []
+        self.__timer: Optional[asyncio.TimerHandle] = None
+        self.__inFlight: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        future = asyncio.get_running_loop().create_future()
+        self.__pending.append((text, future))
+        if len(self.__pending) >= self.__maxBatch:
+            self.__flush()
+        elif self.__timer is None:
+            self.__timer = asyncio.get_running_loop().call_later(
+                self.__batchWindow, self.__flush
+            )
+        return await future
+
+    def __flush(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        batch, self.__pending = self.__pending, []
+        if batch:
+            task = asyncio.create_task(self.__send(batch))
+            self.__inFlight.add(task)
+            task.add_done_callback(self.__inFlight.discard)
+
+    async def __send(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        # Identical texts in one window are embedded once.
+        uniqueTexts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(uniqueTexts, await self.__embedBatch(uniqueTexts)))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectors[text])
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+
+
+class TeiEmbeddings(Embeddings):
+    """
+    Text Embeddings Inference (embedding-engine) client over keep-alive pools.
+    Sync calls (ingestion) share one httpx.Client, async query embeddings of
+    all in-flight requests are micro batched into one /embed call.
+    """
+
+    def __init__(
+        self,
+        baseUrl: str,
+        batchWindow: float = 0.005,
+        maxBatch: int = 32,
+        maxConnections: int = 16,
+        timeout: float = 30.0,
+    ) -> None:
+        self.__baseUrl = baseUrl.rstrip("/")
+        self.__maxBatch = max(1, maxBatch)
+        self.__limits = httpx.Limits(
+            max_connections=maxConnections,
+            max_keepalive_connections=maxConnections,
+        )
+        self.__timeout = timeout
+        self.__client: Optional[httpx.Client] = None
+        self.__asyncClient: Optional[httpx.AsyncClient] = None
+        self.__batcher = QueryBatcher(self.__aembedBatch, batchWindow, self.__maxBatch)
+
+    @property
+    def client(self) -> httpx.Client:
+        if self.__client is None:
+            self.__client = httpx.Client(
+                base_url=self.__baseUrl, limits=self.__limits, timeout=self.__timeout
+            )
+        return self.__client
+
+    @property
+    def asyncClient(self) -> httpx.AsyncClient:
+        if self.__asyncClient is None:
+            self.__asyncClient = httpx.AsyncClient(
+                base_url=self.__baseUrl, limits=self.__limits, timeout=self.__timeout
+            )
+        return self.__asyncClient
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for i in range(0, len(texts), self.__maxBatch):
+            batch = texts[i : i + self.__maxBatch]
+            start = time.perf_counter()
+            response = self.client.post("/embed", json={"inputs": batch, "truncate": True})
+            response.raise_for_status()
+            EMBED_REQUEST_SECONDS.observe(time.perf_counter() - start, backend="tei")
+            EMBED_BATCH_SIZE.observe(len(batch))
+            vectors.extend(response.json())
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        EMBED_QUERIES.inc(backend="tei")
+        return self.embed_documents([text])[0]
+
+    async def __aembedBatch(self, texts: list[str]) -> list[list[float]]:
+        start = time.perf_counter()
+        response = await self.asyncClient.post(
+            "/embed", json={"inputs": texts, "truncate": True}
+        )
+        response.raise_for_status()
+        EMBED_REQUEST_SECONDS.observe(time.perf_counter() - start, backend="tei")
+        EMBED_BATCH_SIZE.observe(len(texts))
+        return response.json()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for i in range(0, len(texts), self.__maxBatch):
+            vectors.extend(await self.__aembedBatch(texts[i : i + self.__maxBatch]))
+        return vectors
+
+    async def aembed_query(self, text: str) -> list[float]:
+        EMBED_QUERIES.inc(backend="tei")
+        return await self.__batcher.embed(text)
+
+    async def aclose(self) -> None:
+        if self.__asyncClient is not None:
+            await self.__asyncClient.aclose()
+            self.__asyncClient = None
+        if self.__client is not None:
+            self.__client.close()
+            self.__client = None
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    In-process embeddings with fastembed (ONNX runtime on CPU), no network hop.
+    Batches run on a thread pool (ONNX releases the GIL), concurrent query
+    embeddings are micro batched the same way as the TEI client.
+    """
+
+    def __init__(
+        self,
+        modelName: str = "BAAI/bge-small-en-v1.5",
+        workers: int = 2,
+        threads: Optional[int] = None,
+        batchWindow: float = 0.002,
+        maxBatch: int = 64,
+        cacheDir: Optional[str] = None,
+    ) -> None:
+        self.__modelName = modelName
+        self.__threads = threads or max(1, (os.cpu_count() or 1) // max(1, workers))
+        self.__cacheDir = cacheDir
+        self.__maxBatch = max(1, maxBatch)
+        self.__model: Any = None
+        self.__modelLock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="fastembed"
+        )
+        self.__batcher = QueryBatcher(self.__aembedBatch, batchWindow, self.__maxBatch)
+
+    @property
+    def model(self) -> Any:
+        if self.__model is None:
+            with self.__modelLock:
+                if self.__model is None:
+                    from fastembed import TextEmbedding
+
+                    start = time.perf_counter()
+                    self.__model = TextEmbedding(
+                        model_name=self.__modelName,
+                        cache_dir=self.__cacheDir,
+                        threads=self.__threads,
+                    )
+                    logger.info(
+                        "Local embedding model %s loaded in %.2fs",
+                        self.__modelName,
+                        time.perf_counter() - start,
+                    )
+        return self.__model
+
+    def warmUp(self) -> None:
+        """Load the ONNX model and run one batch so the first query is not cold."""
+        self.embed_documents(["warm up"] * min(8, self.__maxBatch))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        start = time.perf_counter()
+        vectors = [v.tolist() for v in self.model.embed(texts, batch_size=self.__maxBatch)]
+        EMBED_REQUEST_SECONDS.observe(time.perf_counter() - start, backend="local")
+        EMBED_BATCH_SIZE.observe(len(texts))
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        EMBED_QUERIES.inc(backend="local")
+        return self.embed_documents([text])[0]
+
+    async def __aembedBatch(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.__executor, self.embed_documents, texts
+        )
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        batches = [
+            texts[i : i + self.__maxBatch] for i in range(0, len(texts), self.__maxBatch)
+        ]
+        results = await asyncio.gather(*(self.__aembedBatch(b) for b in batches))
+        return [vector for batch in results for vector in batch]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        EMBED_QUERIES.inc(backend="local")
+        return await self.__batcher.embed(text)
+
+
+def getEmbeddings() -> Embeddings:
+    """Embedding client selected by EMBEDDING_BACKEND: tei (default) or local."""
+    backend = os.getenv("EMBEDDING_BACKEND", "tei").lower()
+    if backend == "local":
+        return LocalEmbeddings(
+            os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5"),
+            workers=int(os.getenv("EMBEDDING_LOCAL_WORKERS", "2")),
+            batchWindow=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "2")) / 1000,
+            maxBatch=int(os.getenv("EMBEDDING_MAX_BATCH", "64")),
+            cacheDir=os.getenv("EMBEDDING_CACHE_DIR", "model_cache/fastembed"),
+        )
+    if backend != "tei":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return TeiEmbeddings(
+        os.getenv("EMBEDDING_URL", "http://embedding-engine:80"),
+        batchWindow=float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")) / 1000,
+        maxBatch=int(os.getenv("EMBEDDING_MAX_BATCH", "32")),
+        maxConnections=int(os.getenv("EMBEDDING_MAX_CONNECTIONS", "16")),
+    )
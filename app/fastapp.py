@@ -1,5 +1,6 @@
 # fastapp.py
 
+import asyncio
 import atexit
 import json
 import logging
@@ -13,11 +14,19 @@ from fastapi import (
     WebSocketDisconnect,
 )
 from fastapi.concurrency import asynccontextmanager
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.websockets import WebSocketState
 from starlette.middleware.base import BaseHTTPMiddleware
-from app.graph import runGraph
+from app.checkpointer import openCheckpointer
+from app.graph import GRAPH_REGISTRY, deleteThread
+from app.intentClassifier import getIntentClassifier
+from app.metrics import renderMetrics
+from app.nodes.ragNode import getVectorDb
+from app.nodes.salesNode import openSqlDb
+from app.sessions import openSessionStore
+from app.socketSession import SocketSession
+from app.tracing import TRACER
 from app.utility import SocketRequest
 
 load_dotenv()
@@ -40,22 +49,52 @@ ALLOWED_ORIGINS = [
 ]
 
 SERVER_INIT = False
+SERVER_READY = False
+
+
+async def warmUpServices():
+    """Warm shared services in the background, /ready turns 200 when done."""
+    global SERVER_READY
+    delay = 1.0
+    while True:
+        try:
+            await getVectorDb().warmUp()
+            await getIntentClassifier().warmUp()
+            break
+        except Exception as err:
+            logger.exception(
+                "Warm up exception, retry in %ss. %s",
+                delay,
+                err,
+                extra={"method": "warmUpServices"},
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+    SERVER_READY = True
+    logger.info("Server is ready.")
 
 
 # FastApi lifespan, executes when fastapi starts and stops
 @asynccontextmanager
 async def lifeSpan(app: FastAPI):
     global SERVER_INIT
-    if not SERVER_INIT:
-        logger.info("Initializing server completed.")
-        SERVER_INIT = True
-    else:
-        logger.info("Server is ready.")
-    yield
-    try:
-        logger.info("Server is shutting down...")
-    except Exception as err:
-        logger.error("Server level exception. %s", err)
+    async with (
+        openCheckpointer() as checkpointer,
+        openSqlDb(),
+        openSessionStore(deleteThread),
+    ):
+        GRAPH_REGISTRY.setup(checkpointer)
+        warmUpTask = asyncio.create_task(warmUpServices())
+        if not SERVER_INIT:
+            logger.info("Initializing server completed.")
+            SERVER_INIT = True
+        yield
+        try:
+            logger.info("Server is shutting down...")
+            warmUpTask.cancel()
+            TRACER.close()
+        except Exception as err:
+            logger.error("Server level exception. %s", err)
 
 
 # Register backup cleanup on exiting program
@@ -97,6 +136,29 @@ async def getHome(request: Request) -> JSONResponse:
     )
 
 
+@app.get("/ready")
+async def getReady() -> JSONResponse:
+    """Readiness probe, 503 until vector store and clients are warm."""
+    if not SERVER_READY:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "warming", "content": "Server is warming up."},
+        )
+    return JSONResponse(
+        status_code=200,
+        content={"status": "success", "content": "Server is ready."},
+    )
+
+
+@app.get("/metrics")
+async def getMetrics() -> PlainTextResponse:
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(
+        content=renderMetrics(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 @app.websocket("/ws")
 async def aiWebSocket(ws: WebSocket):
     """Secure Websocket, "Cross-Site WebSocket Hijacking" (CSWH)"""
@@ -109,6 +171,7 @@ async def aiWebSocket(ws: WebSocket):
 
     await ws.accept()
     logger.info("Connection established %s", ws.client)
+    session = SocketSession(ws)
     try:
         while True:
             try:
@@ -119,14 +182,14 @@ async def aiWebSocket(ws: WebSocket):
                 if not requestData.requestId:
                     requestData.requestId = requestId
 
-                await runGraph(requestData, ws)
+                await session.submit(requestData)
+            except WebSocketDisconnect:
+                raise
             except Exception as err:
                 logger.exception(
                     "Server level exception. %s", err, extra={"method": "aiWebSocket"}
                 )
-                await ws.send_json(
-                    json.dumps({"error": True, "message": "Internal Server Error."})
-                )
+                await session.sendError("Internal Server Error.")
 
     except WebSocketDisconnect as err:
         logger.exception(
@@ -144,3 +207,5 @@ async def aiWebSocket(ws: WebSocket):
             await ws.send_json(
                 json.dumps({"error": True, "message": "Internal Server Error."})
             )
+    finally:
+        await session.close()
@@ -2,37 +2,56 @@
 
 import logging
 import os
-from typing import Dict, cast
-import uuid
+import time
+from functools import partial
+from typing import Callable, Dict, Optional
 from dotenv import load_dotenv
-from fastapi import WebSocket
 from langgraph.graph import StateGraph, END
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.types import Command
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import InMemorySaver
 from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessageChunk
 from langchain_core.runnables import ConfigurableField, RunnableConfig
 
 from app.nodes.generalChatNode import generalChatNode
 from app.nodes.humanInLoopNode import humanInLoopNode
 from app.nodes.classifyIntentNode import classifyIntentNode
-from app.nodes.ragNode import ragNode
+from app.nodes.ragNode import RETRIEVAL_PREFETCHER, ragNode
 from app.nodes.salesNode import salesNode
+from app.history import HISTORY_MANAGER, summarizeWithLlm
+from app.instrumentation import LLM_METRICS, timedNode
+from app.llmGateway import (
+    LLM_ADMISSION,
+    LLM_COALESCER,
+    LLM_PRIORITY,
+    PRIORITY_RESUME,
+    LlmBusyError,
+    LlmGateway,
+)
+from app.metrics import counter, gauge, histogram
+from app.sessions import SessionStore, getSessionStore
 from app.utility import (
     GraphContext,
     GraphState,
     InterruptState,
     SocketRequest,
     SocketResponse,
+    SocketSender,
 )
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-LLM = ChatOpenAI(
+LLM_MODEL = ChatOpenAI(
     model=os.getenv("MODEL", "gpt-5-nano"),
     max_completion_tokens=512,
     temperature=0.2,
     reasoning_effort="minimal",  # Minimize token cost.
+    stream_usage=True,  # Token usage of streamed answers too.
+    callbacks=[LLM_METRICS],
+    max_retries=0,  # Retried by the gateway, with backoff shared across calls.
 ).configurable_fields(
     max_tokens=ConfigurableField(
         id="output_max_token",
@@ -45,49 +64,79 @@ LLM = ChatOpenAI(
         description="Each graph node can decide reasoning. Minimum reasoning minimize token cost.",
     ),
 )
+# Identical in-flight node calls share one request, the rest is admitted through
+# the shared concurrency limits and token budget.
+LLM = LlmGateway(LLM_MODEL, LLM_ADMISSION, LLM_COALESCER)
+
+
+# Nodes whose LLM output is user facing and can be streamed as tokens.
+STREAM_NODES = ("rag", "sales", "generalChat")
+
 
-ACTIVE_SESSION: Dict[str, str] = {}
+async def deleteThread(threadId: str) -> None:
+    """Checkpoints of an evicted session."""
+    await GRAPH_REGISTRY.checkpointer.adelete_thread(threadId)
 
 
-def getThreadId(userId: str) -> str:
-    global ACTIVE_SESSION
-    if userId not in ACTIVE_SESSION:
-        ACTIVE_SESSION[userId] = str(uuid.uuid4())
-    return ACTIVE_SESSION[userId]
+def sessionStore() -> SessionStore:
+    return getSessionStore(deleteThread)
+
+
+async def getThreadId(userId: str) -> str:
+    return await sessionStore().threadId(userId)
 
 
 def routeNode(s: GraphState) -> str:
     if s.intent == "Support":
         return "rag"
+    # Speculative retrieval is only used by rag.
+    RETRIEVAL_PREFETCHER.discard(s)
     if s.intent == "Sales":
         return "humanInLoop"
     return "generalChat"
 
 
-def getCompiledGraph():
+GRAPH_COMPILE_SECONDS = gauge(
+    "graph_compile_seconds",
+    "Time spent compiling each graph variant at startup.",
+    ["variant"],
+)
+GRAPH_INVOCATIONS = counter(
+    "graph_invocations_total", "Graph invocations served.", ["variant"]
+)
+GRAPH_OVERHEAD_SECONDS = histogram(
+    "graph_orchestration_overhead_seconds",
+    "Per message time spent before ainvoke, graph lookup and state read.",
+    ["variant"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1),
+)
+
+
+def buildGraph() -> StateGraph:
+    graph = StateGraph(state_schema=GraphState, context_schema=GraphContext)
+
+    # Nodes
+    graph.add_node("classifyIntent", timedNode("classifyIntent", classifyIntentNode))
+    graph.add_node("rag", timedNode("rag", ragNode))
+    graph.add_node("humanInLoop", timedNode("humanInLoop", humanInLoopNode))
+    graph.add_node("sales", timedNode("sales", salesNode))
+    graph.add_node("generalChat", timedNode("generalChat", generalChatNode))
+
+    graph.set_entry_point("classifyIntent")
+    graph.add_conditional_edges(
+        "classifyIntent",
+        routeNode,
+        {"rag": "rag", "humanInLoop": "humanInLoop", "generalChat": "generalChat"},
+    )  # humanInLoop-> sales or END;
+    graph.add_edge("rag", END)
+    graph.add_edge("sales", END)
+    graph.add_edge("generalChat", END)
+    return graph
+
+
+def getCompiledGraph(checkpointer: BaseCheckpointSaver, builder=buildGraph):
     try:
-        graph = StateGraph(state_schema=GraphState, context_schema=GraphContext)
-
-        # Nodes
-        graph.add_node("classifyIntent", classifyIntentNode)
-        graph.add_node("rag", ragNode)
-        graph.add_node("humanInLoop", humanInLoopNode)
-        graph.add_node("sales", salesNode)
-        graph.add_node("generalChat", generalChatNode)
-
-        graph.set_entry_point("classifyIntent")
-        graph.add_conditional_edges(
-            "classifyIntent",
-            routeNode,
-            {"rag": "rag", "humanInLoop": "humanInLoop", "generalChat": "generalChat"},
-        )  # humanInLoop-> sales or END;
-        graph.add_edge("rag", END)
-        graph.add_edge("sales", END)
-        graph.add_edge("generalChat", END)
-
-        inMemoryCheckPointer = InMemorySaver()
-        compiledGraph = graph.compile(checkpointer=inMemoryCheckPointer)
-        return compiledGraph
+        return builder().compile(checkpointer=checkpointer)
     except Exception as err:
         logger.exception(
             "Graph level exception. %s", err, extra={"method": "getCompiledGraph"}
@@ -95,6 +144,62 @@ def getCompiledGraph():
         raise
 
 
+class GraphRegistry:
+    """
+    Process level registry of compiled graphs.
+    Each variant is compiled once (at lifespan startup) and every variant
+    shares the same checkpointer, so interrupt state survives between messages.
+    """
+
+    def __init__(self) -> None:
+        self.__builders: Dict[str, Callable[[], StateGraph]] = {
+            "default": buildGraph,
+        }
+        self.__compiled: Dict[str, CompiledStateGraph] = {}
+        self.__checkpointer: Optional[BaseCheckpointSaver] = None
+
+    @property
+    def checkpointer(self) -> BaseCheckpointSaver:
+        if self.__checkpointer is None:
+            self.__checkpointer = InMemorySaver()
+        return self.__checkpointer
+
+    @property
+    def variants(self) -> list[str]:
+        return list(self.__builders)
+
+    def register(self, variant: str, builder: Callable[[], StateGraph]) -> None:
+        self.__builders[variant] = builder
+        self.__compiled.pop(variant, None)
+
+    def setup(self, checkpointer: Optional[BaseCheckpointSaver] = None) -> None:
+        """Compile every registered variant, called once from lifespan."""
+        if checkpointer is not None:
+            self.__checkpointer = checkpointer
+        self.__compiled.clear()
+        for variant in self.__builders:
+            self.__compile(variant)
+
+    def __compile(self, variant: str) -> CompiledStateGraph:
+        start = time.perf_counter()
+        compiledGraph = getCompiledGraph(self.checkpointer, self.__builders[variant])
+        elapsed = time.perf_counter() - start
+        GRAPH_COMPILE_SECONDS.set(elapsed, variant=variant)
+        logger.info("Graph variant '%s' compiled in %.2f ms", variant, elapsed * 1000)
+        self.__compiled[variant] = compiledGraph
+        return compiledGraph
+
+    def get(self, variant: str = "default") -> CompiledStateGraph:
+        """Compiled graph for a variant, compiles lazily when lifespan did not run."""
+        compiledGraph = self.__compiled.get(variant)
+        if compiledGraph is None:
+            compiledGraph = self.__compile(variant)
+        return compiledGraph
+
+
+GRAPH_REGISTRY = GraphRegistry()
+
+
 def processRequest(request: SocketRequest, updateStatus: str = "") -> GraphState:
     try:
         return GraphState(
@@ -116,58 +221,134 @@ def processRequest(request: SocketRequest, updateStatus: str = "") -> GraphState
         raise
 
 
-async def runGraph(request: SocketRequest, ws: WebSocket):
+async def runGraph(request: SocketRequest, ws: SocketSender):
     try:
         logger.info("Starting Graph...")
         graphInput = processRequest(request)
 
-        config = RunnableConfig(configurable={"thread_id": getThreadId(request.userId)})
-        pilotGraph = getCompiledGraph()
-        curr_state = await pilotGraph.aget_state(config)
+        threadId = await getThreadId(request.userId)
+        config = RunnableConfig(configurable={"thread_id": threadId})
+        pilotGraph = GRAPH_REGISTRY.get()
+        # Runs of one thread are serialized, across workers with a shared store.
+        async with sessionStore().lock(threadId):
+            await runThread(request, ws, pilotGraph, graphInput, config)
+    except LlmBusyError:
+        raise  # Load shedding, answered with a "busy" frame.
+    except Exception as err:
+        logger.exception("Graph level exception. %s", err, extra={"method": "runGraph"})
+        raise
 
-        if curr_state.next and request.status == "interrupted":
-            """Resume from interrupt"""
-            await interruptedGraph(request, ws, config)
-        else:
-            """Starting a new Lanchain Graph"""
-            graphContext = GraphContext(llm=LLM)
-            pilotGraph = getCompiledGraph()
-            rawResponse = await pilotGraph.ainvoke(
-                input=graphInput,
-                context=graphContext,
-                config=config,
+
+async def runThread(
+    request: SocketRequest,
+    ws: SocketSender,
+    pilotGraph: CompiledStateGraph,
+    graphInput: GraphState,
+    config: RunnableConfig,
+):
+    """Graph run of one message, called while holding the thread lock."""
+    # Lock wait is THREAD_LOCK_WAIT_SECONDS, overhead starts once it is held.
+    start = time.perf_counter()
+    curr_state = await pilotGraph.aget_state(config)
+    GRAPH_OVERHEAD_SECONDS.observe(time.perf_counter() - start, variant="default")
+    GRAPH_INVOCATIONS.inc(variant="default")
+
+    if curr_state.next and request.status == "interrupted":
+        """Resume from interrupt"""
+        await interruptedGraph(request, ws, config)
+    else:
+        """Starting a new Lanchain Graph"""
+        graphContext = GraphContext(llm=LLM)
+        rawResponse = await invokeGraph(
+            pilotGraph, graphInput, graphContext, config, request, ws
+        )
+        logger.info("Graph invoked, %s", config["configurable"]["thread_id"])
+
+        if "__interrupt__" in rawResponse:
+            """Human in loop"""
+            tempObj = rawResponse["__interrupt__"][-1].value
+            interruptValue = InterruptState(
+                assistantQuery=tempObj.assistantQuery,
+                requestId=tempObj.requestId,
+                userResponse=tempObj.userResponse,
             )
-            logger.info("Graph invoked, %s", getThreadId(request.userId))
-
-            if "__interrupt__" in rawResponse:
-                """Human in loop"""
-                tempObj = rawResponse["__interrupt__"][-1].value
-                interruptValue = InterruptState(
-                    assistantQuery=tempObj.assistantQuery,
-                    requestId=tempObj.requestId,
-                    userResponse=tempObj.userResponse,
+            if ws:
+                await ws.send_json(
+                    {
+                        "status": "interrupted",
+                        "content": interruptValue.assistantQuery,
+                        "requestId": request.requestId,
+                    }
                 )
-                if ws:
-                    await ws.send_json(
-                        {
-                            "status": "interrupted",
-                            "content": interruptValue.assistantQuery,
-                        }
-                    )
-            else:
-                graphResponse = GraphState.model_validate(rawResponse, extra="ignore")
+        else:
+            graphResponse = GraphState.model_validate(rawResponse, extra="ignore")
+            await ws.send_json(
+                data=SocketResponse(
+                    status="done" if request.stream else "chat",
+                    content=graphResponse.response or "",
+                    requestId=request.requestId,
+                ).model_dump()
+            )
+            # Fold old turns off the critical path, the answer is already sent.
+            HISTORY_MANAGER.schedule(
+                pilotGraph, config, partial(summarizeWithLlm, LLM), sessionStore().lock
+            )
+
+
+async def invokeGraph(
+    pilotGraph: CompiledStateGraph,
+    graphInput,
+    graphContext: GraphContext,
+    config: RunnableConfig,
+    request: SocketRequest,
+    ws: SocketSender,
+) -> dict:
+    """
+    Run the graph to its end (or interrupt) and return the final state.
+    Streaming clients get every LLM token of STREAM_NODES as a "token" frame meanwhile.
+    """
+    if not request.stream:
+        return await pilotGraph.ainvoke(
+            input=graphInput,
+            context=graphContext,
+            config=config,
+        )
+
+    rawResponse: dict = {}
+    interrupts = None
+    async for mode, chunk in pilotGraph.astream(
+        input=graphInput,
+        context=graphContext,
+        config=config,
+        stream_mode=["messages", "updates", "values"],
+    ):
+        if mode == "messages":
+            message, metadata = chunk
+            # Only live model chunks, not the messages nodes write to history.
+            if (
+                isinstance(message, AIMessageChunk)
+                and metadata.get("langgraph_node") in STREAM_NODES
+                and isinstance(message.content, str)
+                and message.content
+            ):
                 await ws.send_json(
                     data=SocketResponse(
-                        status="chat", content=graphResponse.response or ""
+                        status="token",
+                        content=message.content,
+                        requestId=request.requestId,
                     ).model_dump()
                 )
-    except Exception as err:
-        logger.exception("Graph level exception. %s", err, extra={"method": "runGraph"})
-        raise
+        elif mode == "values":
+            rawResponse = chunk
+        elif mode == "updates" and "__interrupt__" in chunk:
+            interrupts = chunk["__interrupt__"]
+    if interrupts:
+        rawResponse = {**rawResponse, "__interrupt__": interrupts}
+    return rawResponse
 
 
 async def interruptedGraph(
-    request: SocketRequest, ws: WebSocket, config: RunnableConfig
+    request: SocketRequest, ws: SocketSender, config: RunnableConfig
 ):
     try:
 
@@ -178,14 +359,17 @@ async def interruptedGraph(
         )
 
         command = Command(resume=graphInput)
-        logger.info("Interrupting Graph, %s", getThreadId(request.userId))
+        logger.info("Interrupting Graph, %s", config["configurable"]["thread_id"])
         # Re-Invoking Graph
-        graphContext = GraphContext(llm=cast(ChatOpenAI, LLM))
-        pilotGraph = getCompiledGraph()
-        aiResponse = await pilotGraph.ainvoke(
-            input=command,
-            context=graphContext,
-            config=config,
+        graphContext = GraphContext(llm=LLM)
+        pilotGraph = GRAPH_REGISTRY.get()
+        # The user answered our question, their LLM calls go first.
+        resumeConfig = RunnableConfig(
+            configurable=config["configurable"],
+            metadata={LLM_PRIORITY: PRIORITY_RESUME},
+        )
+        aiResponse = await invokeGraph(
+            pilotGraph, command, graphContext, resumeConfig, request, ws
         )
 
         graphResponse = GraphState.model_validate(
@@ -195,10 +379,17 @@ async def interruptedGraph(
 
         await ws.send_json(
             data=SocketResponse(
-                status="chat", content=graphResponse.response or ""
+                status="done" if request.stream else "chat",
+                content=graphResponse.response or "",
+                requestId=request.requestId,
             ).model_dump()
         )
+        HISTORY_MANAGER.schedule(
+            pilotGraph, config, partial(summarizeWithLlm, LLM), sessionStore().lock
+        )
 
+    except LlmBusyError:
+        raise
     except Exception as err:
         logger.exception(
             "Interrupted Graph level exception. %s",
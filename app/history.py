@@ -0,0 +1,201 @@
+# history.py
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncContextManager, Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, RemoveMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+
+from app.llmGateway import LLM_PRIORITY, PRIORITY_BACKGROUND
+from app.metrics import counter, histogram
+from app.utility import GraphState
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Thread id -> lock serializing the thread's graph runs, SessionStore.lock.
+ThreadLock = Callable[[str], AsyncContextManager[None]]
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+# Compaction keeps this share of the budget as recent turns, so it doesn't run every turn.
+HISTORY_KEEP_RATIO = float(os.getenv("HISTORY_KEEP_RATIO", "0.5"))
+
+HISTORY_PROMPT_TOKENS = histogram(
+    "history_prompt_tokens",
+    "Approximate tokens of history and summary passed into node prompts.",
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+HISTORY_COMPACTIONS = counter(
+    "history_compactions_total",
+    "Background history compactions by result: folded, skipped, stale or failed.",
+    ["result"],
+)
+HISTORY_COMPACTION_SECONDS = histogram(
+    "history_compaction_seconds", "Time to summarize and fold old turns."
+)
+
+SUMMARY_PROMPT = """
+You maintain the running summary of a customer support conversation.
+Merge the earlier summary and the new messages into one short paragraph.
+Keep order ids, item names, reported problems and anything promised to the user.
+Drop greetings and small talk.
+
+Earlier summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+
+def splitHistory(
+    messages: list[BaseMessage], budget: int
+) -> tuple[list[BaseMessage], list[BaseMessage]]:
+    """(older messages, most recent messages that fit in `budget` tokens)."""
+    used = 0
+    keep = 0
+    for message in reversed(messages):
+        tokens = count_tokens_approximately([message])
+        if used + tokens > budget and keep:
+            break
+        used += tokens
+        keep += 1
+    return messages[: len(messages) - keep], messages[len(messages) - keep :]
+
+
+def promptHistory(state: GraphState) -> list[BaseMessage]:
+    """
+    History for node prompts: the rolling summary, then the recent turns
+    within HISTORY_TOKEN_BUDGET. Bounded even before compaction catches up.
+    """
+    _, recent = splitHistory(list(state.history or []), HISTORY_TOKEN_BUDGET)
+    if state.historySummary:
+        recent = [
+            SystemMessage(content=f"Summary of the earlier conversation: {state.historySummary}"),
+            *recent,
+        ]
+    HISTORY_PROMPT_TOKENS.observe(count_tokens_approximately(recent))
+    return recent
+
+
+def isFirstTurn(state: GraphState) -> bool:
+    """No earlier turn, history or summary, reaches the node prompts."""
+    return not state.history and not state.historySummary
+
+
+async def summarizeWithLlm(llm, summary: str, messages: list[BaseMessage]) -> str:
+    model = llm.with_config(
+        configurable={"output_max_token": 300},
+        metadata={LLM_PRIORITY: PRIORITY_BACKGROUND},
+    )
+    response = await model.ainvoke(
+        SUMMARY_PROMPT.format(
+            summary=summary or "None",
+            messages="\n".join(f"{m.type}: {m.content}" for m in messages),
+        )
+    )
+    return str(response.content).strip()
+
+
+class HistoryManager:
+    """
+    Folds old turns of a thread into GraphState.historySummary.
+    Scheduled after the response is sent. The summary is written under the
+    thread lock, and only if the thread didn't change in a conflicting way
+    while the summary was being generated.
+    """
+
+    def __init__(
+        self,
+        budget: int = HISTORY_TOKEN_BUDGET,
+        keepRatio: float = HISTORY_KEEP_RATIO,
+    ) -> None:
+        self.__budget = budget
+        self.__keepTokens = max(1, int(budget * keepRatio))
+        # Threads with a compaction in progress in this process.
+        self.__running: set[str] = set()
+        self.__tasks: set[asyncio.Task] = set()
+
+    def schedule(
+        self,
+        graph: CompiledStateGraph,
+        config: RunnableConfig,
+        summarize: Callable[[str, list[BaseMessage]], Awaitable[str]],
+        lock: ThreadLock,
+    ) -> None:
+        task = asyncio.create_task(self.compact(graph, config, summarize, lock))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def compact(
+        self,
+        graph: CompiledStateGraph,
+        config: RunnableConfig,
+        summarize: Callable[[str, list[BaseMessage]], Awaitable[str]],
+        lock: ThreadLock,
+    ) -> Optional[str]:
+        """
+        Summarize without holding `lock`, a slow summary doesn't delay the
+        user's next message. Under `lock` the state is read again and the
+        fold is dropped if the thread is interrupted, the summary changed
+        or the folded messages are gone (another worker compacted it).
+        """
+        threadId = config["configurable"]["thread_id"]
+        if threadId in self.__running:
+            HISTORY_COMPACTIONS.inc(result="skipped")
+            return None
+        self.__running.add(threadId)
+        try:
+            snapshot = await graph.aget_state(config)
+            values = snapshot.values or {}
+            messages = list(values.get("history") or [])
+            # Interrupted threads resume from this checkpoint, leave them alone.
+            if snapshot.next or count_tokens_approximately(messages) <= self.__budget:
+                HISTORY_COMPACTIONS.inc(result="skipped")
+                return None
+
+            start = time.perf_counter()
+            previousSummary = values.get("historySummary") or ""
+            older, _ = splitHistory(messages, self.__keepTokens)
+            summary = await summarize(previousSummary, older)
+
+            async with lock(threadId):
+                snapshot = await graph.aget_state(config)
+                values = snapshot.values or {}
+                current = {m.id for m in values.get("history") or []}
+                if (
+                    snapshot.next
+                    or (values.get("historySummary") or "") != previousSummary
+                    or any(m.id not in current for m in older)
+                ):
+                    HISTORY_COMPACTIONS.inc(result="stale")
+                    return None
+                await graph.aupdate_state(
+                    config,
+                    {
+                        "history": [RemoveMessage(id=m.id) for m in older if m.id],
+                        "historySummary": summary,
+                    },
+                )
+            HISTORY_COMPACTION_SECONDS.observe(time.perf_counter() - start)
+            HISTORY_COMPACTIONS.inc(result="folded")
+            logger.info("History of %s folded %s messages", threadId, len(older))
+            return summary
+        except Exception as err:
+            HISTORY_COMPACTIONS.inc(result="failed")
+            logger.exception(
+                "History compaction exception. %s",
+                err,
+                extra={"method": "HistoryManager.compact", "threadId": threadId},
+            )
+            return None
+        finally:
+            self.__running.discard(threadId)
+
+
+HISTORY_MANAGER = HistoryManager()
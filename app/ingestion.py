@@ -0,0 +1,207 @@
+# ingestion.py
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import (
+    PyPDFLoader,
+    UnstructuredWordDocumentLoader,
+    TextLoader,
+)
+
+from app.metrics import counter, gauge
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".doc", ".pdf", ".txt", ".md")
+
+INGEST_CHUNKS = counter("ingest_chunks_total", "Chunks embedded into the vector db.")
+INGEST_DOCS_PER_SECOND = gauge(
+    "ingest_docs_per_second", "Chunk throughput of the last ingestion run."
+)
+
+
+class IngestReport(BaseModel):
+    """Result of one incremental ingestion run."""
+
+    scanned: int = 0
+    changedFiles: int = 0
+    removedFiles: int = 0
+    chunksAdded: int = 0
+    chunksRemoved: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.chunksAdded or self.chunksRemoved)
+
+    @property
+    def docsPerSecond(self) -> float:
+        return self.chunksAdded / self.seconds if self.seconds > 0 else 0.0
+
+
+def fileHash(filePath: Path) -> str:
+    digest = hashlib.sha256()
+    with open(filePath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def loadAndSplit(
+    filePath: str, contentHash: str, chunkSize: int, chunkOverlap: int
+) -> list[Document]:
+    """Load one file and split it into chunks. Runs inside a worker process."""
+    path = Path(filePath)
+    ext = path.suffix.lower()
+    if ext == ".pdf":
+        loader = PyPDFLoader(file_path=str(path))
+    elif ext == ".doc":
+        loader = UnstructuredWordDocumentLoader(path)
+    else:
+        loader = TextLoader(path, encoding="utf-8")
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunkSize, chunk_overlap=chunkOverlap
+    )
+    chunks = splitter.split_documents(loader.load())
+    for chunk in chunks:
+        chunk.metadata["contentHash"] = contentHash
+    return chunks
+
+
+class IngestionPipeline:
+    """
+    Incremental ingestion of the documents folder into Chroma.
+    A manifest of content hashes tracks what is stored, only new or changed
+    files are loaded (in a process pool), chunked and embedded in large batches.
+    Chunks of changed or deleted files are removed.
+    """
+
+    def __init__(self, db: Chroma, documentsPath: Path, manifestPath: Path) -> None:
+        self.__db = db
+        self.__documentsPath = documentsPath
+        self.__manifestPath = manifestPath
+        self.__chunkSize = int(os.getenv("INGEST_CHUNK_SIZE", "800"))
+        self.__chunkOverlap = int(os.getenv("INGEST_CHUNK_OVERLAP", "120"))
+        self.__workers = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.__batchSize = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+
+    def __loadManifest(self) -> Dict[str, dict]:
+        if not self.__manifestPath.exists():
+            return {}
+        with open(self.__manifestPath, encoding="utf-8") as f:
+            return json.load(f)
+
+    def __saveManifest(self, manifest: Dict[str, dict]) -> None:
+        self.__manifestPath.parent.mkdir(parents=True, exist_ok=True)
+        tmpPath = self.__manifestPath.with_suffix(".tmp")
+        with open(tmpPath, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmpPath, self.__manifestPath)
+
+    def __scan(self) -> Dict[str, Path]:
+        files: Dict[str, Path] = {}
+        for filePath in self.__documentsPath.rglob("*"):
+            if (
+                not filePath.is_file()
+                or filePath.suffix.lower() not in SUPPORTED_EXTENSIONS
+            ):
+                continue
+            files[str(filePath.relative_to(self.__documentsPath))] = filePath
+        return files
+
+    def run(self) -> IngestReport:
+        start = time.perf_counter()
+        report = IngestReport()
+        if not self.__documentsPath.exists():
+            logger.info("Rag Vector DB: Document folder is don't exists.")
+            return report
+
+        manifest = self.__loadManifest()
+        if not manifest and self.__db._collection.count() > 0:
+            # Collection created before the manifest existed, ids are unknown.
+            logger.info("Rag Vector DB: no manifest, rebuilding collection.")
+            self.__db.reset_collection()
+
+        files = self.__scan()
+        report.scanned = len(files)
+        hashes = {name: fileHash(path) for name, path in files.items()}
+
+        staleIds: list[str] = []
+        for name in list(manifest):
+            if hashes.get(name) != manifest[name]["hash"]:
+                staleIds.extend(manifest[name]["ids"])
+                if name not in hashes:
+                    report.removedFiles += 1
+                del manifest[name]
+        if staleIds:
+            self.__db.delete(ids=staleIds)
+            report.chunksRemoved = len(staleIds)
+
+        pending = [name for name in files if name not in manifest]
+        report.changedFiles = len(pending)
+        if pending:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(
+                max_workers=min(self.__workers, len(pending)), mp_context=context
+            ) as pool:
+                futures = {
+                    name: pool.submit(
+                        loadAndSplit,
+                        str(files[name]),
+                        hashes[name],
+                        self.__chunkSize,
+                        self.__chunkOverlap,
+                    )
+                    for name in pending
+                }
+                batch: list[Document] = []
+                batchIds: list[str] = []
+                for name, future in futures.items():
+                    chunks = future.result()
+                    # Stable per file version, re-ingesting upserts the same ids.
+                    prefix = hashlib.sha1(f"{name}:{hashes[name]}".encode()).hexdigest()[:16]
+                    ids = [f"{prefix}-{i}" for i in range(len(chunks))]
+                    manifest[name] = {"hash": hashes[name], "ids": ids}
+                    batch.extend(chunks)
+                    batchIds.extend(ids)
+                    while len(batch) >= self.__batchSize:
+                        self.__addBatch(batch[: self.__batchSize], batchIds[: self.__batchSize])
+                        report.chunksAdded += self.__batchSize
+                        del batch[: self.__batchSize], batchIds[: self.__batchSize]
+                if batch:
+                    self.__addBatch(batch, batchIds)
+                    report.chunksAdded += len(batch)
+
+        if report.changed or report.changedFiles or report.removedFiles:
+            self.__saveManifest(manifest)
+
+        report.seconds = time.perf_counter() - start
+        INGEST_DOCS_PER_SECOND.set(report.docsPerSecond)
+        logger.info(
+            "Rag Vector DB: ingested %s files (%s chunks, %.1f docs/sec), removed %s chunks in %.2fs",
+            report.changedFiles,
+            report.chunksAdded,
+            report.docsPerSecond,
+            report.chunksRemoved,
+            report.seconds,
+        )
+        return report
+
+    def __addBatch(self, documents: list[Document], ids: list[str]) -> None:
+        """One embedding request and one Chroma upsert for the whole batch."""
+        self.__db.add_documents(documents, ids=ids)
+        INGEST_CHUNKS.inc(len(documents))
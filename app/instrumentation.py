@@ -0,0 +1,153 @@
+# instrumentation.py
+
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langgraph.errors import GraphInterrupt
+
+from app.metrics import computedGauge, counter, histogram
+from app.tracing import TRACER, Span
+
+NODE_SECONDS = histogram(
+    "graph_node_seconds",
+    "Graph node latency by node and result: ok, interrupted, cancelled or error.",
+    ["node", "result"],
+)
+LLM_CALL_SECONDS = histogram(
+    "llm_call_seconds",
+    "LLM call latency by calling graph node and result: ok or error.",
+    ["node", "result"],
+)
+LLM_TOKENS = counter(
+    "llm_tokens_total",
+    "LLM tokens by calling graph node and kind: prompt, cached_prompt or completion.",
+    ["node", "kind"],
+)
+
+
+def promptCacheRatio() -> Dict[Tuple[str, ...], float]:
+    """Share of prompt tokens per node the provider served from its prefix cache."""
+    totals: Dict[str, list[float]] = {}
+    for (node, kind), value in LLM_TOKENS.items():
+        row = totals.setdefault(node, [0.0, 0.0])
+        if kind == "cached_prompt":
+            row[0] += value
+        elif kind == "prompt":
+            row[1] += value
+    return {(node,): cached / prompt for node, (cached, prompt) in totals.items() if prompt}
+
+
+LLM_PROMPT_CACHE_RATIO = computedGauge(
+    "llm_prompt_cache_ratio",
+    "Share of prompt tokens served from the provider's prompt prefix cache, by node.",
+    ["node"],
+    promptCacheRatio,
+)
+
+
+def timedNode(name: str, node: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Node wrapper observing NODE_SECONDS and opening a node span.
+    functools.wraps keeps the node signature visible, so langgraph still
+    injects runtime and config.
+    """
+
+    @functools.wraps(node)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = "error"
+        with TRACER.span(f"node.{name}") as span:
+            try:
+                value = await node(*args, **kwargs)
+                result = "ok"
+                return value
+            except GraphInterrupt:
+                # interrupt() raises to pause the graph, not a failure.
+                result = "interrupted"
+                if span is not None:
+                    # Ended here so the span isn't marked as failed.
+                    span.set(interrupted=True)
+                    span.finish()
+                raise
+            except asyncio.CancelledError:
+                result = "cancelled"
+                raise
+            finally:
+                NODE_SECONDS.observe(time.perf_counter() - start, node=name, result=result)
+
+    return wrapper
+
+
+def tokenUsage(response: LLMResult) -> Tuple[int, int, int]:
+    """
+    (prompt, completion, cached prompt) tokens reported by the provider,
+    0 when missing. Cached prompt tokens are part of the prompt tokens.
+    """
+    prompt = completion = cached = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+                cached += (usage.get("input_token_details") or {}).get("cache_read") or 0
+    if not prompt and not completion:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = usage.get("prompt_tokens", 0)
+        completion = usage.get("completion_tokens", 0)
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return prompt, completion, cached
+
+
+class LlmMetricsHandler(BaseCallbackHandler):
+    """
+    Latency and token usage of every LLM call, labelled with the graph node
+    from the langgraph run metadata. Calls outside the graph count as "none".
+    Inside a request trace each call also gets an `llm.call` span.
+    """
+
+    # Called on the event loop, only a dict write and a few counter updates.
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.__starts: Dict[UUID, Tuple[float, str, Optional[Span]]] = {}
+
+    def __start(self, runId: UUID, metadata: Optional[Dict[str, Any]]) -> None:
+        if (metadata or {}).get("llm_coalesced"):
+            return  # Shared another call's upstream request, counted there.
+        node = (metadata or {}).get("langgraph_node") or "none"
+        span = TRACER.startSpan("llm.call", node=node)
+        self.__starts[runId] = (time.perf_counter(), node, span)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs):
+        self.__start(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs):
+        self.__start(run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        start, node, span = self.__starts.pop(run_id, (None, "none", None))
+        if start is None:
+            return
+        LLM_CALL_SECONDS.observe(time.perf_counter() - start, node=node, result="ok")
+        prompt, completion, cached = tokenUsage(response)
+        LLM_TOKENS.inc(prompt, node=node, kind="prompt")
+        LLM_TOKENS.inc(cached, node=node, kind="cached_prompt")
+        LLM_TOKENS.inc(completion, node=node, kind="completion")
+        if span is not None:
+            span.set(prompt_tokens=prompt, cached_prompt_tokens=cached, completion_tokens=completion)
+            span.finish()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        start, node, span = self.__starts.pop(run_id, (None, "none", None))
+        if start is not None:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - start, node=node, result="error")
+        if span is not None:
+            span.finish(error)
+
+
+LLM_METRICS = LlmMetricsHandler()
@@ -0,0 +1,236 @@
+# intentClassifier.py
+
+import asyncio
+import logging
+import os
+import re
+from typing import Awaitable, Callable, Literal, Optional
+import numpy as np
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from app.metrics import counter
+from app.nodes.ragNode import getVectorDb
+from app.utility import INTENTS
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+INTENT_TIER_REQUESTS = counter(
+    "intent_classifier_requests_total",
+    "Messages classified by tier (rules, centroid or llm) and intent.",
+    ["tier", "intent"],
+)
+INTENT_TIER_DEFERRED = counter(
+    "intent_classifier_deferred_total",
+    "Messages a cheap tier was unsure about and passed to the next tier.",
+    ["tier"],
+)
+
+INTENT_TIER = Literal["rules", "centroid", "llm"]
+
+GREETING = re.compile(
+    r"^\s*(hi|hii+|hello|hey|hiya|yo|good\s+(morning|afternoon|evening|day)|"
+    r"thanks|thank\s+you|thx|ok(ay)?|bye|goodbye|see\s+you)"
+    r"(\s+(there|team|all|everyone|so\s+much|a\s+lot))?[\s!.,:)]*$",
+    re.IGNORECASE,
+)
+# Explicit order ids only: "ORD-001", "order #552", "order number 12345", "bill no 777".
+# Bare digits need id/no/number/# after order or bill, "order 500 units" has no id.
+ORDER_ID = re.compile(
+    r"\b(ORD-\d+)\b"
+    r"|(?:\border|\bbill)\s*(?:(?:id|no\.?|number)\s*[:#]?\s*#?|[:#]\s*#?)\s*(\d{3,}|[A-Z]{2,}-\d+)\b"
+    r"|(?:\border|\bbill)\s+([A-Z]{2,}-\d+)\b"
+    r"|#(\d{3,})\b",
+    re.IGNORECASE,
+)
+# A reply that is nothing but an id, e.g. "ORD-003" or "#552" after being asked for it.
+BARE_ORDER_ID = re.compile(r"^\s*#?([A-Z]{2,}-\d+|\d{3,})[\s.!]*$", re.IGNORECASE)
+# A message with an order id is still Support when it is about using or fixing the item.
+SUPPORT_CUE = re.compile(
+    r"\b(how\s+(do|to|can)|fix|broken|repair|manual|instructions?|install|setup|"
+    r"reset|error|bug|not\s+working|doesn'?t\s+work|troubleshoot)\b",
+    re.IGNORECASE,
+)
+
+# Labelled seed questions, each intent centroid is the mean of its embeddings.
+SEED_EXAMPLES: dict[str, list[str]] = {
+    "Sales": [
+        "Where is my order?",
+        "Has my laptop been shipped yet?",
+        "Do you have any blue jackets in stock?",
+        "What is the price of the leather belt?",
+        "Track my package",
+        "When will my bag be delivered?",
+        "Is the wallet available in your store?",
+        "I want to check the status of my purchase",
+    ],
+    "Support": [
+        "The belt I bought is broken, how do I fix it?",
+        "How do I reset my laptop?",
+        "What is your return policy?",
+        "I need the user manual for my device",
+        "The app shows an error when I log in",
+        "How can I get a refund for a damaged item?",
+        "My laptop is not turning on",
+        "What is the warranty period?",
+    ],
+    "General": [
+        "Hi there, hope you're having a good day!",
+        "Tell me a joke",
+        "Who are you?",
+        "Thanks for your help",
+        "What can you do?",
+        "I love your service, great job",
+        "What's the weather like today?",
+        "Good morning",
+    ],
+}
+
+
+class IntentResult(BaseModel):
+    """Outcome of one classifier tier, `None` from a tier means it was unsure."""
+
+    tier: INTENT_TIER
+    intent: Literal["Sales", "Support", "General"]
+    orderId: Optional[str] = None
+    orderItem: Optional[str] = None
+    confidence: float = 1.0
+
+
+def extractOrderId(text: str, allowBare: bool = False) -> Optional[str]:
+    """Explicit order id in the text, `allowBare` also accepts a reply of just the id."""
+    match = ORDER_ID.search(text) or (BARE_ORDER_ID.match(text) if allowBare else None)
+    if match is None:
+        return None
+    return next(group for group in match.groups() if group).upper()
+
+
+def classifyByRules(query: str) -> Optional[IntentResult]:
+    """Greetings are General, an explicit order id without a support cue is Sales."""
+    if GREETING.match(query):
+        return IntentResult(tier="rules", intent="General")
+    orderId = extractOrderId(query)
+    if orderId and not SUPPORT_CUE.search(query):
+        return IntentResult(tier="rules", intent="Sales", orderId=orderId)
+    return None
+
+
+class CentroidClassifier:
+    """
+    Nearest-centroid intent classifier over query embeddings.
+    A prediction is kept when its cosine similarity is at least `minSimilarity`
+    and beats the runner-up by `margin`. Sales needs order entities only the
+    LLM extracts, so a Sales prediction is always deferred.
+    """
+
+    def __init__(
+        self,
+        embedQuery: Callable[[str], Awaitable[list[float]]],
+        examples: dict[str, list[str]] = SEED_EXAMPLES,
+        minSimilarity: float = 0.6,
+        margin: float = 0.05,
+    ) -> None:
+        self.__embedQuery = embedQuery
+        self.__examples = examples
+        self.__minSimilarity = minSimilarity
+        self.__margin = margin
+        self.__labels: list[str] = []
+        self.__centroids: Optional[np.ndarray] = None
+        self.__lock = asyncio.Lock()
+
+    @staticmethod
+    def __unit(vector: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vector, axis=-1, keepdims=True)
+        return vector / np.where(norm > 0, norm, 1.0)
+
+    async def warmUp(self) -> None:
+        """Embed the seed examples once, concurrent callers wait for the same run."""
+        if self.__centroids is not None:
+            return
+        async with self.__lock:
+            if self.__centroids is not None:
+                return
+            labels = [intent for intent in INTENTS if self.__examples.get(intent)]
+            centroids = []
+            for intent in labels:
+                vectors = await asyncio.gather(
+                    *(self.__embedQuery(text) for text in self.__examples[intent])
+                )
+                matrix = self.__unit(np.asarray(vectors, dtype=np.float32))
+                centroids.append(matrix.mean(axis=0))
+            self.__labels = labels
+            self.__centroids = self.__unit(np.stack(centroids))
+            logger.info("Intent centroids ready for %s", labels)
+
+    async def classify(self, query: str) -> Optional[IntentResult]:
+        await self.warmUp()
+        assert self.__centroids is not None
+        embedding = np.asarray(await self.__embedQuery(query), dtype=np.float32)
+        scores = self.__centroids @ self.__unit(embedding)
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runnerUp = float(scores[order[1]]) if len(order) > 1 else -1.0
+        intent = self.__labels[int(order[0])]
+        if intent == "Sales" or best < self.__minSimilarity:
+            return None
+        if best - runnerUp < self.__margin:
+            return None
+        return IntentResult(tier="centroid", intent=intent, confidence=best)
+
+
+class TieredIntentClassifier:
+    """
+    Cheap tiers first: rules, then the centroid classifier.
+    `classify` returns None when both are unsure and the LLM has to decide.
+    """
+
+    def __init__(self, centroid: Optional[CentroidClassifier], enabled: bool = True) -> None:
+        self.__centroid = centroid
+        self.__enabled = enabled
+
+    @classmethod
+    def fromEnv(cls) -> "TieredIntentClassifier":
+        centroid = None
+        if os.getenv("INTENT_CENTROID", "true").lower() == "true":
+            centroid = CentroidClassifier(
+                lambda text: getVectorDb().embedQuery(text),
+                minSimilarity=float(os.getenv("INTENT_CENTROID_MIN_SIMILARITY", "0.6")),
+                margin=float(os.getenv("INTENT_CENTROID_MARGIN", "0.05")),
+            )
+        return cls(
+            centroid, enabled=os.getenv("INTENT_FAST_PATH", "true").lower() == "true"
+        )
+
+    async def warmUp(self) -> None:
+        if self.__enabled and self.__centroid is not None:
+            await self.__centroid.warmUp()
+
+    async def classify(self, query: str) -> Optional[IntentResult]:
+        if not self.__enabled:
+            return None
+        result = classifyByRules(query)
+        if result is None:
+            INTENT_TIER_DEFERRED.inc(tier="rules")
+            if self.__centroid is not None:
+                try:
+                    result = await self.__centroid.classify(query)
+                except Exception as err:
+                    # The LLM tier still answers when embeddings are unavailable.
+                    logger.warning("Centroid intent classifier failed. %s", err)
+                if result is None:
+                    INTENT_TIER_DEFERRED.inc(tier="centroid")
+        if result is not None:
+            INTENT_TIER_REQUESTS.inc(tier=result.tier, intent=result.intent)
+        return result
+
+
+INTENT_CLASSIFIER: Optional[TieredIntentClassifier] = None
+
+
+def getIntentClassifier() -> TieredIntentClassifier:
+    """Process wide tiered classifier, the centroids are warmed by lifespan."""
+    global INTENT_CLASSIFIER
+    if INTENT_CLASSIFIER is None:
+        INTENT_CLASSIFIER = TieredIntentClassifier.fromEnv()
+    return INTENT_CLASSIFIER
@@ -0,0 +1,609 @@
+# llmGateway.py
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+from langchain_core.callbacks import AsyncCallbackManager, BaseCallbackHandler
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    convert_to_messages,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, LLMResult
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig, ensure_config
+
+from app.metrics import computedGauge, counter, gauge, hitRatio, histogram
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Lower runs first. Set with RunnableConfig metadata {LLM_PRIORITY: ...}.
+LLM_PRIORITY = "llm_priority"
+PRIORITY_RESUME = 0  # Interrupted Sales flows, the user already answered a question.
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2  # History compaction, nobody waits for it.
+
+LLM_GATEWAY_INFLIGHT = gauge("llm_gateway_inflight", "LLM calls holding a gateway slot.")
+LLM_GATEWAY_QUEUED = gauge("llm_gateway_queued", "LLM calls waiting for a slot.", ["queue"])
+LLM_GATEWAY_LIMIT = gauge("llm_gateway_limit", "Current adaptive global LLM concurrency limit.")
+LLM_GATEWAY_WAIT_SECONDS = histogram(
+    "llm_gateway_wait_seconds", "Time LLM calls waited for admission.", ["priority"]
+)
+LLM_GATEWAY_REJECTED = counter(
+    "llm_gateway_rejected_total",
+    "LLM calls shed by the gateway, by reason: queue_full, timeout or tokens.",
+    ["reason"],
+)
+LLM_DEDUP_REQUESTS = counter(
+    "llm_dedup_requests_total",
+    "LLM calls by result: upstream (sent to the provider) or coalesced (shared an identical in-flight call).",
+    ["result"],
+)
+LLM_DEDUP_RATIO = computedGauge(
+    "llm_dedup_ratio",
+    "Share of LLM calls answered by an identical in-flight call.",
+    [],
+    hitRatio(LLM_DEDUP_REQUESTS, hits=("coalesced",)),
+)
+LLM_GATEWAY_RETRIES = counter(
+    "llm_gateway_retries_total",
+    "LLM calls retried after a provider error, by reason: rate_limit or transient.",
+    ["reason"],
+)
+
+
+class LlmBusyError(Exception):
+    """The gateway shed the call, the socket gets a "busy" frame."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"LLM gateway busy: {reason}")
+        self.reason = reason
+
+
+class AdmissionQueue:
+    """
+    Concurrency limit with a priority wait queue, lowest priority value
+    first and FIFO within a priority. The limit can change at runtime.
+    """
+
+    def __init__(self, name: str, limit: int, maxQueue: int) -> None:
+        self.name = name
+        self.limit = max(1, limit)
+        self.active = 0
+        self.__maxQueue = maxQueue
+        self.__waiters: list[tuple[int, int, asyncio.Future]] = []
+        # Callers still waiting, the heap also holds timed out or cancelled ones.
+        self.__live = 0
+        self.__order = itertools.count()
+
+    def __len__(self) -> int:
+        return self.__live
+
+    async def acquire(self, priority: int, timeout: float) -> None:
+        if self.active < self.limit and not self.__live:
+            self.active += 1
+            return
+        if self.__live >= self.__maxQueue:
+            LLM_GATEWAY_REJECTED.inc(reason="queue_full")
+            raise LlmBusyError("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.__waiters, (priority, next(self.__order), future))
+        self.__live += 1
+        LLM_GATEWAY_QUEUED.inc(queue=self.name)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as err:
+            if future.done() and not future.cancelled():
+                # Granted while the caller gave up, pass the slot on.
+                self.release()
+            else:
+                self.__left()
+            if isinstance(err, asyncio.TimeoutError):
+                LLM_GATEWAY_REJECTED.inc(reason="timeout")
+                raise LlmBusyError("timeout") from None
+            raise
+        finally:
+            LLM_GATEWAY_QUEUED.dec(queue=self.name)
+
+    def __left(self) -> None:
+        """A waiter gave up, drop the stale entries once they outnumber live ones."""
+        self.__live -= 1
+        stale = len(self.__waiters) - self.__live
+        if stale > 32 and stale > self.__live:
+            self.__waiters = [w for w in self.__waiters if not w[2].done()]
+            heapq.heapify(self.__waiters)
+
+    def release(self) -> None:
+        self.active -= 1
+        self.wake()
+
+    def wake(self) -> None:
+        while self.active < self.limit and self.__waiters:
+            _, _, future = heapq.heappop(self.__waiters)
+            if future.done():  # Timed out or cancelled waiter.
+                continue
+            self.active += 1
+            self.__live -= 1
+            future.set_result(None)
+
+
+class TokenBudget:
+    """Token bucket of the provider tokens-per-minute limit."""
+
+    def __init__(self, perMinute: int) -> None:
+        self.__capacity = float(perMinute)
+        self.__tokens = float(perMinute)
+        self.__rate = perMinute / 60.0
+        self.__updated = time.monotonic()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+        self.__updated = now
+
+    async def reserve(self, tokens: int, deadline: float) -> None:
+        # A single call larger than the bucket only waits for a full bucket.
+        need = min(float(tokens), self.__capacity)
+        while True:
+            self.__refill()
+            if self.__tokens >= need:
+                self.__tokens -= tokens
+                return
+            wait = (need - self.__tokens) / self.__rate
+            if time.monotonic() + wait > deadline:
+                LLM_GATEWAY_REJECTED.inc(reason="tokens")
+                raise LlmBusyError("tokens")
+            await asyncio.sleep(wait)
+
+    def adjust(self, tokens: int) -> None:
+        """Correct a reservation by the difference of actual and estimated tokens."""
+        self.__refill()
+        self.__tokens -= tokens
+
+
+def promptMessages(value: Any) -> list[BaseMessage]:
+    if isinstance(value, PromptValue):
+        return value.to_messages()
+    if isinstance(value, str):
+        return convert_to_messages([("user", value)])
+    return convert_to_messages(value)
+
+
+def estimateTokens(value: Any, config: Optional[RunnableConfig]) -> int:
+    """Approximate prompt tokens plus the configured output limit."""
+    try:
+        prompt = count_tokens_approximately(promptMessages(value))
+    except Exception:
+        prompt = len(str(value)) // 4
+    maxTokens = ((config or {}).get("configurable") or {}).get("output_max_token") or 512
+    return prompt + int(maxTokens)
+
+
+def actualTokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+def retryReason(err: BaseException) -> Optional[str]:
+    """rate_limit, transient or None when retrying can't help."""
+    status = getattr(err, "status_code", None)
+    name = type(err).__name__
+    if status == 429 or name == "RateLimitError":
+        return "rate_limit"
+    if status in (408, 409) or (isinstance(status, int) and status >= 500):
+        return "transient"
+    if name in ("APIConnectionError", "APITimeoutError", "InternalServerError"):
+        return "transient"
+    return None
+
+
+def retryAfter(err: BaseException) -> Optional[float]:
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LlmAdmission:
+    """
+    Shared admission state of every gated model: a global and per-node
+    priority queue, the tokens-per-minute budget and the adaptive limit.
+    Rate limit errors halve the global limit and pause new calls for the
+    backoff (AIMD), each `limit` successful calls raise it by one again.
+    """
+
+    def __init__(
+        self,
+        limit: int = 32,
+        nodeLimits: Optional[Dict[str, int]] = None,
+        tokensPerMinute: int = 0,
+        maxQueue: int = 256,
+        queueTimeout: float = 20.0,
+        maxRetries: int = 4,
+        backoffBase: float = 0.5,
+        backoffMax: float = 20.0,
+    ) -> None:
+        self.__maxLimit = max(1, limit)
+        self.__global = AdmissionQueue("global", limit, maxQueue)
+        self.__nodes = {
+            node: AdmissionQueue(node, nodeLimit, maxQueue)
+            for node, nodeLimit in (nodeLimits or {}).items()
+        }
+        self.__budget = TokenBudget(tokensPerMinute) if tokensPerMinute > 0 else None
+        self.__queueTimeout = queueTimeout
+        self.__maxRetries = maxRetries
+        self.__backoffBase = backoffBase
+        self.__backoffMax = backoffMax
+        self.__pausedUntil = 0.0
+        # 429s of one burst halve the limit once, until this time.
+        self.__decreasedUntil = 0.0
+        self.__successes = 0
+        LLM_GATEWAY_LIMIT.set(self.__global.limit)
+
+    def __rateLimited(self, delay: float) -> None:
+        now = time.monotonic()
+        self.__pausedUntil = max(self.__pausedUntil, now + delay)
+        if now < self.__decreasedUntil:
+            return  # Same burst, the limit is already halved.
+        self.__decreasedUntil = now + max(delay, self.__backoffBase)
+        self.__global.limit = max(1, self.__global.limit // 2)
+        self.__successes = 0
+        LLM_GATEWAY_LIMIT.set(self.__global.limit)
+
+    def __succeeded(self) -> None:
+        if self.__global.limit >= self.__maxLimit:
+            return
+        self.__successes += 1
+        if self.__successes >= self.__global.limit:
+            self.__successes = 0
+            self.__global.limit += 1
+            LLM_GATEWAY_LIMIT.set(self.__global.limit)
+            self.__global.wake()
+
+    def backoff(self, attempt: int, err: BaseException) -> float:
+        """Full jitter exponential backoff, at least the provider's Retry-After."""
+        delay = random.uniform(0, min(self.__backoffMax, self.__backoffBase * 2**attempt))
+        return max(delay, retryAfter(err) or 0.0)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        value: Any,
+        config: Optional[RunnableConfig],
+    ) -> Any:
+        metadata = (config or {}).get("metadata") or {}
+        priority = int(metadata.get(LLM_PRIORITY, PRIORITY_DEFAULT))
+        nodeQueue = self.__nodes.get(metadata.get("langgraph_node") or "")
+        start = time.monotonic()
+        deadline = start + self.__queueTimeout
+
+        if self.__pausedUntil > start:
+            if self.__pausedUntil > deadline:
+                LLM_GATEWAY_REJECTED.inc(reason="timeout")
+                raise LlmBusyError("timeout")
+            await asyncio.sleep(self.__pausedUntil - start)
+        if nodeQueue is not None:
+            await nodeQueue.acquire(priority, max(0.0, deadline - time.monotonic()))
+        try:
+            await self.__global.acquire(priority, max(0.0, deadline - time.monotonic()))
+            try:
+                LLM_GATEWAY_WAIT_SECONDS.observe(time.monotonic() - start, priority=str(priority))
+                estimate = estimateTokens(value, config)
+                if self.__budget is not None:
+                    await self.__budget.reserve(estimate, deadline)
+                LLM_GATEWAY_INFLIGHT.inc()
+                try:
+                    result = await self.__withRetries(call)
+                finally:
+                    LLM_GATEWAY_INFLIGHT.dec()
+                actual = actualTokens(result)
+                if self.__budget is not None and actual is not None:
+                    self.__budget.adjust(actual - estimate)
+                return result
+            finally:
+                self.__global.release()
+        finally:
+            if nodeQueue is not None:
+                nodeQueue.release()
+
+    async def __withRetries(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            try:
+                result = await call()
+                self.__succeeded()
+                return result
+            except Exception as err:
+                reason = retryReason(err)
+                if reason is None or attempt >= self.__maxRetries:
+                    raise
+                delay = self.backoff(attempt, err)
+                if reason == "rate_limit":
+                    self.__rateLimited(delay)
+                LLM_GATEWAY_RETRIES.inc(reason=reason)
+                logger.info("LLM %s, retry %s in %.2fs", reason, attempt + 1, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    @classmethod
+    def fromEnv(cls) -> "LlmAdmission":
+        nodeLimits = {}
+        for part in os.getenv("LLM_NODE_LIMITS", "").split(","):
+            if "=" in part:
+                node, limit = part.split("=", 1)
+                nodeLimits[node.strip()] = int(limit)
+        return cls(
+            limit=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            nodeLimits=nodeLimits,
+            tokensPerMinute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "0")),
+            maxQueue=int(os.getenv("LLM_MAX_QUEUE", "256")),
+            queueTimeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "20")),
+            maxRetries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+        )
+
+
+# Configurable fields that change the upstream request, part of the coalescing key.
+KEY_CONFIGURABLE = ("output_max_token", "output_reasoning_effort")
+# Run metadata of coalesced calls, metrics and spans skip them.
+LLM_COALESCED = "llm_coalesced"
+_DONE = object()
+
+
+class FlightTokens(BaseCallbackHandler):
+    """Copies the leader's streamed tokens into its flight."""
+
+    run_inline = True
+
+    def __init__(self, flight: "Flight") -> None:
+        self.__flight = flight
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.__flight.push(token)
+
+
+class Flight:
+    """One upstream call shared by identical concurrent callers."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.task: Optional[asyncio.Task] = None
+        # Callers waiting on the task, the last one to leave cancels it.
+        self.waiters = 0
+        self.tokens: list[str] = []
+        self.__listeners: list[asyncio.Queue] = []
+        self.__closed = False
+
+    def push(self, token: str) -> None:
+        self.tokens.append(token)
+        for listener in self.__listeners:
+            listener.put_nowait(token)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Tokens so far and every later one, then _DONE."""
+        listener: asyncio.Queue = asyncio.Queue()
+        for token in self.tokens:
+            listener.put_nowait(token)
+        if self.__closed:
+            listener.put_nowait(_DONE)
+        else:
+            self.__listeners.append(listener)
+        return listener
+
+    def close(self) -> None:
+        self.__closed = True
+        for listener in self.__listeners:
+            listener.put_nowait(_DONE)
+
+
+class LlmCoalescer:
+    """
+    Single flight of identical in-flight LLM calls. Calls with the same
+    rendered prompt, model variant and configurable fields share the first
+    caller's upstream request. Later callers get its result and, through
+    their own callback run, its streamed tokens, so streaming sockets still
+    see token frames. The upstream call runs as its own task, a cancelled
+    caller doesn't cancel it for the others, the last caller leaving does.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.__flights: Dict[str, Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self.__flights)
+
+    @staticmethod
+    def key(
+        variant: str, value: Any, config: RunnableConfig, kwargs: Dict[str, Any]
+    ) -> Optional[str]:
+        try:
+            messages = [(m.type, m.content) for m in promptMessages(value)]
+        except Exception:
+            return None
+        configurable = config.get("configurable") or {}
+        payload = json.dumps(
+            [variant, messages, [configurable.get(k) for k in KEY_CONFIGURABLE], kwargs],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def run(
+        self,
+        key: Optional[str],
+        value: Any,
+        config: RunnableConfig,
+        call: Callable[[RunnableConfig], Awaitable[Any]],
+    ) -> Any:
+        if not self.enabled or key is None:
+            return await call(config)
+
+        flight = self.__flights.get(key)
+        if flight is not None:
+            LLM_DEDUP_REQUESTS.inc(result="coalesced")
+            flight.waiters += 1
+            try:
+                return await self.__follow(flight, value, config)
+            finally:
+                self.__leave(flight)
+
+        LLM_DEDUP_REQUESTS.inc(result="upstream")
+        flight = self.__flights[key] = Flight(key)
+        flight.task = asyncio.ensure_future(call(withHandler(config, FlightTokens(flight))))
+
+        def done(_: asyncio.Task) -> None:
+            self.__forget(flight)
+            flight.close()
+
+        flight.task.add_done_callback(done)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self.__leave(flight)
+
+    def __forget(self, flight: Flight) -> None:
+        # A cancelled flight may already be replaced by a new one of the same key.
+        if self.__flights.get(flight.key) is flight:
+            del self.__flights[flight.key]
+
+    def __leave(self, flight: Flight) -> None:
+        """Nobody waits for the result any more, stop the upstream request."""
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            self.__forget(flight)
+            flight.task.cancel()
+
+    async def __follow(self, flight: Flight, value: Any, config: RunnableConfig) -> Any:
+        """Replay the flight into this caller's callbacks, as if it made the call."""
+        callbacks = AsyncCallbackManager.configure(
+            inheritable_callbacks=config.get("callbacks"),
+            inheritable_tags=config.get("tags"),
+            inheritable_metadata=config.get("metadata"),
+            local_metadata={LLM_COALESCED: True},
+        )
+        runs = await callbacks.on_chat_model_start(
+            {"name": "LlmGateway"}, [promptMessages(value)], name="coalesced_llm_call"
+        )
+        try:
+            listener = flight.subscribe()
+            while (token := await listener.get()) is not _DONE:
+                await replayToken(runs, token)
+            result = await asyncio.shield(flight.task)
+        except BaseException as err:
+            for run in runs:
+                await run.on_llm_error(err)
+            raise
+
+        content = getattr(result, "content", None)
+        if isinstance(content, str):
+            if not flight.tokens and content:
+                # The leader didn't stream, a streaming follower gets the answer at once.
+                await replayToken(runs, content)
+            generations = [[ChatGeneration(message=AIMessage(content=content))]]
+        else:
+            generations = [[]]
+        for run in runs:
+            await run.on_llm_end(LLMResult(generations=generations))
+        # Structured outputs are pydantic objects, each caller gets its own.
+        return result.model_copy(deep=True) if hasattr(result, "model_copy") else result
+
+
+async def replayToken(runs: list, token: str) -> None:
+    chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+    for run in runs:
+        await run.on_llm_new_token(token, chunk=chunk)
+
+
+def withHandler(config: RunnableConfig, handler: BaseCallbackHandler) -> RunnableConfig:
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = [*callbacks, handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    return RunnableConfig(**{**config, "callbacks": callbacks})
+
+
+class LlmGateway(Runnable):
+    """
+    Chat model wrapper admitting every call through LlmAdmission, after
+    identical in-flight calls are coalesced by LlmCoalescer.
+    Keeps the surface the nodes use: with_config (configurable fields pass
+    through the config), with_structured_output and use in `prompt | llm`
+    chains. Callbacks in the config reach the wrapped model, so token
+    streaming and metrics are unchanged.
+    """
+
+    def __init__(
+        self,
+        model: Runnable,
+        admission: LlmAdmission,
+        coalescer: Optional[LlmCoalescer] = None,
+        variant: Optional[str] = None,
+    ) -> None:
+        self.model = model
+        self.admission = admission
+        self.coalescer = coalescer if coalescer is not None else LlmCoalescer(enabled=False)
+        # Model and output schema, structured variants must not share results with chat.
+        self.variant = variant or f"model-{id(model)}"
+
+    @property
+    def InputType(self) -> Any:
+        return self.model.InputType
+
+    @property
+    def OutputType(self) -> Any:
+        return self.model.OutputType
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        """Sync calls bypass admission, every graph path is async."""
+        return self.model.invoke(input, config, **kwargs)
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        # Merge the node's run config (langgraph_node, priority) from the context.
+        config = ensure_config(config)
+        return await self.coalescer.run(
+            self.coalescer.key(self.variant, input, config, kwargs),
+            input,
+            config,
+            lambda runConfig: self.admission.run(
+                lambda: self.model.ainvoke(input, runConfig, **kwargs), input, runConfig
+            ),
+        )
+
+    async def astream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        # Admitted as one call, the stream is collected and re-yielded.
+        yield await self.ainvoke(input, config, **kwargs)
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> "LlmGateway":
+        schemaName = getattr(schema, "__qualname__", None) or str(schema)
+        return LlmGateway(
+            self.model.with_structured_output(schema, **kwargs),
+            self.admission,
+            self.coalescer,
+            f"{self.variant}:{getattr(schema, '__module__', '')}.{schemaName}:{sorted(kwargs.items())}",
+        )
+
+
+LLM_ADMISSION = LlmAdmission.fromEnv()
+LLM_COALESCER = LlmCoalescer(enabled=os.getenv("LLM_DEDUP", "true").lower() == "true")
@@ -0,0 +1,250 @@
+# metrics.py
+
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """Base metric, values are keyed by the tuple of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _format(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()) -> None:
+        super().__init__(name, description, labels)
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self.__values.get(self._key(labels), 0.0)
+
+    def items(self) -> list[Tuple[Tuple[str, ...], float]]:
+        with self._lock:
+            return list(self.__values.items())
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines.extend(f"{self.name}{self._format(k)} {v}" for k, v in self.items())
+        return lines
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()) -> None:
+        super().__init__(name, description, labels)
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self.__values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self.__values.items())
+        lines.extend(f"{self.name}{self._format(k)} {v}" for k, v in items)
+        return lines
+
+
+class ComputedGauge(Metric):
+    """Gauge evaluated at scrape time, nothing is recorded on the hot path."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Iterable[str],
+        collect: Callable[[], Dict[Tuple[str, ...], float]],
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.__collect = collect
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines.extend(f"{self.name}{self._format(k)} {v}" for k, v in self.__collect().items())
+        return lines
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self.__values: Dict[Tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self.__values.get(key)
+            if row is None:
+                row = self.__values[key] = [0.0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def count(self, **labels: str) -> float:
+        row = self.__values.get(self._key(labels))
+        return sum(row[:-1]) if row else 0.0
+
+    def sum(self, **labels: str) -> float:
+        row = self.__values.get(self._key(labels))
+        return row[-1] if row else 0.0
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self.__values.items()]
+        for key, row in items:
+            cumulative = 0.0
+            for bound, hits in zip(self.buckets, row):
+                cumulative += hits
+                lines.append(
+                    f"{self.name}_bucket{self._format(key, {'le': str(bound)})} {cumulative}"
+                )
+            cumulative += row[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{self._format(key, {'le': '+Inf'})} {cumulative}")
+            lines.append(f"{self.name}_count{self._format(key)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format(key)} {row[-1]}")
+        return lines
+
+
+REGISTRY: Dict[str, Metric] = {}
+
+
+def counter(name: str, description: str, labels: Iterable[str] = ()) -> Counter:
+    return _register(Counter(name, description, labels))
+
+
+def gauge(name: str, description: str, labels: Iterable[str] = ()) -> Gauge:
+    return _register(Gauge(name, description, labels))
+
+
+def histogram(
+    name: str,
+    description: str,
+    labels: Iterable[str] = (),
+    buckets: Iterable[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, description, labels, buckets))
+
+
+def computedGauge(
+    name: str,
+    description: str,
+    labels: Iterable[str],
+    collect: Callable[[], Dict[Tuple[str, ...], float]],
+) -> ComputedGauge:
+    return _register(ComputedGauge(name, description, labels, collect))
+
+
+def hitRatio(source: Counter, result: str = "result", hits: Iterable[str] = ("hit",)):
+    """
+    Collect function of the hit share per remaining labels of `source`,
+    computed from its counters when scraped.
+    """
+    position = source.labels.index(result)
+    hitValues = set(hits)
+
+    def collect() -> Dict[Tuple[str, ...], float]:
+        totals: Dict[Tuple[str, ...], list[float]] = {}
+        for key, value in source.items():
+            group = key[:position] + key[position + 1 :]
+            row = totals.setdefault(group, [0.0, 0.0])
+            row[1] += value
+            if key[position] in hitValues:
+                row[0] += value
+        return {group: hit / total for group, (hit, total) in totals.items() if total}
+
+    return collect
+
+
+def _register(metric):
+    """Return the already registered metric for a name, modules may be re-imported on reload."""
+    existing = REGISTRY.get(metric.name)
+    if existing is not None:
+        return existing
+    REGISTRY[metric.name] = metric
+    return metric
+
+
+def renderMetrics() -> str:
+    """Prometheus text exposition format of every registered metric."""
+    lines: list[str] = []
+    for metric in list(REGISTRY.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
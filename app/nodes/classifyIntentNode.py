@@ -1,19 +1,19 @@
 # classifyIntentNode.py
 
 import logging
+from app.intentClassifier import (
+    INTENT_TIER_REQUESTS,
+    classifyByRules,
+    getIntentClassifier,
+)
+from app.llmGateway import LlmBusyError
+from app.nodes.ragNode import RETRIEVAL_PREFETCHER
 from app.utility import GraphContext, GraphState, IndentSchema, OrderDetails
 from langgraph.runtime import Runtime
 
 logger = logging.getLogger(__name__)
 
-
-async def classifyIntentNode(
-    state: GraphState, runtime: Runtime[GraphContext]
-) -> GraphState:
-    """This node extracts intent classifications variables"""
-    try:
-        logger.info("Starting classifyIntentNode Node...")
-        systemPrompt = """
+CLASSIFY_PROMPT = """
 ### ROLE
 You are a High-Precision Intent Classifier and Entity Extractor. Your output determines the routing of a mission-critical workflow.
 
@@ -50,17 +50,42 @@ You are a High-Precision Intent Classifier and Entity Extractor. Your output det
 - If the user is checking "Where is" it, classify as **Sales**.
 """
 
-        llm = runtime.context.llm
-        structured_llm = llm.with_structured_output(IndentSchema).with_config(
-            configurable={"output_max_token": 1500}
-        )
 
-        aiResponse = IndentSchema.model_validate(
-            await structured_llm.ainvoke(
-                [("system", systemPrompt), ("user", state.query)]
-            ),
-            extra="ignore",
-        )
+async def classifyWithLlm(llm, query: str) -> IndentSchema:
+    """The full structured output classification, the slow and costly tier."""
+    structured_llm = llm.with_structured_output(IndentSchema).with_config(
+        configurable={"output_max_token": 1500}
+    )
+    return IndentSchema.model_validate(
+        await structured_llm.ainvoke([("system", CLASSIFY_PROMPT), ("user", query)]),
+        extra="ignore",
+    )
+
+
+async def classifyIntentNode(
+    state: GraphState, runtime: Runtime[GraphContext]
+) -> GraphState:
+    """This node extracts intent classifications variables"""
+    try:
+        logger.info("Starting classifyIntentNode Node...")
+        if RETRIEVAL_PREFETCHER.enabled and classifyByRules(state.query) is None:
+            # Retrieve for a possible Support route while classification runs.
+            RETRIEVAL_PREFETCHER.start(state)
+        fastResult = await getIntentClassifier().classify(state.query)
+        if fastResult is not None:
+            state.intent = fastResult.intent
+            state.order = OrderDetails(
+                orderId=fastResult.orderId, orderItem=fastResult.orderItem
+            )
+            state.summary = f"Summary: {state.query} | Order Id: {fastResult.orderId} | Item: {fastResult.orderItem}"
+            state.status = f"classify intent finished by {fastResult.tier}"
+            logger.info(
+                "Classified by %s tier. Intent: %s", fastResult.tier, fastResult.intent
+            )
+            return state
+
+        aiResponse = await classifyWithLlm(runtime.context.llm, state.query)
+        INTENT_TIER_REQUESTS.inc(tier="llm", intent=aiResponse.intent)
         state.intent = aiResponse.intent
         state.order = OrderDetails(
             orderId=aiResponse.orderId, orderItem=aiResponse.orderItem
@@ -77,7 +102,11 @@ You are a High-Precision Intent Classifier and Entity Extractor. Your output det
         )
         logger.info("Node status: %s", state.status)
         return state
+    except LlmBusyError:
+        RETRIEVAL_PREFETCHER.discard(state)
+        raise  # Load shedding, not a node failure.
     except Exception as err:
+        RETRIEVAL_PREFETCHER.discard(state)
         logger.exception(
             "Node level exception. %s",
             err,
@@ -1,15 +1,15 @@
 # generalChatNode.py
 
 import logging
-from app.utility import GraphContext, GraphState
+from app.cache import SEMANTIC_CACHE
+from app.nodes.ragNode import getVectorDb
+from app.history import isFirstTurn, promptHistory
+from app.llmGateway import LlmBusyError
+from app.utility import GraphContext, GraphState, nodeResponse
 from langgraph.runtime import Runtime
-from langchain_core.prompts import (
-    ChatPromptTemplate,
-    MessagesPlaceholder,
-    FewShotChatMessagePromptTemplate,
-)
+from app.prompts import NO_ORDER_ID_NOTE, PROMPTS
+from langchain_core.messages import SystemMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import AIMessage, HumanMessage
 
 logger = logging.getLogger(__name__)
 
@@ -17,68 +17,39 @@ logger = logging.getLogger(__name__)
 async def generalChatNode(state: GraphState, runtime: Runtime[GraphContext]) -> dict:
     """General conversation with AI"""
     try:
-
-        # Train AI with examples
-        examples = [
-            {
-                "input": "Hi, how are you today?",
-                "output": "I'm doing great, thank you for asking! I'm ready to help you with any order or inventory questions. What's on your mind?",
-            },
-            {
-                "input": "My package is late and I'm really frustrated.",
-                "output": "I completely understand how frustrating it is to wait for a late delivery. I'm here to help—let me look into your order details right away to see what's happening."
-                + (
-                    "It looks like I don't have your order number."
-                    if not state.order or not state.order.orderId
-                    else ""
-                ),
-            },
-            {
-                "input": "Do you sell shoes?",
-                "output": "We focus on bags, electronics, and accessories like belts and wallets. You can check our current inventory by asking me about specific items!",
-            },
-        ]
-
-        examplePrompt = ChatPromptTemplate.from_messages(
-            [("human", "{input}"), ("ai", "{output}")]
-        )
-
-        trainedPrompt = FewShotChatMessagePromptTemplate(
-            example_prompt=examplePrompt, examples=examples
-        )
-
-        systemPrompt = """
-You are "Sara Khan" an empathetic, concise, and professional customer support executive. Your goal is to assist the user with general inquiries while maintaining a helpful and grounded tone.
-        """
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", systemPrompt),
-                trainedPrompt,
-                MessagesPlaceholder(variable_name="history"),
-                ("user", "{input}"),
-            ]
-        )
+        vdb = getVectorDb()
+        queryEmbedding = None
+        # Answers are shared across users, only for prompts without user context.
+        hasOrderId = bool(state.order and state.order.orderId)
+        if SEMANTIC_CACHE.enabled("General") and isFirstTurn(state) and not hasOrderId:
+            queryEmbedding = await vdb.embedQuery(state.query)
+            cachedResponse = SEMANTIC_CACHE.lookup("General", vdb.version, queryEmbedding)
+            if cachedResponse is not None:
+                status = "general conversation answered from cache"
+                logger.info("Node status: %s", status)
+                return nodeResponse(state, cachedResponse, status)
 
         model = runtime.context.llm.with_config(configurable={"output_max_token": 500})
-        chain = prompt | model | StrOutputParser()
+        chain = PROMPTS["generalChat"] | model | StrOutputParser()
 
+        notes = []
+        if not hasOrderId:
+            notes.append(SystemMessage(content=NO_ORDER_ID_NOTE))
         aiResponse = await chain.ainvoke(
             {
-                "history": state.history or [],
+                "history": promptHistory(state),
+                "notes": notes,
                 "input": state.query,
             }
         )
 
+        if queryEmbedding is not None:
+            SEMANTIC_CACHE.store("General", vdb.version, queryEmbedding, aiResponse)
         status = "general conversation finished"
         logger.info("Node status: %s", status)
-        return {
-            "history": [
-                HumanMessage(content=state.query),
-                AIMessage(content=aiResponse),
-            ],
-            "response": aiResponse,
-            "status": status,
-        }
+        return nodeResponse(state, aiResponse, status)
+    except LlmBusyError:
+        raise  # Load shedding, not a node failure.
     except Exception as err:
         logger.exception(
             "Node level exception. %s",
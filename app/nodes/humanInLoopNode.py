@@ -1,8 +1,18 @@
 # humanInLoopNode.py
 
 import logging
-from typing import Literal
-from app.utility import GraphContext, GraphState, InterruptState, OrderDetails
+from typing import Literal, Optional
+from app.intentClassifier import extractOrderId
+from app.llmGateway import LlmBusyError
+from app.metrics import counter
+from app.nodes.salesNode import getSqlDb
+from app.utility import (
+    GraphContext,
+    GraphState,
+    InterruptState,
+    OrderDetails,
+    nodeResponse,
+)
 from langgraph.runtime import Runtime
 from langgraph.types import Command, interrupt
 from langgraph.graph import END
@@ -10,6 +20,31 @@ from langgraph.errors import GraphInterrupt
 
 logger = logging.getLogger(__name__)
 
+ORDER_EXTRACTIONS = counter(
+    "order_extractions_total",
+    "Order details extracted from interrupt replies, by method (rules or llm).",
+    ["method"],
+)
+
+
+async def extractOrder(reply: str) -> Optional[OrderDetails]:
+    """Order id or a known item name from the reply, None when neither is found."""
+    orderId = extractOrderId(reply, allowBare=True)
+    if orderId:
+        return OrderDetails(orderId=orderId, orderItem=None)
+    item = await getSqlDb().matchItem(reply)
+    if item:
+        return OrderDetails(orderId=None, orderItem=item)
+    return None
+
+
+async def withKnownItem(order: OrderDetails) -> Optional[OrderDetails]:
+    """The order with its item filled from the orders table, None for an unknown id."""
+    row = await getSqlDb().findOrder(order.orderId or "")
+    if row is None:
+        return None
+    return OrderDetails(orderId=row["orderId"], orderItem=row["orderItem"])
+
 
 async def humanInLoopNode(state: GraphState, runtime: Runtime[GraphContext]) -> Command[
     Literal[
@@ -23,30 +58,45 @@ async def humanInLoopNode(state: GraphState, runtime: Runtime[GraphContext]) ->
         )
 
         order = state.order or OrderDetails(orderId=None, orderItem=None)
+        if order.orderId and not order.orderItem:
+            # A known order id already names its item.
+            order = await withKnownItem(order) or order
         # Check Order id and Item exists or not
         if order.orderId and order.orderItem:
             state.status = "human in loop not interrupted"
             logger.info("Node status: %s", state.status)
-            return Command(update={"status": state.status}, goto="sales")
+            return Command(update={"order": order, "status": state.status}, goto="sales")
 
         payload.assistantQuery = f"Plase provide {'order id' if not order.orderId else ''}{' and ' if not order.orderId else ''}item."
         state.status = "human in loop interrupted"
         logger.info("Node status: %s", state.status)
         resp = interrupt(value=payload)
-        interruptResponse = InterruptState(
-            requestId=resp["requestId"],
-            userResponse=resp["userResponse"],
-            assistantQuery=resp["assistantQuery"],
-        )
+        # Resume value is an InterruptState, or its dict once loaded from a checkpoint.
+        interruptResponse = InterruptState.model_validate(resp)
 
         if interruptResponse.userResponse:
-            llm = runtime.context.llm
-            structured_llm = llm.with_structured_output(OrderDetails).with_config(
-                configurable={"output_max_token": 500}
-            )
-            order = await structured_llm.ainvoke(
-                f"You are very intelligent AI. Extract values from {interruptResponse.userResponse}"
-            )
+            extracted = await extractOrder(interruptResponse.userResponse)
+            if extracted is not None:
+                ORDER_EXTRACTIONS.inc(method="rules")
+                order = extracted
+            else:
+                ORDER_EXTRACTIONS.inc(method="llm")
+                llm = runtime.context.llm
+                structured_llm = llm.with_structured_output(OrderDetails).with_config(
+                    configurable={"output_max_token": 500}
+                )
+                order = await structured_llm.ainvoke(
+                    f"You are very intelligent AI. Extract values from {interruptResponse.userResponse}"
+                )
+            if order.orderId:
+                knownOrder = await withKnownItem(order)
+                if knownOrder is None and not order.orderItem:
+                    status = "human in loop finished, unknown order id"
+                    logger.info("Node status: %s", status)
+                    aiResponse = f"I couldn't find an order with id {order.orderId}. Please check the order id and try again."
+                    return Command(update=nodeResponse(state, aiResponse, status), goto=END)
+                # An unknown id would hide the item match, search by the item alone.
+                order = knownOrder or OrderDetails(orderId=None, orderItem=order.orderItem)
             state.status = "human in loop resumed, user answered"
             logger.info("Node status: %s", state.status)
             return Command(
@@ -61,6 +111,8 @@ async def humanInLoopNode(state: GraphState, runtime: Runtime[GraphContext]) ->
         return Command(goto=END)
     except GraphInterrupt as gerr:
         raise
+    except LlmBusyError:
+        raise  # Load shedding, not a node failure.
     except Exception as err:
         logger.exception(
             "Node level exception. %s",
@@ -1,82 +1,105 @@
 # ragNode.py
 
+import asyncio
+import fcntl
 from functools import cached_property
 import logging
 import os
+import threading
+import time
+from typing import Dict, Optional
 import dotenv
-from app.utility import GraphContext, GraphState
+from app.history import isFirstTurn, promptHistory
+from app.utility import GraphContext, GraphState, nodeResponse
 from langgraph.runtime import Runtime
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEndpointEmbeddings
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.embeddings import Embeddings
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    UnstructuredWordDocumentLoader,
-    TextLoader,
-)
 from pathlib import Path
+from app.cache import SEMANTIC_CACHE, AsyncCache, normalizeQuery
+from app.embeddings import getEmbeddings
+from app.ingestion import IngestionPipeline, IngestReport
+from app.llmGateway import LlmBusyError
+from app.metrics import counter, histogram
+from app.prompts import PROMPTS
+from app.tracing import span
 
 dotenv.load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+SPECULATIVE_RETRIEVALS = counter(
+    "speculative_retrievals_total",
+    "Retrievals prefetched during intent classification: started, used, wasted or failed.",
+    ["result"],
+)
+RETRIEVAL_WAIT_SECONDS = histogram(
+    "rag_retrieval_wait_seconds",
+    "Time ragNode waited for retrieval, prefetched or searched directly.",
+    ["source"],
+)
+CHROMA_SEARCH_SECONDS = histogram(
+    "chroma_search_seconds", "Chroma similarity search latency, embedding excluded."
+)
+QUERY_EMBED_SECONDS = histogram(
+    "query_embedding_seconds", "Query embedding latency seen by search, cache hits included."
+)
+
 
 async def ragNode(state: GraphState, runtime: Runtime[GraphContext]) -> dict:
     """RAG retrive company policy and information from vector db"""
     try:
 
-        vdb = VectorDb()
-        ragContext = await vdb.search(state.query)
-        formattedRag = "\n".join(f"-{d}" for d in ragContext)
-
-        systemPrompt = """
-System: You are an expert Customer Support Executive. Your name is Ashma Khan.
-Your goal is to:
-1. Solve the user's problem effectively.
-2. Answer their questions accurately using only the provided context.
-
-Context:
-{support_context}
+        vdb = getVectorDb()
+        queryEmbedding = None
+        # Answers are shared across users, only for prompts without user context.
+        if SEMANTIC_CACHE.enabled("Support") and isFirstTurn(state):
+            queryEmbedding = await vdb.embedQuery(state.query)
+            cachedResponse = SEMANTIC_CACHE.lookup("Support", vdb.version, queryEmbedding)
+            if cachedResponse is not None:
+                RETRIEVAL_PREFETCHER.discard(state)
+                status = "rag node answered from cache"
+                logger.info("Node status: %s", status)
+                return nodeResponse(state, cachedResponse, status)
 
-Instructions:
-- If the context doesn't contain the answer, politely inform the user.
-- Maintain a professional, helpful, and concise tone.
-        """
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", systemPrompt),
-                MessagesPlaceholder(variable_name="history"),
-                ("user", "{input}"),
-            ]
-        )
+        start = time.perf_counter()
+        source = "direct"
+        ragContext = None
+        prefetched = RETRIEVAL_PREFETCHER.take(state)
+        if prefetched is not None:
+            try:
+                ragContext = await prefetched
+                source = "prefetch"
+            except Exception as err:
+                SPECULATIVE_RETRIEVALS.inc(result="failed")
+                logger.warning("Speculative retrieval failed, searching again. %s", err)
+        if ragContext is None:
+            ragContext = await vdb.search(state.query)
+        RETRIEVAL_WAIT_SECONDS.observe(time.perf_counter() - start, source=source)
+        formattedRag = "\n".join(f"-{d}" for d in ragContext)
 
         model = runtime.context.llm.with_config(
             configurable={
                 "output_max_token": 500,
             }
         )
-        chain = prompt | model | StrOutputParser()
+        chain = PROMPTS["rag"] | model | StrOutputParser()
 
         aiResponse = await chain.ainvoke(
             {
-                "history": state.history or [],
+                "history": promptHistory(state),
                 "support_context": formattedRag,
                 "input": state.query,
             }
         )
 
+        if queryEmbedding is not None:
+            SEMANTIC_CACHE.store("Support", vdb.version, queryEmbedding, aiResponse)
         status = "rag node finished"
         logger.info("Node status: %s", status)
-        return {
-            "history": [
-                HumanMessage(content=state.query),
-                AIMessage(content=aiResponse),
-            ],
-            "response": aiResponse,
-            "status": status,
-        }
+        return nodeResponse(state, aiResponse, status)
+    except LlmBusyError:
+        raise  # Load shedding, not a node failure.
     except Exception as err:
         logger.exception(
             "Node level exception. %s",
@@ -90,20 +113,52 @@ class VectorDb:
     def __init__(self, collection: str = "") -> None:
         self.__collection = collection or "rag_collection"
         self.__embedModel = "BAAI/bge-small-en-v1.5"
-        self.__embedPath = "http://embedding-engine:80"
         self.__dbPath = Path(os.getenv("VECTORDB_PATH", "chromedb"))
         self.__documentsPath = Path(
             os.getenv("VECTORDB_DOCUMENT_PATH", "chromaDocuments")
         )
-        if self.getTotalDocuments <= 0:
-            self.__insertDocs()
+        self.__ready = False
+        self.__warmLock = asyncio.Lock()
+        # Bumped whenever ingestion changes the collection, part of retrieval keys.
+        self.__version = 0
+        cacheSize = int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+        cacheTtl = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        self.__embeddingCache = AsyncCache("query_embedding", cacheSize, cacheTtl)
+        self.__retrievalCache = AsyncCache("retrieval", cacheSize, cacheTtl)
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    @property
+    def isReady(self) -> bool:
+        return self.__ready
+
+    def setup(self) -> None:
+        """
+        Blocking warm up: open the Chroma and embedding clients and ingest documents.
+        Runs in a worker thread, never on the event loop.
+        """
+        warmUp = getattr(self.__embeddings, "warmUp", None)
+        if warmUp:
+            warmUp()  # Load the in-process model before ingestion
+        self.ingest()
+        self.__embeddings.embed_query("warm up")  # Open the embedding connection
+        self.__ready = True
+        logger.info("Rag Vector DB: ready with %s documents", self.getTotalDocuments)
+
+    async def warmUp(self) -> None:
+        """Run setup once, concurrent callers wait for the same warm up."""
+        if self.__ready:
+            return
+        async with self.__warmLock:
+            if not self.__ready:
+                await asyncio.to_thread(self.setup)
 
     @cached_property
-    def __embeddings(self) -> HuggingFaceEndpointEmbeddings:
-        return HuggingFaceEndpointEmbeddings(
-            model=self.__embedPath,
-            task="feature-extraction",
-        )
+    def __embeddings(self) -> Embeddings:
+        """Embedding client, concurrent query embeddings are micro batched."""
+        return getEmbeddings()
 
     @cached_property
     def __db(self) -> Chroma:
@@ -122,43 +177,30 @@ class VectorDb:
     def getTotalDocuments(self):
         return self.__db._collection.count()
 
-    def __insertDocs(self):
+    def ingest(self) -> IngestReport:
         """
-        Upsert all docs within folder /chromaDocuments into db.
-        This will run only when vector db is empty.
+        Incremental ingestion of /chromaDocuments, only new or changed files
+        are embedded and chunks of deleted files are removed.
         """
         try:
-            folder = self.__documentsPath
-
-            if not folder.exists():
-                logger.info("Rag Vector DB: Document folder is don't exists.")
-                return
-
-            for filePath in folder.iterdir():
-                ext = filePath.suffix.lower()
-                if (
-                    not filePath.exists(follow_symlinks=False)
-                    or not filePath.is_file()
-                    or ext not in (".doc", ".pdf", ".txt", ".md")
-                ):
-                    continue
-
-                if ext == ".pdf":
-                    loader = PyPDFLoader(
-                        file_path=str(filePath),
-                    )
-                elif ext == ".doc":
-                    loader = UnstructuredWordDocumentLoader(filePath)
-                else:
-                    loader = TextLoader(filePath, encoding="utf-8")
-
-                documents = loader.load()
-                if len(documents) > 0:
-                    ids = self.__db.add_documents(documents)
-                    logger.info(
-                        f"Rag Vector DB: Total {len(ids)} documents created from {filePath.name}"
-                    )
-
+            self.__dbPath.mkdir(parents=True, exist_ok=True)
+            # Workers share the collection, the first one ingests and the
+            # others find an up to date manifest once they get the lock.
+            # Chroma is only opened under the lock, never mid ingestion.
+            with open(self.__dbPath / "ingest.lock", "w") as lockFile:
+                fcntl.flock(lockFile, fcntl.LOCK_EX)
+                pipeline = IngestionPipeline(
+                    self.__db,
+                    self.__documentsPath,
+                    self.__dbPath / "ingest_manifest.json",
+                )
+                report = pipeline.run()
+            # Re-open the collection, it may have been written by another worker.
+            self.__dict__.pop("_VectorDb__db", None)
+            if report.changed:
+                self.__version += 1
+                self.__retrievalCache.clear()
+            return report
         except Exception as err:
             logger.exception(
                 "Rag Vector DB level exception. %s",
@@ -167,7 +209,95 @@ class VectorDb:
             )
             raise
 
+    async def embedQuery(self, query: str) -> list[float]:
+        """Cached query embedding, keyed by the normalized query text."""
+        text = normalizeQuery(query)
+        return await self.__embeddingCache.getOrCompute(
+            text, lambda: self.__embeddings.aembed_query(text)
+        )
+
     async def search(self, query: str, ktop: int = 2) -> list[str]:
-        """Query vector search"""
-        documents = await self.__db.asimilarity_search(query=query, k=ktop)
+        """Query vector search, top-k results are cached per collection version."""
+        await self.warmUp()
+        text = normalizeQuery(query)
+        return await self.__retrievalCache.getOrCompute(
+            (text, ktop, self.__version), lambda: self.__search(text, ktop)
+        )
+
+    async def __search(self, text: str, ktop: int) -> list[str]:
+        start = time.perf_counter()
+        with span("embedding.query"):
+            embedding = await self.embedQuery(text)
+        searched = time.perf_counter()
+        QUERY_EMBED_SECONDS.observe(searched - start)
+        with span("chroma.search", k=ktop, collection=self.__collection):
+            documents = await self.__db.asimilarity_search_by_vector(embedding, k=ktop)
+        CHROMA_SEARCH_SECONDS.observe(time.perf_counter() - searched)
         return [d.page_content for d in documents]
+
+
+VECTOR_DB: Optional[VectorDb] = None
+VECTOR_DB_LOCK = threading.Lock()
+
+
+def getVectorDb() -> VectorDb:
+    """Process wide VectorDb, created on first use and warmed by lifespan."""
+    global VECTOR_DB
+    if VECTOR_DB is None:
+        with VECTOR_DB_LOCK:
+            if VECTOR_DB is None:
+                VECTOR_DB = VectorDb()
+    return VECTOR_DB
+
+
+class RetrievalPrefetcher:
+    """
+    Speculative retrieval started alongside intent classification.
+    classifyIntentNode starts a search per request, ragNode takes it and
+    routeNode discards it when the request is not routed to rag.
+    """
+
+    def __init__(self, enabled: bool = False, maxAge: float = 60.0) -> None:
+        self.enabled = enabled
+        self.__maxAge = maxAge
+        self.__tasks: Dict[tuple, tuple[float, asyncio.Task]] = {}
+
+    @staticmethod
+    def __key(state: GraphState) -> tuple:
+        return (state.userId, state.requestId, state.query)
+
+    def start(self, state: GraphState) -> None:
+        key = self.__key(state)
+        if not self.enabled or key in self.__tasks:
+            return
+        self.__prune()
+        task = asyncio.ensure_future(getVectorDb().search(state.query))
+        # A failed prefetch is retried by ragNode, don't log it as never retrieved.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.__tasks[key] = (time.monotonic(), task)
+        SPECULATIVE_RETRIEVALS.inc(result="started")
+
+    def take(self, state: GraphState) -> Optional[asyncio.Task]:
+        entry = self.__tasks.pop(self.__key(state), None)
+        if entry is None:
+            return None
+        SPECULATIVE_RETRIEVALS.inc(result="used")
+        return entry[1]
+
+    def discard(self, state: GraphState) -> None:
+        entry = self.__tasks.pop(self.__key(state), None)
+        if entry is not None:
+            entry[1].cancel()  # The shared retrieval cache still completes and keeps it
+            SPECULATIVE_RETRIEVALS.inc(result="wasted")
+
+    def __prune(self) -> None:
+        """Drop prefetches of runs cancelled before routing, they are never taken."""
+        deadline = time.monotonic() - self.__maxAge
+        for key in [k for k, (t, _) in self.__tasks.items() if t < deadline]:
+            self.__tasks.pop(key)[1].cancel()
+            SPECULATIVE_RETRIEVALS.inc(result="wasted")
+
+
+RETRIEVAL_PREFETCHER = RetrievalPrefetcher(
+    enabled=os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+)
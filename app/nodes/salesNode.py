@@ -1,76 +1,195 @@
 # salesNode.py
 
-from functools import cached_property
+import asyncio
+from contextlib import asynccontextmanager
+import fcntl
+import json
 import logging
 import os
+import re
+import sqlite3
+import time
 from pathlib import Path
+from typing import AsyncIterator, Optional
 import aiosqlite
 from dotenv import load_dotenv
-from app.utility import GraphContext, GraphState, OrderDetails
+from app.llmGateway import LlmBusyError
+from app.metrics import counter, histogram
+from app.prompts import PROMPTS
+from app.sqlitePool import SqlitePool
+from app.tracing import span
+from app.history import promptHistory
+from app.utility import GraphContext, GraphState, OrderDetails, nodeResponse
 from langgraph.runtime import Runtime
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain.messages import AIMessage, HumanMessage
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+SALES_ANSWERS = counter(
+    "sales_answers_total",
+    "Sales answers by source: template (no LLM call) or llm.",
+    ["source"],
+)
+SQLITE_QUERY_SECONDS = histogram(
+    "sqlite_query_seconds",
+    "Inventory query latency by query: orderId, fts, like, all, findOrder or matchItem.",
+    ["query"],
+)
+
+# Order status -> answer, "default" covers statuses without their own template.
+DEFAULT_SALES_TEMPLATES: dict[str, str] = {
+    "Delivered": "Your order {orderId} ({orderItem}) has been delivered to {location}.",
+    "Shipped": "Your order {orderId} ({orderItem}) has been shipped and is currently at {location}.",
+    "Processing": "Your order {orderId} ({orderItem}) is being processed at {location}. We'll let you know once it ships.",
+    "In Stock": "{orderItem} (order {orderId}) is in stock at {location}.",
+    "default": "Your order {orderId} ({orderItem}) is {status}, location: {location}.",
+}
+# Questions about an order that a status line doesn't answer go to the LLM.
+NOT_STATUS_REQUEST = re.compile(
+    r"\b(return|refund|cancel|change|exchange|replace|price|cost|invoice|complain|why)\w*",
+    re.IGNORECASE,
+)
+
+
+SAMPLE_ORDER = {
+    "orderId": "ORD-001",
+    "orderItem": "Laptop",
+    "status": "Delivered",
+    "location": "Hyderabad",
+}
+
+
+def loadSalesTemplates() -> dict[str, Optional[str]]:
+    """
+    Default templates, overridden per status by the JSON file at SALES_TEMPLATES_PATH.
+    Each is formatted against a sample order once, a broken one (unknown field,
+    bad syntax) is kept as None and its status is answered by the LLM.
+    """
+    templates: dict[str, Optional[str]] = dict(DEFAULT_SALES_TEMPLATES)
+    path = os.getenv("SALES_TEMPLATES_PATH", "")
+    if path:
+        templates.update(json.loads(Path(path).read_text()))
+    for status, template in templates.items():
+        try:
+            template.format(**SAMPLE_ORDER)
+        except Exception as err:
+            logger.warning("Sales template %r disabled, %r", status, err)
+            templates[status] = None
+    return templates
+
+
+SALES_TEMPLATES_ENABLED = os.getenv("SALES_TEMPLATES", "true").lower() == "true"
+SALES_TEMPLATES = loadSalesTemplates()
+
+
+def templatedAnswer(state: GraphState, orderList: Optional[list[dict]]) -> Optional[str]:
+    """Answer for exactly one order found by an explicit order id, else None."""
+    if not SALES_TEMPLATES_ENABLED or not orderList or len(orderList) != 1:
+        return None
+    if not state.order or not state.order.orderId:
+        return None
+    if NOT_STATUS_REQUEST.search(state.query):
+        return None
+    row = orderList[0]
+    status = row["status"] if row["status"] in SALES_TEMPLATES else "default"
+    template = SALES_TEMPLATES.get(status)
+    return template.format(**row) if template else None
+
+
+ORDER_COLUMNS = "orders.orderId, orders.orderItem, orders.status, orders.location"
+
+# Schema migrations in order, PRAGMA user_version counts the applied ones.
+# Each is (script, fallback script when the first one violates a constraint).
+MIGRATIONS: list[tuple[str, Optional[str]]] = [
+    (
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_orderId ON orders(orderId);",
+        # Databases with duplicate order ids still get a lookup index.
+        "CREATE INDEX IF NOT EXISTS idx_orders_orderId ON orders(orderId);",
+    ),
+    (
+        """
+CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+    orderItem, content='orders', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS orders_fts_ai AFTER INSERT ON orders BEGIN
+    INSERT INTO orders_fts(rowid, orderItem) VALUES (new.id, new.orderItem);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_fts_ad AFTER DELETE ON orders BEGIN
+    INSERT INTO orders_fts(orders_fts, rowid, orderItem) VALUES ('delete', old.id, old.orderItem);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_fts_au AFTER UPDATE OF orderItem ON orders BEGIN
+    INSERT INTO orders_fts(orders_fts, rowid, orderItem) VALUES ('delete', old.id, old.orderItem);
+    INSERT INTO orders_fts(rowid, orderItem) VALUES (new.id, new.orderItem);
+END;
+INSERT INTO orders_fts(orders_fts) VALUES ('rebuild');
+""",
+        None,
+    ),
+    # Item names in interrupt replies are looked up exactly, case insensitive.
+    (
+        "CREATE INDEX IF NOT EXISTS idx_orders_orderItem_nocase ON orders(orderItem COLLATE NOCASE);",
+        None,
+    ),
+]
+FTS_MIGRATION = 2
+
+
+def itemMatchQuery(orderItem: str) -> str:
+    """FTS5 query matching every word of the item as a token prefix."""
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", orderItem.lower()))
+
+
+def wordSpans(text: str, maxSpan: int = 6, maxWords: int = 40) -> list[str]:
+    """Runs of up to `maxSpan` consecutive words, as written ("t-shirt" stays one run)."""
+    words = list(re.finditer(r"\w+", text))[:maxWords]
+    spans = (
+        text[words[i].start() : words[j - 1].end()]
+        for i in range(len(words))
+        for j in range(i + 1, min(len(words), i + maxSpan) + 1)
+    )
+    return list(dict.fromkeys(spans))
+
 
 async def salesNode(state: GraphState, runtime: Runtime[GraphContext]) -> dict:
     """Fetch orders from database and used as context to AI"""
     try:
 
-        db = SqlDb()
-        await db.setup
+        db = getSqlDb()
         orderList = await db.fetch_orders(state.order)
         state.context = [
             f"Item: {r['orderItem']} | ID: {r['orderId']} | Status: {r['status']} | Loc: {r['location']}"
             for r in (orderList or [])
         ]
+        templated = templatedAnswer(state, orderList)
+        if templated is not None:
+            SALES_ANSWERS.inc(source="template")
+            status = "sales completed from template"
+            logger.info("Sales state: %s", status)
+            return nodeResponse(state, templated, status)
+
         formattedOrders = (
             "\n".join(state.context) if orderList else "No matching order data found."
         )
 
-        systemPrompt = """
-ROLE: You are an expert Sales Executive. Your name is Salma Hussian.
-CONTEXT: Use the following database records to answer the user:
-{formatted_orders}
-
-INSTRUCTIONS:
-1. Be professional, helpful, and concise.
-2. If the order is found, provide the status and location clearly.
-3. If no data is found, apologize and ask for a valid Order ID or Item name.
-4. Answer only based on the provided context.
-"""
-
-        prompt = ChatPromptTemplate(
-            [
-                ("system", systemPrompt),
-                MessagesPlaceholder("history"),
-                ("user", "{input}"),
-            ]
-        )
         model = runtime.context.llm.with_config(configurable={"output_max_token": 100})
-        chain = prompt | model | StrOutputParser()
+        chain = PROMPTS["sales"] | model | StrOutputParser()
 
         aiResponse = await chain.ainvoke(
             {
                 "formatted_orders": formattedOrders,
                 "input": state.query,
-                "history": state.history or [],
+                "history": promptHistory(state),
             }
         )
 
+        SALES_ANSWERS.inc(source="llm")
         status = "sales completed"
         logger.info("Sales state: %s", status)
-        return {
-            "history": [
-                HumanMessage(content=state.query),
-                AIMessage(content=aiResponse),
-            ],
-            "response": aiResponse,
-            "status": status,
-        }
+        return nodeResponse(state, aiResponse, status)
+    except LlmBusyError:
+        raise  # Load shedding, not a node failure.
     except Exception as err:
         logger.exception(
             "Node level exception %s",
@@ -80,73 +199,174 @@ INSTRUCTIONS:
         raise
 
 
+@asynccontextmanager
+async def fileLock(path: Path) -> AsyncIterator[None]:
+    """Exclusive flock on `path`, waited for in a worker thread."""
+    with open(path, "w") as lockFile:
+        await asyncio.to_thread(fcntl.flock, lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
 class SqlDb:
+    """
+    Inventory database on a long lived SqlitePool, one per process.
+    Opened by the FastAPI lifespan (or lazily by the first lookup), lookups
+    borrow a pooled reader and the seed data goes through the single writer.
+    """
+
     def __init__(self) -> None:
         self.__dbPath = Path(os.getenv("SQLDB_PATH", "sqldb/inventory.db"))
+        self.__pool = SqlitePool(
+            self.__dbPath,
+            readers=int(os.getenv("SQLDB_READERS", "4")),
+            pragmas={
+                "mmap_size": int(os.getenv("SQLDB_MMAP_SIZE", str(256 * 1024 * 1024))),
+                # Negative cache_size is in KiB.
+                "cache_size": -int(os.getenv("SQLDB_CACHE_KB", "65536")),
+            },
+            cachedStatements=int(os.getenv("SQLDB_CACHED_STATEMENTS", "256")),
+        )
+        self.__ready = False
+        self.__fts = False
+        self.__setupLock = asyncio.Lock()
 
-    @cached_property
-    async def setup(self):
-        try:
-            folder = self.__dbPath.parent
-            folder.mkdir(parents=True, exist_ok=True)
-            async with aiosqlite.connect(self.__dbPath) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    """
+    async def setup(self) -> None:
+        """Open the pool and seed the mock orders once, safe to await repeatedly."""
+        if self.__ready:
+            return
+        async with self.__setupLock:
+            if self.__ready:
+                return
+            try:
+                await self.__pool.open()
+                # Workers starting together seed and migrate one at a time.
+                async with fileLock(self.__dbPath.with_name(self.__dbPath.name + ".lock")):
+                    await self.__seed(self.__pool.writer)
+                    version = await self.__migrate(self.__pool.writer)
+                self.__fts = version >= FTS_MIGRATION
+                self.__ready = True
+            except Exception as err:
+                logger.exception(
+                    "SQL Db level exception %s",
+                    err,
+                    extra={"nodeName": "salesNode"},
+                )
+                raise
+
+    async def close(self) -> None:
+        await self.__pool.close()
+        self.__ready = False
+
+    @staticmethod
+    async def __seed(db: aiosqlite.Connection) -> None:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(
+            """
 SELECT COUNT(name) AS total 
 FROM sqlite_master 
 WHERE type='table' 
 AND name NOT LIKE 'sqlite_%' 
 AND name NOT LIKE '%_fts%';
-                """
-                )
-                tableCount = await cursor.fetchone()
+            """
+        )
+        tableCount = await cursor.fetchone()
 
-                if tableCount and tableCount["total"] > 0:
-                    return
+        if tableCount and tableCount["total"] > 0:
+            return
 
-                # create default table and dummy data
-                await db.execute(
-                    """
+        # create default table and dummy data
+        await db.execute(
+            """
 CREATE TABLE IF NOT EXISTS orders (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     orderId TEXT, orderItem TEXT, status TEXT, location TEXT
 );
 """
-                )
-                mock_data = [
-                    ("ORD-001", "Laptop", "Delivered", "Hyderabad"),
-                    ("ORD-002", "Belt", "Processing", "Shop"),
-                    ("ORD-003", "Jacket", "Delivered", "Kolkata"),
-                    ("ORD-004", "Wallet", "In Stock", "Store 2"),
-                    ("ORD-005", "Bag", "Shipped", "Warehouse B"),
-                ]
-                await db.executemany(
-                    "INSERT INTO orders (orderId, orderItem, status, location) VALUES (?, ?, ?, ?)",
-                    mock_data,
-                )
-                await db.commit()
-        except Exception as err:
-            logger.exception(
-                "SQL Db level exception %s",
-                err,
-                extra={"nodeName": "salesNode"},
-            )
+        )
+        mock_data = [
+            ("ORD-001", "Laptop", "Delivered", "Hyderabad"),
+            ("ORD-002", "Belt", "Processing", "Shop"),
+            ("ORD-003", "Jacket", "Delivered", "Kolkata"),
+            ("ORD-004", "Wallet", "In Stock", "Store 2"),
+            ("ORD-005", "Bag", "Shipped", "Warehouse B"),
+        ]
+        await db.executemany(
+            "INSERT INTO orders (orderId, orderItem, status, location) VALUES (?, ?, ?, ?)",
+            mock_data,
+        )
+        await db.commit()
+
+    @staticmethod
+    async def __migrate(db: aiosqlite.Connection) -> int:
+        """Bring an existing or new database to the latest schema, returns its version."""
+        cursor = await db.execute("PRAGMA user_version;")
+        row = await cursor.fetchone()
+        version = row[0] if row else 0
+        for index, (script, fallback) in enumerate(MIGRATIONS[version:], version + 1):
+            try:
+                try:
+                    await db.executescript(
+                        f"BEGIN; {script} PRAGMA user_version={index}; COMMIT;"
+                    )
+                except sqlite3.IntegrityError:
+                    await db.rollback()
+                    if fallback is None:
+                        raise
+                    logger.warning("Schema migration %s fell back, %s", index, fallback)
+                    await db.executescript(
+                        f"BEGIN; {fallback} PRAGMA user_version={index}; COMMIT;"
+                    )
+            except sqlite3.OperationalError as err:
+                # e.g. SQLite built without FTS5, lookups keep the LIKE scan.
+                await db.rollback()
+                logger.warning("Schema migration %s skipped. %s", index, err)
+                break
+            version = index
+            logger.info("Inventory schema migrated to version %s", version)
+        return version
 
     async def fetch_orders(self, order: OrderDetails | None):
         try:
-            query = "SELECT orderId, orderItem, status, location FROM orders WHERE 1=1"
-            params = []
-            if order and order.orderId:
-                query += " AND orderId = ?"
-                params.append(order.orderId)
-            if order and order.orderItem:
-                query += " AND orderItem LIKE ?"
-                params.append(f"%{order.orderItem}%")
-
-            async with aiosqlite.connect(self.__dbPath) as db:
+            await self.setup()
+            # Only a few distinct SQL texts, each stays in the statement cache.
+            orderId = order.orderId if order else None
+            orderItem = order.orderItem if order else None
+            matchQuery = itemMatchQuery(orderItem) if orderItem else ""
+            if orderId:
+                # Index lookup, the item filter only checks the matched row.
+                query = f"SELECT {ORDER_COLUMNS} FROM orders WHERE orderId = ?"
+                params = [orderId]
+                kind = "orderId"
+                if orderItem:
+                    query += " AND orderItem LIKE ?"
+                    params.append(f"%{orderItem}%")
+            elif matchQuery and self.__fts:
+                # Ranked token prefix search, best bm25 match first.
+                query = (
+                    f"SELECT {ORDER_COLUMNS} FROM orders_fts"
+                    " JOIN orders ON orders.id = orders_fts.rowid"
+                    " WHERE orders_fts MATCH ? ORDER BY orders_fts.rank"
+                )
+                params = [matchQuery]
+                kind = "fts"
+            elif orderItem:
+                query = f"SELECT {ORDER_COLUMNS} FROM orders WHERE orderItem LIKE ?"
+                params = [f"%{orderItem}%"]
+                kind = "like"
+            else:
+                query = f"SELECT {ORDER_COLUMNS} FROM orders"
+                params = []
+                kind = "all"
+
+            async with self.__pool.reader() as db:
                 db.row_factory = aiosqlite.Row
-                orderList = await db.execute_fetchall(f"{query} LIMIT 5", params)
+                start = time.perf_counter()
+                with span("sqlite.query", query=kind):
+                    orderList = await db.execute_fetchall(f"{query} LIMIT 5", params)
+                SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, query=kind)
                 if orderList:
                     return [dict(row) for row in orderList]
         except Exception as err:
@@ -155,3 +375,60 @@ CREATE TABLE IF NOT EXISTS orders (
                 err,
                 extra={"nodeName": "salesNode"},
             )
+
+    async def findOrder(self, orderId: str) -> Optional[dict]:
+        """The order row of an exact order id, None when it doesn't exist."""
+        await self.setup()
+        async with self.__pool.reader() as db:
+            db.row_factory = aiosqlite.Row
+            start = time.perf_counter()
+            with span("sqlite.query", query="findOrder"):
+                rows = await db.execute_fetchall(
+                    f"SELECT {ORDER_COLUMNS} FROM orders WHERE orderId = ? LIMIT 1",
+                    [orderId],
+                )
+            SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, query="findOrder")
+        return dict(rows[0]) if rows else None
+
+    async def matchItem(self, text: str) -> Optional[str]:
+        """
+        Longest item name that appears as whole words in the text: every
+        word span of the text is looked up in the orderItem index.
+        """
+        spans = wordSpans(text)
+        if not spans:
+            return None
+        await self.setup()
+        async with self.__pool.reader() as db:
+            start = time.perf_counter()
+            with span("sqlite.query", query="matchItem"):
+                rows = await db.execute_fetchall(
+                    "SELECT orderItem FROM orders WHERE orderItem COLLATE NOCASE"
+                    f" IN ({', '.join('?' * len(spans))})"
+                    " ORDER BY length(orderItem) DESC LIMIT 1",
+                    spans,
+                )
+            SQLITE_QUERY_SECONDS.observe(time.perf_counter() - start, query="matchItem")
+        return rows[0][0] if rows else None
+
+
+SQL_DB: Optional[SqlDb] = None
+
+
+def getSqlDb() -> SqlDb:
+    """Process wide SqlDb, opened by lifespan or on first lookup."""
+    global SQL_DB
+    if SQL_DB is None:
+        SQL_DB = SqlDb()
+    return SQL_DB
+
+
+@asynccontextmanager
+async def openSqlDb() -> AsyncIterator[SqlDb]:
+    """Inventory pool opened for the app lifespan."""
+    db = getSqlDb()
+    await db.setup()
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,97 @@
+# prompts.py
+
+# Node prompt templates, built once at import. Each starts with a static
+# prefix (persona, instructions, few-shot examples) that is byte for byte
+# the same across requests, so the provider's prompt prefix cache can serve
+# it. History follows, then the per-request content and the user message.
+
+from typing import Dict
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    FewShotChatMessagePromptTemplate,
+)
+
+GENERAL_SYSTEM_PROMPT = """
+You are "Sara Khan" an empathetic, concise, and professional customer support executive. Your goal is to assist the user with general inquiries while maintaining a helpful and grounded tone.
+"""
+
+GENERAL_EXAMPLES = [
+    {
+        "input": "Hi, how are you today?",
+        "output": "I'm doing great, thank you for asking! I'm ready to help you with any order or inventory questions. What's on your mind?",
+    },
+    {
+        "input": "My package is late and I'm really frustrated.",
+        "output": "I completely understand how frustrating it is to wait for a late delivery. I'm here to help—let me look into your order details right away to see what's happening.",
+    },
+    {
+        "input": "Do you sell shoes?",
+        "output": "We focus on bags, electronics, and accessories like belts and wallets. You can check our current inventory by asking me about specific items!",
+    },
+]
+
+# Was part of the late package example, now a note after the history.
+NO_ORDER_ID_NOTE = "The user hasn't shared an order number yet. If they ask about an order, say that you don't have their order number."
+
+SUPPORT_SYSTEM_PROMPT = """
+System: You are an expert Customer Support Executive. Your name is Ashma Khan.
+Your goal is to:
+1. Solve the user's problem effectively.
+2. Answer their questions accurately using only the context given with the user's message.
+
+Instructions:
+- If the context doesn't contain the answer, politely inform the user.
+- Maintain a professional, helpful, and concise tone.
+"""
+
+SALES_SYSTEM_PROMPT = """
+ROLE: You are an expert Sales Executive. Your name is Salma Hussian.
+CONTEXT: Use the database records given with the user's message to answer the user.
+
+INSTRUCTIONS:
+1. Be professional, helpful, and concise.
+2. If the order is found, provide the status and location clearly.
+3. If no data is found, apologize and ask for a valid Order ID or Item name.
+4. Answer only based on the provided context.
+"""
+
+
+def buildPrompts() -> Dict[str, ChatPromptTemplate]:
+    """Templates by graph node name."""
+    fewShot = FewShotChatMessagePromptTemplate(
+        example_prompt=ChatPromptTemplate.from_messages(
+            [("human", "{input}"), ("ai", "{output}")]
+        ),
+        examples=GENERAL_EXAMPLES,
+    )
+    return {
+        "generalChat": ChatPromptTemplate.from_messages(
+            [
+                ("system", GENERAL_SYSTEM_PROMPT),
+                fewShot,
+                MessagesPlaceholder(variable_name="history"),
+                MessagesPlaceholder(variable_name="notes", optional=True),
+                ("user", "{input}"),
+            ]
+        ),
+        "rag": ChatPromptTemplate.from_messages(
+            [
+                ("system", SUPPORT_SYSTEM_PROMPT),
+                MessagesPlaceholder(variable_name="history"),
+                ("system", "Context:\n{support_context}"),
+                ("user", "{input}"),
+            ]
+        ),
+        "sales": ChatPromptTemplate.from_messages(
+            [
+                ("system", SALES_SYSTEM_PROMPT),
+                MessagesPlaceholder(variable_name="history"),
+                ("system", "Database records:\n{formatted_orders}"),
+                ("user", "{input}"),
+            ]
+        ),
+    }
+
+
+PROMPTS = buildPrompts()
@@ -0,0 +1,392 @@
+# sessions.py
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from dotenv import load_dotenv
+
+from app.metrics import counter, gauge, histogram
+from app.sqlitePool import SqlitePool
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SESSIONS_ACTIVE = gauge("sessions_active", "User sessions currently tracked.")
+SESSIONS_MEMORY = gauge(
+    "sessions_memory_bytes", "Approximate memory of the session store, updated per sweep."
+)
+SESSIONS_EVICTED = counter(
+    "sessions_evicted_total",
+    "Sessions dropped by reason: idle, size or rotated (new conversation).",
+    ["reason"],
+)
+SESSION_THREADS_DELETED = counter(
+    "session_threads_deleted_total", "Checkpoint threads deleted after eviction."
+)
+THREAD_LOCK_WAIT_SECONDS = histogram(
+    "thread_lock_wait_seconds",
+    "Time a graph run waited for its thread lock.",
+    ["backend"],
+)
+
+DeleteThread = Callable[[str], Awaitable[None]]
+
+
+class SessionStore:
+    """
+    userId -> thread id of the current conversation, in process memory.
+    Bounded LRU with an idle TTL, an evicted (or rotated) thread has its
+    checkpoints deleted in the background through `deleteThread`.
+    Graph runs of one thread are serialized through `lock(threadId)`.
+    """
+
+    backend = "memory"
+
+    def __init__(
+        self,
+        deleteThread: DeleteThread,
+        maxSize: int = 10000,
+        idleTtl: float = 3600.0,
+        sweepInterval: float = 60.0,
+    ) -> None:
+        self._deleteThread = deleteThread
+        self._maxSize = max(1, maxSize)
+        self._idleTtl = idleTtl
+        self.__sweepInterval = sweepInterval
+        # userId -> (threadId, last seen), least recently used first
+        self.__sessions: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__threadLocks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self.__deletes: set[asyncio.Task] = set()
+        self.__sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+    async def threadId(self, userId: str) -> str:
+        """Thread of the user's conversation, a new one for unknown or evicted users."""
+        now = time.monotonic()
+        evicted: list[str] = []
+        with self.__lock:
+            entry = self.__sessions.get(userId)
+            threadId = entry[0] if entry else str(uuid.uuid4())
+            self.__sessions[userId] = (threadId, now)
+            self.__sessions.move_to_end(userId)
+            while len(self.__sessions) > self._maxSize:
+                _, (oldThread, _) = self.__sessions.popitem(last=False)
+                evicted.append(oldThread)
+            SESSIONS_ACTIVE.set(len(self.__sessions))
+        self._evict(evicted, "size")
+        return threadId
+
+    async def rotate(self, userId: str) -> str:
+        """Start a new conversation, the previous thread is deleted."""
+        with self.__lock:
+            entry = self.__sessions.pop(userId, None)
+            SESSIONS_ACTIVE.set(len(self.__sessions))
+        if entry:
+            self._evict([entry[0]], "rotated")
+        return await self.threadId(userId)
+
+    async def sweep(self) -> int:
+        """Evict sessions idle for longer than the TTL."""
+        deadline = time.monotonic() - self._idleTtl
+        evicted: list[str] = []
+        with self.__lock:
+            # Ordered by last use, stop at the first session still in use.
+            while self.__sessions:
+                userId, (threadId, lastSeen) = next(iter(self.__sessions.items()))
+                if lastSeen >= deadline:
+                    break
+                del self.__sessions[userId]
+                evicted.append(threadId)
+            SESSIONS_ACTIVE.set(len(self.__sessions))
+            SESSIONS_MEMORY.set(self.__memory())
+        self._evict(evicted, "idle")
+        return len(evicted)
+
+    @asynccontextmanager
+    async def _localLock(self, threadId: str) -> AsyncIterator[None]:
+        threadLock = self.__threadLocks.get(threadId)
+        if threadLock is None:
+            threadLock = self.__threadLocks[threadId] = asyncio.Lock()
+        async with threadLock:
+            yield
+
+    @asynccontextmanager
+    async def lock(self, threadId: str) -> AsyncIterator[None]:
+        """Serialize graph runs of one thread within this process."""
+        start = time.perf_counter()
+        async with self._localLock(threadId):
+            THREAD_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, backend=self.backend)
+            yield
+
+    def __memory(self) -> int:
+        return sys.getsizeof(self.__sessions) + sum(
+            sys.getsizeof(userId) + sys.getsizeof(entry) + sys.getsizeof(entry[0])
+            for userId, entry in self.__sessions.items()
+        )
+
+    def _evict(self, threadIds: list[str], reason: str) -> None:
+        if not threadIds:
+            return
+        SESSIONS_EVICTED.inc(len(threadIds), reason=reason)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            logger.warning("No event loop, checkpoints of %s threads kept", len(threadIds))
+            return
+        for threadId in threadIds:
+            task = loop.create_task(self.__delete(threadId))
+            self.__deletes.add(task)
+            task.add_done_callback(self.__deletes.discard)
+
+    async def __delete(self, threadId: str) -> None:
+        try:
+            await self._deleteThread(threadId)
+            SESSION_THREADS_DELETED.inc()
+        except Exception as err:
+            logger.exception(
+                "Session level exception. %s",
+                err,
+                extra={"method": "SessionStore.delete", "threadId": threadId},
+            )
+
+    async def __sweepLoop(self) -> None:
+        while True:
+            await asyncio.sleep(self.__sweepInterval)
+            try:
+                evicted = await self.sweep()
+                if evicted:
+                    logger.info("Session store evicted %s sessions", evicted)
+            except Exception as err:
+                logger.exception(
+                    "Session level exception. %s", err, extra={"method": "sweep"}
+                )
+
+    async def start(self) -> None:
+        if self.__sweepInterval > 0 and (self.__sweeper is None or self.__sweeper.done()):
+            self.__sweeper = asyncio.create_task(self.__sweepLoop())
+
+    async def stop(self) -> None:
+        if self.__sweeper:
+            self.__sweeper.cancel()
+            try:
+                await self.__sweeper
+            except asyncio.CancelledError:
+                pass
+            self.__sweeper = None
+        if self.__deletes:
+            await asyncio.gather(*self.__deletes, return_exceptions=True)
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Sessions and thread locks in a SQLite file shared by every worker process.
+    Thread locks are leases (owner, expiry) renewed while held, a crashed
+    worker's lock expires after `leaseSeconds`. Size and idle eviction run in
+    the sweep, DELETE ... RETURNING hands every evicted thread to one worker.
+    """
+
+    backend = "sqlite"
+
+    def __init__(
+        self,
+        pool: SqlitePool,
+        deleteThread: DeleteThread,
+        maxSize: int = 10000,
+        idleTtl: float = 3600.0,
+        sweepInterval: float = 60.0,
+        leaseSeconds: float = 120.0,
+    ) -> None:
+        super().__init__(deleteThread, maxSize, idleTtl, sweepInterval)
+        self.__pool = pool
+        self.__leaseSeconds = leaseSeconds
+        self.__owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.__writeLock = asyncio.Lock()
+
+    async def setup(self) -> None:
+        async with self.__writeLock:
+            await self.__pool.writer.executescript(
+                """
+CREATE TABLE IF NOT EXISTS sessions (
+    userId TEXT PRIMARY KEY, threadId TEXT NOT NULL, lastSeen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_lastSeen ON sessions(lastSeen);
+CREATE TABLE IF NOT EXISTS thread_locks (
+    threadId TEXT PRIMARY KEY, owner TEXT NOT NULL, expiresAt REAL NOT NULL
+);
+"""
+            )
+            await self.__pool.writer.commit()
+
+    async def __write(self, sql: str, params: tuple) -> list:
+        async with self.__writeLock:
+            rows = await self.__pool.writer.execute_fetchall(sql, params)
+            await self.__pool.writer.commit()
+            return list(rows)
+
+    def __len__(self) -> int:
+        return int(SESSIONS_ACTIVE.value())
+
+    async def threadId(self, userId: str) -> str:
+        rows = await self.__write(
+            """
+INSERT INTO sessions (userId, threadId, lastSeen) VALUES (?, ?, ?)
+ON CONFLICT(userId) DO UPDATE SET lastSeen = excluded.lastSeen
+RETURNING threadId;
+""",
+            (userId, str(uuid.uuid4()), time.time()),
+        )
+        return rows[0][0]
+
+    async def rotate(self, userId: str) -> str:
+        threadId = str(uuid.uuid4())
+        async with self.__writeLock:
+            writer = self.__pool.writer
+            old = await writer.execute_fetchall(
+                "SELECT threadId FROM sessions WHERE userId = ?", (userId,)
+            )
+            await writer.execute(
+                """
+INSERT INTO sessions (userId, threadId, lastSeen) VALUES (?, ?, ?)
+ON CONFLICT(userId) DO UPDATE SET threadId = excluded.threadId, lastSeen = excluded.lastSeen;
+""",
+                (userId, threadId, time.time()),
+            )
+            await writer.commit()
+        self._evict([row[0] for row in old], "rotated")
+        return threadId
+
+    async def sweep(self) -> int:
+        idle = await self.__write(
+            "DELETE FROM sessions WHERE lastSeen < ? RETURNING threadId;",
+            (time.time() - self._idleTtl,),
+        )
+        oversize = await self.__write(
+            """
+DELETE FROM sessions WHERE userId IN (
+    SELECT userId FROM sessions ORDER BY lastSeen DESC LIMIT -1 OFFSET ?
+) RETURNING threadId;
+""",
+            (self._maxSize,),
+        )
+        await self.__write("DELETE FROM thread_locks WHERE expiresAt < ?;", (time.time(),))
+        async with self.__pool.reader() as conn:
+            rows = await conn.execute_fetchall("SELECT COUNT(*) FROM sessions")
+        SESSIONS_ACTIVE.set(rows[0][0])
+        self._evict([row[0] for row in idle], "idle")
+        self._evict([row[0] for row in oversize], "size")
+        return len(idle) + len(oversize)
+
+    async def __tryAcquire(self, threadId: str) -> bool:
+        now = time.time()
+        async with self.__writeLock:
+            cursor = await self.__pool.writer.execute(
+                """
+INSERT INTO thread_locks (threadId, owner, expiresAt) VALUES (?, ?, ?)
+ON CONFLICT(threadId) DO UPDATE SET owner = excluded.owner, expiresAt = excluded.expiresAt
+WHERE thread_locks.expiresAt < ?;
+""",
+                (threadId, self.__owner, now + self.__leaseSeconds, now),
+            )
+            await self.__pool.writer.commit()
+            return cursor.rowcount == 1
+
+    async def __renew(self, threadId: str) -> None:
+        while True:
+            await asyncio.sleep(self.__leaseSeconds / 3)
+            await self.__write(
+                "UPDATE thread_locks SET expiresAt = ? WHERE threadId = ? AND owner = ?;",
+                (time.time() + self.__leaseSeconds, threadId, self.__owner),
+            )
+
+    @asynccontextmanager
+    async def lock(self, threadId: str) -> AsyncIterator[None]:
+        """Serialize graph runs of one thread across every worker process."""
+        start = time.perf_counter()
+        # Same process waiters queue on the local lock, not on the table.
+        async with self._localLock(threadId):
+            delay = 0.005
+            while not await self.__tryAcquire(threadId):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.1)
+            THREAD_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, backend=self.backend)
+            renewer = asyncio.create_task(self.__renew(threadId))
+            try:
+                yield
+            finally:
+                renewer.cancel()
+                await asyncio.shield(
+                    self.__write(
+                        "DELETE FROM thread_locks WHERE threadId = ? AND owner = ?;",
+                        (threadId, self.__owner),
+                    )
+                )
+
+
+SESSION_STORE: Optional[SessionStore] = None
+
+
+def sessionOptions() -> dict:
+    return {
+        "maxSize": int(os.getenv("SESSION_MAX", "10000")),
+        "idleTtl": float(os.getenv("SESSION_IDLE_TTL", "3600")),
+        "sweepInterval": float(os.getenv("SESSION_SWEEP_INTERVAL", "60")),
+    }
+
+
+def getSessionStore(deleteThread: DeleteThread) -> SessionStore:
+    """Store opened by lifespan, an in-memory store when lifespan did not run."""
+    global SESSION_STORE
+    if SESSION_STORE is None:
+        SESSION_STORE = SessionStore(deleteThread, **sessionOptions())
+    return SESSION_STORE
+
+
+@asynccontextmanager
+async def openSessionStore(deleteThread: DeleteThread) -> AsyncIterator[SessionStore]:
+    """
+    Session store selected by SESSION_BACKEND env, opened for the app lifespan.
+    `memory`: per process, single worker only.
+    `sqlite`: SESSION_DB_PATH shared by every worker.
+    """
+    global SESSION_STORE
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    pool: Optional[SqlitePool] = None
+    if backend == "memory":
+        store = SessionStore(deleteThread, **sessionOptions())
+    elif backend == "sqlite":
+        pool = await SqlitePool(
+            os.getenv("SESSION_DB_PATH", "sqldb/sessions.db"),
+            readers=int(os.getenv("SESSION_DB_READERS", "2")),
+        ).open()
+        store = SqliteSessionStore(
+            pool,
+            deleteThread,
+            leaseSeconds=float(os.getenv("THREAD_LOCK_LEASE", "120")),
+            **sessionOptions(),
+        )
+        await store.setup()
+    else:
+        raise ValueError(f"Unknown session backend: {backend}")
+
+    SESSION_STORE = store
+    await store.start()
+    try:
+        yield store
+    finally:
+        await store.stop()
+        SESSION_STORE = None
+        if pool is not None:
+            await pool.close()
@@ -0,0 +1,151 @@
+# socketSession.py
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict
+from dotenv import load_dotenv
+from fastapi import WebSocket
+from app.graph import runGraph, sessionStore
+from app.llmGateway import LlmBusyError
+from app.metrics import gauge
+from app.tracing import TRACER
+from app.utility import SocketRequest, SocketResponse
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+MAX_INFLIGHT_PER_SOCKET = int(os.getenv("MAX_INFLIGHT_PER_SOCKET", "8"))
+
+WEBSOCKET_CONNECTIONS = gauge("websocket_connections", "Open websocket connections.")
+WEBSOCKET_INFLIGHT = gauge(
+    "websocket_inflight_requests", "Messages running or queued across every socket."
+)
+
+
+class SocketSession:
+    """
+    In-flight graph runs of one websocket connection.
+    Every message runs as its own task. Messages of the same user thread are
+    serialized by a per thread lock (FIFO), different threads run in parallel.
+    """
+
+    def __init__(self, ws: WebSocket, maxInFlight: int = MAX_INFLIGHT_PER_SOCKET) -> None:
+        self.__ws = ws
+        self.__maxInFlight = max(1, maxInFlight)
+        self.__sendLock = asyncio.Lock()
+        self.__threadLocks: Dict[str, asyncio.Lock] = {}
+        self.__tasks: Dict[str, set[asyncio.Task]] = {}
+        WEBSOCKET_CONNECTIONS.inc()
+
+    @property
+    def inFlight(self) -> int:
+        return sum(len(tasks) for tasks in self.__tasks.values())
+
+    async def send_json(self, data: Any, mode: str = "text") -> None:
+        """Frames from concurrent tasks are written one at a time."""
+        async with self.__sendLock:
+            await self.__ws.send_json(data, mode=mode)
+
+    async def sendError(self, message: str) -> None:
+        await self.send_json(json.dumps({"error": True, "message": message}))
+
+    async def submit(self, request: SocketRequest) -> None:
+        """
+        Schedule a message, cancel the user's runs for a "stop" message
+        or rotate the user's thread for a "new" message.
+        """
+        if request.status == "stop":
+            cancelled = self.cancel(request.userId)
+            await self.send_json(
+                SocketResponse(
+                    status="stop",
+                    content=f"Stopped {cancelled} running request(s).",
+                    requestId=request.requestId,
+                ).model_dump()
+            )
+            return
+
+        if request.status == "new":
+            # Runs of the old thread would write into a deleted conversation.
+            cancelled = self.cancel(request.userId)
+            await sessionStore().rotate(request.userId)
+            await self.send_json(
+                SocketResponse(
+                    status="new",
+                    content=f"Started a new conversation, stopped {cancelled} running request(s).",
+                    requestId=request.requestId,
+                ).model_dump()
+            )
+            return
+
+        if self.inFlight >= self.__maxInFlight:
+            logger.info("Socket in-flight limit reached, %s", request.requestId)
+            await self.sendError("Too many requests in flight, retry later.")
+            return
+
+        task = asyncio.create_task(self.__run(request))
+        tasks = self.__tasks.setdefault(request.userId, set())
+        tasks.add(task)
+        WEBSOCKET_INFLIGHT.inc()
+        task.add_done_callback(lambda t: self.__forget(request.userId, t))
+
+    def __forget(self, userId: str, task: asyncio.Task) -> None:
+        WEBSOCKET_INFLIGHT.dec()
+        tasks = self.__tasks.get(userId)
+        if tasks is None:
+            return
+        tasks.discard(task)
+        if not tasks:
+            self.__tasks.pop(userId, None)
+            lock = self.__threadLocks.get(userId)
+            if lock is not None and not lock.locked():
+                self.__threadLocks.pop(userId, None)
+
+    async def __run(self, request: SocketRequest) -> None:
+        lock = self.__threadLocks.setdefault(request.userId, asyncio.Lock())
+        try:
+            with TRACER.trace(
+                request.requestId or "", "ws.message", status=request.status
+            ) as span:
+                async with lock:
+                    if span is not None:
+                        span.set(queued_ms=round((time.time_ns() - span.start) / 1e6, 3))
+                    await runGraph(request, self)
+        except asyncio.CancelledError:
+            logger.info("Graph run cancelled, %s", request.requestId)
+            raise
+        except LlmBusyError as err:
+            logger.info("Request shed, %s: %s", request.requestId, err.reason)
+            await self.send_json(
+                SocketResponse(
+                    status="busy",
+                    content="We're handling a lot of requests right now, please retry in a few seconds.",
+                    requestId=request.requestId,
+                ).model_dump()
+            )
+        except Exception as err:
+            logger.exception(
+                "Server level exception. %s",
+                err,
+                extra={"method": "SocketSession", "requestId": request.requestId},
+            )
+            await self.sendError("Internal Server Error.")
+
+    def cancel(self, userId: str) -> int:
+        """Cancel running and queued runs of one user thread."""
+        tasks = list(self.__tasks.get(userId, ()))
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    async def close(self) -> None:
+        """Cancel every run, called when the socket disconnects."""
+        WEBSOCKET_CONNECTIONS.dec()
+        tasks = [task for group in self.__tasks.values() for task in group]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,101 @@
+# sqlitePool.py
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# WAL lets readers run next to the single writer, NORMAL sync only fsyncs on
+# WAL checkpoints instead of every commit.
+DEFAULT_PRAGMAS: Dict[str, str | int] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+}
+
+
+class SqlitePool:
+    """
+    Long lived aiosqlite connections for one database file.
+    One writer connection (SQLite allows a single writer) and a fixed set of
+    reader connections handed out through a queue.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        readers: int = 4,
+        pragmas: Optional[Dict[str, str | int]] = None,
+        cachedStatements: int = 128,
+    ) -> None:
+        self.__path = Path(path)
+        self.__readerCount = max(1, readers)
+        self.__pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        # Per connection LRU of prepared statements, reused for identical SQL text.
+        self.__cachedStatements = cachedStatements
+        self.__writer: Optional[aiosqlite.Connection] = None
+        self.__readers: list[aiosqlite.Connection] = []
+        self.__idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    @property
+    def isOpen(self) -> bool:
+        return self.__writer is not None
+
+    @property
+    def writer(self) -> aiosqlite.Connection:
+        if self.__writer is None:
+            raise RuntimeError(f"Sqlite pool {self.__path} is not open.")
+        return self.__writer
+
+    async def __connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(
+            self.__path, cached_statements=self.__cachedStatements
+        )
+        for name, value in self.__pragmas.items():
+            await conn.execute(f"PRAGMA {name}={value};")
+        return conn
+
+    async def open(self) -> "SqlitePool":
+        if self.__writer is not None:
+            return self
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        # Writer first, it switches the file to WAL before the readers attach.
+        self.__writer = await self.__connect()
+        for _ in range(self.__readerCount):
+            conn = await self.__connect()
+            self.__readers.append(conn)
+            self.__idle.put_nowait(conn)
+        logger.info(
+            "Sqlite pool opened %s with %s readers", self.__path, self.__readerCount
+        )
+        return self
+
+    async def close(self) -> None:
+        for conn in self.__readers:
+            await conn.close()
+        self.__readers.clear()
+        self.__idle = asyncio.Queue()
+        if self.__writer is not None:
+            await self.__writer.close()
+            self.__writer = None
+        logger.info("Sqlite pool closed %s", self.__path)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a reader connection, waits when every reader is busy."""
+        if self.__writer is None:
+            raise RuntimeError(f"Sqlite pool {self.__path} is not open.")
+        conn = await self.__idle.get()
+        try:
+            yield conn
+        finally:
+            self.__idle.put_nowait(conn)
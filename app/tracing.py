@@ -0,0 +1,306 @@
+# tracing.py
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+from dotenv import load_dotenv
+
+from app.metrics import counter
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+TRACES = counter(
+    "traces_total",
+    "Finished request traces by decision: sampled, slow, error, dropped or export_failed.",
+    ["decision"],
+)
+
+SERVICE_NAME = "auto-support-pilot"
+# OTLP status codes.
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """One timed operation of a trace, ended once."""
+
+    __slots__ = (
+        "trace", "spanId", "parentId", "name", "start", "end", "attributes", "error", "cancelled"
+    )
+
+    def __init__(
+        self, trace: "Trace", name: str, parentId: Optional[str], attributes: Dict[str, Any]
+    ) -> None:
+        self.trace = trace
+        self.spanId = os.urandom(8).hex()
+        self.parentId = parentId
+        self.name = name
+        self.start = time.time_ns()
+        self.end = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        # Stopped by the user or a disconnect, not a failure.
+        self.cancelled = False
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if self.end:
+            return
+        self.end = time.time_ns()
+        if isinstance(error, asyncio.CancelledError):
+            self.cancelled = True
+        elif error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.add(self)
+
+    def status(self) -> dict:
+        if self.error:
+            return {"code": STATUS_ERROR, "message": self.error}
+        if self.cancelled:
+            return {"code": STATUS_UNSET, "message": "cancelled"}
+        return {"code": STATUS_OK}
+
+    def toOtlp(self) -> dict:
+        span = {
+            "traceId": self.trace.traceId,
+            "spanId": self.spanId,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [
+                {"key": "request.id", "value": {"stringValue": self.trace.requestId}},
+                *(otlpAttribute(k, v) for k, v in self.attributes.items()),
+            ],
+            "status": self.status(),
+        }
+        if self.parentId:
+            span["parentSpanId"] = self.parentId
+        return span
+
+
+class Trace:
+    """
+    Spans of one request, buffered until the root span ends. The keep
+    decision is made then, so slow and failed requests are always kept
+    (tail sampling) on top of the head sampled share.
+    """
+
+    def __init__(self, tracer: "Tracer", requestId: str, sampled: bool) -> None:
+        self.tracer = tracer
+        self.requestId = requestId
+        self.traceId = os.urandom(16).hex()
+        self.sampled = sampled
+        self.kept: Optional[bool] = None
+        self.__spans: list[Span] = []
+        self.__lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self.__lock:
+            if self.kept is None:
+                self.__spans.append(span)
+                return
+        # Background work that outlived the request, e.g. history compaction.
+        if self.kept:
+            self.tracer.export([span])
+
+    def close(self, root: Span) -> None:
+        duration = (root.end - root.start) / 1e9
+        with self.__lock:
+            spans, self.__spans = self.__spans, []
+            if any(s.error for s in spans):
+                decision = "error"
+            elif duration >= self.tracer.slowSeconds:
+                decision = "slow"
+            elif self.sampled:
+                decision = "sampled"
+            else:
+                decision = "dropped"
+            self.kept = decision != "dropped"
+        TRACES.inc(decision=decision)
+        if self.kept:
+            self.tracer.export(spans)
+
+
+def otlpAttribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class JsonlExporter:
+    """
+    Appends one OTLP/JSON ExportTraceServiceRequest per line, the format of the
+    OpenTelemetry collector file exporter (readable by its otlpjsonfile receiver).
+    Lines are written by a background thread, the request path only enqueues.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.__path = Path(path)
+        self.__queue: queue.SimpleQueue[Optional[list[Span]]] = queue.SimpleQueue()
+        self.__thread: Optional[threading.Thread] = None
+        self.__lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        if self.__thread is None:
+            with self.__lock:
+                if self.__thread is None:
+                    self.__path.parent.mkdir(parents=True, exist_ok=True)
+                    self.__thread = threading.Thread(
+                        target=self.__write, name="trace-exporter", daemon=True
+                    )
+                    self.__thread.start()
+        self.__queue.put(spans)
+
+    def __write(self) -> None:
+        # One os.write per line, lines of concurrent workers don't interleave.
+        fd = os.open(self.__path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            while (spans := self.__queue.get()) is not None:
+                try:
+                    line = json.dumps(self.toOtlp(spans), separators=(",", ":")) + "\n"
+                    os.write(fd, line.encode())
+                except Exception as err:
+                    TRACES.inc(decision="export_failed")
+                    logger.exception(
+                        "Trace export exception. %s", err, extra={"method": "JsonlExporter"}
+                    )
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def toOtlp(spans: list[Span]) -> dict:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            otlpAttribute("service.name", SERVICE_NAME),
+                            otlpAttribute("process.pid", os.getpid()),
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "app.tracing"},
+                            "spans": [span.toOtlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def close(self) -> None:
+        """Flush queued traces, called on shutdown."""
+        thread = self.__thread
+        if thread is not None:
+            self.__queue.put(None)
+            thread.join(timeout=5)
+            self.__thread = None
+
+
+CURRENT_SPAN: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "CURRENT_SPAN", default=None
+)
+
+
+class Tracer:
+    """
+    Request scoped spans: `trace` opens the root of a request, `span` a child
+    of the current span. Outside a trace, or when tracing is off, both cost
+    one context variable lookup.
+    """
+
+    def __init__(
+        self,
+        exporter: Optional[JsonlExporter],
+        sampleRate: float = 0.05,
+        slowSeconds: float = 2.0,
+    ) -> None:
+        self.__exporter = exporter
+        self.sampleRate = sampleRate
+        self.slowSeconds = slowSeconds
+
+    @property
+    def enabled(self) -> bool:
+        return self.__exporter is not None
+
+    def export(self, spans: list[Span]) -> None:
+        if self.__exporter is not None and spans:
+            self.__exporter.export(spans)
+
+    @contextmanager
+    def trace(self, requestId: str, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        if self.__exporter is None:
+            yield None
+            return
+        trace = Trace(self, requestId, random.random() < self.sampleRate)
+        root = Span(trace, name, None, attributes)
+        token = CURRENT_SPAN.set(root)
+        error: Optional[BaseException] = None
+        try:
+            yield root
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            CURRENT_SPAN.reset(token)
+            root.finish(error)
+            trace.close(root)
+
+    def startSpan(self, name: str, **attributes: Any) -> Optional[Span]:
+        """Child of the current span, the caller ends it with `finish`."""
+        parent = CURRENT_SPAN.get()
+        if parent is None:
+            return None
+        return Span(parent.trace, name, parent.spanId, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        span = self.startSpan(name, **attributes)
+        if span is None:
+            yield None
+            return
+        token = CURRENT_SPAN.set(span)
+        error: Optional[BaseException] = None
+        try:
+            yield span
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            CURRENT_SPAN.reset(token)
+            span.finish(error)
+
+    def close(self) -> None:
+        if self.__exporter is not None:
+            self.__exporter.close()
+
+    @classmethod
+    def fromEnv(cls) -> "Tracer":
+        enabled = os.getenv("TRACING", "false").lower() == "true"
+        return cls(
+            JsonlExporter(os.getenv("TRACE_PATH", "logs/traces.jsonl")) if enabled else None,
+            sampleRate=float(os.getenv("TRACE_SAMPLE_RATE", "0.05")),
+            slowSeconds=float(os.getenv("TRACE_SLOW_MS", "2000")) / 1000,
+        )
+
+
+TRACER = Tracer.fromEnv()
+span = TRACER.span
@@ -1,7 +1,7 @@
 # utility.py
 
-from typing import Annotated, Any, Literal, Optional
-from langchain_core.messages import BaseMessage
+from typing import Annotated, Any, Literal, Optional, Protocol
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langgraph.graph.message import add_messages
 from pydantic import BaseModel, Field
 
@@ -32,6 +32,13 @@ class GraphState(BaseModel):
     summary: Annotated[
         Optional[str], Field(description="AI 1-sentence summary of the request")
     ]
+    historySummary: Annotated[
+        Optional[str],
+        Field(
+            default=None,
+            description="Rolling summary of the turns folded out of history.",
+        ),
+    ]
     order: Annotated[
         Optional[OrderDetails],
         Field(description="Order items for sales in the request"),
@@ -52,12 +59,22 @@ class InterruptState(BaseModel):
     userResponse: Annotated[
         Optional[str],
         Field(
-            description="The user respond to assistant question. User may choose among options. User may provide order id or purchased item or date of order or any information about a order."
+            description=(
+                "The user respond to assistant question. User may choose among options. "
+                "User may provide order id or purchased item or date of order or any "
+                "information about a order."
+            )
         ),
     ]
 
 
-SOCKET_STATUS = Literal["stop", "interrupted", "chat"]
+# "new" starts a new conversation (thread) for the user.
+SOCKET_STATUS = Literal["stop", "interrupted", "chat", "new"]
+# "token" frames carry incremental LLM output, "done" closes a streamed answer.
+# "busy" means the request was shed under load and can be retried.
+SOCKET_RESPONSE_STATUS = Literal[
+    "stop", "interrupted", "chat", "token", "done", "new", "busy"
+]
 
 
 class SocketRequest(BaseModel):
@@ -73,22 +90,51 @@ class SocketRequest(BaseModel):
     message: Annotated[
         str,
         Field(
-            description="The message from the user. User may ask a question or request for information."
+            description=(
+                "The message from the user. "
+                "User may ask a question or request for information."
+            )
         ),
     ]
     status: Annotated[SOCKET_STATUS, Field(description="Request status")]
+    stream: Annotated[
+        bool,
+        Field(
+            default=False,
+            description="Opt in to token frames followed by a final done frame.",
+        ),
+    ]
 
 
 class SocketResponse(BaseModel):
     """AI response to websocket"""
 
-    status: SOCKET_STATUS
+    status: SOCKET_RESPONSE_STATUS
     content: str
+    requestId: Optional[str] = None  # Correlates frames of concurrent requests
+
+
+class SocketSender(Protocol):
+    """Anything frames can be sent to, a WebSocket or a SocketSession."""
+
+    async def send_json(self, data: Any, mode: str = "text") -> None: ...
 
 
 # Nodes level
 
 
+def nodeResponse(state: GraphState, aiResponse: str, status: str) -> dict:
+    """State update of a node answering the user, the turn is appended to history."""
+    return {
+        "history": [
+            HumanMessage(content=state.query),
+            AIMessage(content=aiResponse),
+        ],
+        "response": aiResponse,
+        "status": status,
+    }
+
+
 class IndentSchema(BaseModel):
     """Identify the intent of user and other values of the fields."""
 
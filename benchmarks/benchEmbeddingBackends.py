@@ -0,0 +1,90 @@
+# benchEmbeddingBackends.py
+"""
+Local fastembed backend vs TEI over HTTP.
+Reports single query latency (sequential), concurrent query throughput and
+ingest throughput (embed_documents). Without --tei-url the stub embedding
+server is started, point --tei-url at the real embedding-engine for a fair run.
+
+    python -m benchmarks.benchEmbeddingBackends --tei-url http://localhost:8080
+"""
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+
+from app.embeddings import LocalEmbeddings, TeiEmbeddings
+from benchmarks.benchEmbeddings import percentile, waitForServer
+
+QUERY = "how do I return an item I bought last week"
+PASSAGE = (
+    "Items can be returned within 30 days of delivery. The product must be unused "
+    "and in its original packaging. Refunds are issued to the original payment method."
+)
+
+
+async def benchBackend(name: str, embeddings, args) -> dict:
+    embeddings.embed_query("warm up")
+
+    latencies = []
+    for i in range(args.queries):
+        start = time.perf_counter()
+        await embeddings.aembed_query(f"{QUERY} {i}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(embeddings.aembed_query(f"{QUERY} {i}") for i in range(args.concurrent))
+    )
+    concurrentSeconds = time.perf_counter() - start
+
+    passages = [f"{PASSAGE} ({i})" for i in range(args.passages)]
+    start = time.perf_counter()
+    await asyncio.to_thread(embeddings.embed_documents, passages)
+    ingestSeconds = time.perf_counter() - start
+
+    return {
+        "backend": name,
+        "query_p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "query_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "concurrent_qps": round(args.concurrent / concurrentSeconds, 1),
+        "ingest_docs_per_sec": round(args.passages / ingestSeconds, 1),
+    }
+
+
+async def main(args) -> None:
+    server = None
+    teiUrl = args.tei_url
+    if not teiUrl:
+        teiUrl = f"http://127.0.0.1:{args.port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stubEmbeddingServer", "--port", str(args.port)]
+        )
+    try:
+        await waitForServer(teiUrl)
+        print(await benchBackend("tei", TeiEmbeddings(teiUrl), args))
+        print(
+            await benchBackend(
+                "local",
+                LocalEmbeddings(workers=args.workers, cacheDir=args.cache_dir),
+                args,
+            )
+        )
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tei-url", default="")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrent", type=int, default=500)
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--cache-dir", default="model_cache/fastembed")
+    asyncio.run(main(parser.parse_args()))
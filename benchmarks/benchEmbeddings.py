@@ -0,0 +1,94 @@
+# benchEmbeddings.py
+"""
+Query embedding throughput and latency, micro batched vs one request per query.
+Starts the stub embedding server, then fires concurrent aembed_query calls.
+
+    python -m benchmarks.benchEmbeddings --queries 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+from app.embeddings import TeiEmbeddings
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def waitForServer(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"Stub embedding server not up at {url}")
+
+
+async def runCase(name: str, embeddings: TeiEmbeddings, queries: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await embeddings.aembed_query(f"how do I return item number {i}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(queries)))
+    elapsed = time.perf_counter() - start
+    await embeddings.aclose()
+    return {
+        "case": name,
+        "qps": round(queries / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def main(args) -> None:
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stubEmbeddingServer", "--port", str(args.port)]
+    )
+    try:
+        await waitForServer(url)
+        cases = [
+            ("unbatched", TeiEmbeddings(url, maxBatch=1, maxConnections=args.connections)),
+            (
+                "batched",
+                TeiEmbeddings(
+                    url,
+                    batchWindow=args.window_ms / 1000,
+                    maxBatch=args.max_batch,
+                    maxConnections=args.connections,
+                ),
+            ),
+        ]
+        for name, embeddings in cases:
+            print(await runCase(name, embeddings, args.queries, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
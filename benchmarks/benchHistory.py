@@ -0,0 +1,109 @@
+# benchHistory.py
+"""
+Prompt size, prompt build latency and checkpointed history size over long
+synthetic conversations, unbounded history vs the token budget with a
+rolling summary. The summary is a truncating stand-in, no LLM is called.
+
+    python -m benchmarks.benchHistory --turns 200 --budget 2000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+import app.history as history
+from app.history import promptHistory, splitHistory
+from app.utility import GraphState
+
+PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", "You are a customer support executive."),
+        MessagesPlaceholder("history"),
+        ("user", "{input}"),
+    ]
+)
+
+
+def turn(i: int) -> list:
+    return [
+        HumanMessage(
+            content=f"Question {i}: my order ORD-{i:03d} for a leather belt has not arrived, "
+            "can you check where it is and when it will be delivered?",
+            id=f"h{i}",
+        ),
+        AIMessage(
+            content=f"Answer {i}: order ORD-{i:03d} was shipped from Warehouse B and is "
+            "expected within three working days. I'll keep you updated on any change.",
+            id=f"a{i}",
+        ),
+    ]
+
+
+async def fakeSummarize(summary: str, messages: list) -> str:
+    text = " ".join(str(m.content) for m in messages)
+    return (summary + " " + text)[-800:]
+
+
+def state(messages: list, summary: str | None) -> GraphState:
+    return GraphState(
+        history=messages,
+        historySummary=summary,
+        context=None,
+        response=None,
+        intent=None,
+        summary=None,
+        order=None,
+        status="bench",
+        userId="bench",
+        requestId="bench",
+        query="where is my order?",
+    )
+
+
+async def run(args, bounded: bool) -> dict:
+    serde = JsonPlusSerializer()
+    messages: list = []
+    summary: str | None = None
+    promptTokens, buildSeconds, checkpointBytes = [], [], []
+    for i in range(args.turns):
+        messages.extend(turn(i))
+        current = state(messages, summary)
+        start = time.perf_counter()
+        historyMessages = promptHistory(current) if bounded else messages
+        prompt = await PROMPT.ainvoke({"history": historyMessages, "input": current.query})
+        buildSeconds.append(time.perf_counter() - start)
+        promptTokens.append(count_tokens_approximately(prompt.to_messages()))
+
+        if bounded and count_tokens_approximately(messages) > args.budget:
+            older, messages = splitHistory(messages, int(args.budget * args.keep_ratio))
+            summary = await fakeSummarize(summary or "", older)
+        checkpointBytes.append(len(serde.dumps_typed(messages)[1]) + len(summary or ""))
+
+    return {
+        "case": "bounded" if bounded else "unbounded",
+        "turns": args.turns,
+        "last_prompt_tokens": promptTokens[-1],
+        "mean_prompt_tokens": round(statistics.mean(promptTokens)),
+        "last_build_ms": round(buildSeconds[-1] * 1000, 3),
+        "mean_build_ms": round(statistics.mean(buildSeconds) * 1000, 3),
+        "last_checkpoint_kb": round(checkpointBytes[-1] / 1024, 1),
+    }
+
+
+async def main(args) -> None:
+    history.HISTORY_TOKEN_BUDGET = args.budget
+    print(await run(args, bounded=False))
+    print(await run(args, bounded=True))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=2000)
+    parser.add_argument("--keep-ratio", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
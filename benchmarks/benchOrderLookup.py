@@ -0,0 +1,102 @@
+# benchOrderLookup.py
+"""
+Order lookup QPS, a new aiosqlite connection per lookup (the old SqlDb)
+vs the pooled SqlDb. Seeds a temporary inventory database first.
+
+    python -m benchmarks.benchOrderLookup --lookups 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+import aiosqlite
+
+from app.nodes.salesNode import SqlDb
+from app.utility import OrderDetails
+from benchmarks.benchEmbeddings import percentile
+
+ITEMS = ["Laptop", "Belt", "Jacket", "Wallet", "Bag", "Shoes", "Watch", "Phone"]
+STATUSES = ["Delivered", "Processing", "Shipped", "In Stock"]
+
+
+async def seed(path: Path, rows: int) -> None:
+    async with aiosqlite.connect(path) as db:
+        await db.execute(
+            """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    orderId TEXT, orderItem TEXT, status TEXT, location TEXT
+);
+"""
+        )
+        await db.executemany(
+            "INSERT INTO orders (orderId, orderItem, status, location) VALUES (?, ?, ?, ?)",
+            (
+                (f"ORD-{i:06d}", ITEMS[i % len(ITEMS)], STATUSES[i % 4], f"Store {i % 50}")
+                for i in range(rows)
+            ),
+        )
+        await db.commit()
+
+
+async def connectPerLookup(path: Path, order: OrderDetails):
+    """The previous SqlDb.fetch_orders, one connection and thread per call."""
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        rows = await db.execute_fetchall(
+            "SELECT orderId, orderItem, status, location FROM orders WHERE 1=1"
+            " AND orderId = ? LIMIT 5",
+            [order.orderId],
+        )
+        return [dict(row) for row in rows]
+
+
+async def runCase(name: str, lookup, args) -> dict:
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int) -> None:
+        order = OrderDetails(orderId=f"ORD-{i % args.rows:06d}", orderItem=None)
+        async with semaphore:
+            start = time.perf_counter()
+            await lookup(order)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.lookups)))
+    elapsed = time.perf_counter() - start
+    return {
+        "case": name,
+        "qps": round(args.lookups / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def main(args) -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder) / "inventory.db"
+        await seed(path, args.rows)
+        print(await runCase("connect_per_lookup", lambda o: connectPerLookup(path, o), args))
+
+        os.environ["SQLDB_PATH"] = str(path)
+        os.environ["SQLDB_READERS"] = str(args.readers)
+        db = SqlDb()
+        await db.setup()
+        try:
+            print(await runCase("pooled", db.fetch_orders, args))
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--readers", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,133 @@
+# benchOrderSearch.py
+"""
+Order search on a synthetic orders table, before and after the schema migration.
+Builds an unindexed table (the old schema), times orderId and LIKE '%item%'
+lookups, migrates it through SqlDb.setup() (orderId index, FTS5 + triggers)
+and times the same lookups through SqlDb.fetch_orders.
+
+    python -m benchmarks.benchOrderSearch --rows 5000000 --lookups 200
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.nodes.salesNode import SqlDb
+from app.utility import OrderDetails
+from benchmarks.benchEmbeddings import percentile
+
+ADJECTIVES = ["leather", "blue", "black", "premium", "wireless", "travel", "smart", "classic"]
+NOUNS = ["belt", "jacket", "wallet", "bag", "laptop", "watch", "phone", "shoes", "headphones"]
+STATUSES = ["Delivered", "Processing", "Shipped", "In Stock"]
+
+
+def itemName(i: int) -> str:
+    return f"{ADJECTIVES[i % len(ADJECTIVES)]} {NOUNS[(i // 7) % len(NOUNS)]} {i % 1000}"
+
+
+def build(path: Path, rows: int) -> float:
+    start = time.perf_counter()
+    db = sqlite3.connect(path)
+    db.executescript(
+        """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=OFF;
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    orderId TEXT, orderItem TEXT, status TEXT, location TEXT
+);
+"""
+    )
+    db.executemany(
+        "INSERT INTO orders (orderId, orderItem, status, location) VALUES (?, ?, ?, ?)",
+        (
+            (f"ORD-{i:08d}", itemName(i), STATUSES[i % 4], f"Store {i % 50}")
+            for i in range(rows)
+        ),
+    )
+    db.commit()
+    db.close()
+    return time.perf_counter() - start
+
+
+def summarize(name: str, latencies: list[float]) -> dict:
+    return {
+        "case": name,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "qps": round(len(latencies) / sum(latencies), 1),
+    }
+
+
+def timeBaseline(path: Path, orders: list[OrderDetails]) -> list[dict]:
+    db = sqlite3.connect(path)
+    results = []
+    for name, sql, param in (
+        ("orderId_scan", "orderId = ?", lambda o: o.orderId),
+        ("item_like_scan", "orderItem LIKE ?", lambda o: f"%{o.orderItem}%"),
+    ):
+        latencies = []
+        for order in orders:
+            start = time.perf_counter()
+            db.execute(
+                f"SELECT orderId, orderItem, status, location FROM orders WHERE {sql} LIMIT 5",
+                [param(order)],
+            ).fetchall()
+            latencies.append(time.perf_counter() - start)
+        results.append(summarize(name, latencies))
+    db.close()
+    return results
+
+
+async def timeMigrated(db: SqlDb, orders: list[OrderDetails]) -> list[dict]:
+    results = []
+    for name, pick in (
+        ("orderId_index", lambda o: OrderDetails(orderId=o.orderId, orderItem=None)),
+        ("item_fts", lambda o: OrderDetails(orderId=None, orderItem=o.orderItem)),
+    ):
+        latencies = []
+        for order in orders:
+            start = time.perf_counter()
+            await db.fetch_orders(pick(order))
+            latencies.append(time.perf_counter() - start)
+        results.append(summarize(name, latencies))
+    return results
+
+
+async def main(args) -> None:
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder) / "inventory.db"
+        print({"build_seconds": round(build(path, args.rows), 1), "rows": args.rows})
+
+        orders = []
+        for _ in range(args.lookups):
+            i = rng.randrange(args.rows)
+            orders.append(OrderDetails(orderId=f"ORD-{i:08d}", orderItem=itemName(i)))
+
+        for result in timeBaseline(path, orders):
+            print(result)
+
+        os.environ["SQLDB_PATH"] = str(path)
+        db = SqlDb()
+        start = time.perf_counter()
+        await db.setup()
+        print({"migration_seconds": round(time.perf_counter() - start, 1)})
+        try:
+            for result in await timeMigrated(db, orders):
+                print(result)
+        finally:
+            await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+# benchWorkers.py
+"""
+End-to-end /ws throughput of the server with WORKERS=1 and then N uvicorn
+workers sharing the SQLite session store and checkpointer. Each case starts
+the server, waits for /ready and drives it with `benchmarks.loadTest --url`.
+
+`--server fake` (default) runs benchmarks.loadServer offline: FakeChatModel,
+the stub embedding server and seeded fixtures. `--server real` runs
+startServer.py with the project .env (OpenAI and the configured embedding
+backend), every case makes real LLM calls.
+
+    python -m benchmarks.benchWorkers --workers 1 2 4 --users 50 --conversations 10
+    python -m benchmarks.benchWorkers --server real --workers 1 4 --users 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.benchEmbeddings import waitForServer
+from benchmarks.loadTest import waitForReady
+
+
+def startServer(workers: int, args, data: str, embeddingUrl: str) -> tuple[subprocess.Popen, str]:
+    if args.server == "real":
+        # startServer.py listens on port 8000 and reads WORKERS from the env.
+        env = {**os.environ, "WORKERS": str(workers), "ENV": "benchmark"}
+        return subprocess.Popen([sys.executable, "startServer.py"], env=env), "http://127.0.0.1:8000"
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.loadServer",
+            "--data", data,
+            "--port", str(args.port),
+            "--workers", str(workers),
+            "--embedding-url", embeddingUrl,
+            "--rows", str(args.rows),
+            "--llm-latency-ms", str(args.llm_latency_ms),
+            "--llm-tokens-per-second", str(args.llm_tokens_per_second),
+        ]
+    )
+    return process, f"http://127.0.0.1:{args.port}"
+
+
+def runCase(workers: int, args, data: str, embeddingUrl: str, out: Path) -> dict:
+    server, url = startServer(workers, args, data, embeddingUrl)
+    try:
+        asyncio.run(waitForReady(url, args.ready_timeout))
+        report = out / f"workers-{workers}.json"
+        subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.loadTest",
+                "--url", url,
+                "--users", str(args.users),
+                "--conversations", str(args.conversations),
+                "--rows", str(args.rows),
+                "--out", str(report),
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return json.loads(report.read_text())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(args) -> None:
+    embedding = None
+    with tempfile.TemporaryDirectory() as folder:
+        data = args.data or str(Path(folder) / "data")
+        out = Path(folder)
+        embeddingUrl = f"http://127.0.0.1:{args.embedding_port}"
+        try:
+            if args.server == "fake":
+                embedding = subprocess.Popen(
+                    [sys.executable, "-m", "benchmarks.stubEmbeddingServer",
+                     "--port", str(args.embedding_port)]
+                )
+                asyncio.run(waitForServer(embeddingUrl))
+            baseline = None
+            for workers in args.workers:
+                report = runCase(workers, args, data, embeddingUrl, out)
+                baseline = baseline or report["throughput_rps"]
+                p95 = {
+                    name: intent["latency"].get("p95_ms")
+                    for name, intent in report["intents"].items()
+                }
+                print(
+                    {
+                        "workers": workers,
+                        "throughput_rps": report["throughput_rps"],
+                        "speedup": round(report["throughput_rps"] / baseline, 2) if baseline else None,
+                        "errors": report["errors"],
+                        "p95_ms": p95,
+                    }
+                )
+        finally:
+            if embedding is not None:
+                embedding.terminate()
+                embedding.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--server", choices=["fake", "real"], default="fake")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--data", help="Fixture folder of the fake server, reused across cases.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--embedding-port", type=int, default=8081)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50)
+    main(parser.parse_args())
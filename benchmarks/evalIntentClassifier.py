@@ -0,0 +1,97 @@
+# evalIntentClassifier.py
+"""
+Offline agreement of the cheap intent tiers with the LLM classifier.
+Reads a JSONL file of {"query": ..., "intent": ...} where intent is the LLM
+label. Rows without an intent are labelled with the LLM (needs OPENAI_API_KEY)
+and written back with --write. Reports per tier coverage and agreement.
+
+    python -m benchmarks.evalIntentClassifier --labels intentLabels.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from app.graph import LLM
+from app.intentClassifier import TieredIntentClassifier
+from app.nodes.classifyIntentNode import classifyWithLlm
+
+
+async def labelWithLlm(rows: list[dict], concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(row: dict) -> None:
+        async with semaphore:
+            row["intent"] = (await classifyWithLlm(LLM, row["query"])).intent
+
+    await asyncio.gather(*(one(row) for row in rows if not row.get("intent")))
+
+
+async def main(args) -> None:
+    path = Path(args.labels)
+    rows = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    if any(not row.get("intent") for row in rows):
+        await labelWithLlm(rows, args.concurrency)
+        if args.write:
+            path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+    classifier = TieredIntentClassifier.fromEnv()
+    await classifier.warmUp()
+
+    served: Counter = Counter()
+    agreed: Counter = Counter()
+    disagreements = []
+    start = time.perf_counter()
+    for row in rows:
+        result = await classifier.classify(row["query"])
+        tier = result.tier if result else "llm"
+        served[tier] += 1
+        if result is None or result.intent == row["intent"]:
+            agreed[tier] += 1
+        else:
+            disagreements.append((tier, row["query"], row["intent"], result.intent))
+    elapsed = time.perf_counter() - start
+
+    total = len(rows)
+    for tier in ("rules", "centroid", "llm"):
+        print(
+            {
+                "tier": tier,
+                "messages": served[tier],
+                "coverage_pct": round(100 * served[tier] / total, 1) if total else 0.0,
+                # The llm tier is the reference, agreement only applies to cheap tiers.
+                "agreement_pct": (
+                    round(100 * agreed[tier] / served[tier], 1)
+                    if served[tier] and tier != "llm"
+                    else None
+                ),
+            }
+        )
+    cheap = served["rules"] + served["centroid"]
+    print(
+        {
+            "messages": total,
+            "llm_calls_saved_pct": round(100 * cheap / total, 1) if total else 0.0,
+            "cheap_agreement_pct": (
+                round(100 * (agreed["rules"] + agreed["centroid"]) / cheap, 1)
+                if cheap
+                else None
+            ),
+            "cheap_ms_per_message": round(elapsed * 1000 / total, 3) if total else 0.0,
+        }
+    )
+    if args.verbose:
+        for tier, query, expected, got in disagreements:
+            print(f"[{tier}] llm={expected} fast={got} | {query}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--labels", required=True)
+    parser.add_argument("--write", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--verbose", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,181 @@
+# fakeChatModel.py
+"""
+Deterministic stand-in for ChatOpenAI, no network and no cost.
+Replies after `latencyMs` (time to first token) and streams `replyTokens`
+words at `tokensPerSecond`. Structured output (intent classification,
+order extraction) is derived from the last user message with regexes.
+Usage reports prompt tokens of an already seen message prefix as cached,
+like the provider's prompt prefix cache.
+Plugged into the graph through GraphContext.llm by benchmarks.loadServer.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+from app.utility import IndentSchema, OrderDetails
+
+ORDER_ID = re.compile(r"\bORD-\d+\b", re.IGNORECASE)
+SALES_WORDS = re.compile(r"\b(order|delivery|shipped|track|bought|purchase)\w*", re.IGNORECASE)
+SUPPORT_WORDS = re.compile(
+    r"\b(return|refund|warranty|policy|shipping|exchange|damaged|cancel)\w*", re.IGNORECASE
+)
+WORDS = (
+    "thanks for reaching out we checked the details and here is what you need to know "
+    "about your request please let us know if there is anything else we can help with"
+).split()
+
+
+def lastText(value: Any) -> str:
+    """Text of the last message of any chat model input."""
+    if isinstance(value, PromptValue):
+        value = value.to_messages()
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)) and value:
+        last = value[-1]
+        if isinstance(last, BaseMessage):
+            return str(last.content)
+        if isinstance(last, (list, tuple)):
+            return str(last[-1])
+        return str(last)
+    return str(value)
+
+
+def classify(text: str) -> IndentSchema:
+    orderId = ORDER_ID.search(text)
+    if orderId or SALES_WORDS.search(text):
+        intent = "Sales"
+    elif SUPPORT_WORDS.search(text):
+        intent = "Support"
+    else:
+        intent = "General"
+    return IndentSchema(
+        summary=text[:80],
+        intent=intent,
+        orderId=orderId.group(0).upper() if orderId else None,
+        orderItem=None,
+        reasoning="fake model keyword match",
+    )
+
+
+def extractOrder(text: str) -> OrderDetails:
+    orderId = ORDER_ID.search(text)
+    rest = ORDER_ID.sub("", text).replace("Extract values from", "").strip(" ,.")
+    return OrderDetails(
+        orderId=orderId.group(0).upper() if orderId else None,
+        orderItem=rest.split(",")[-1].strip() or None,
+    )
+
+
+class FakeChatModel(BaseChatModel):
+    latencyMs: float = 300.0
+    tokensPerSecond: float = 50.0
+    replyTokens: int = 40
+    # Hashes of the message prefixes seen so far, the fake prefix cache.
+    _seenPrefixes: set[str] = PrivateAttr(default_factory=set)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def __reply(self, messages: list[BaseMessage]) -> list[str]:
+        # Same prompt, same answer.
+        seed = int.from_bytes(hashlib.sha256(lastText(messages).encode()).digest()[:4], "little")
+        return [WORDS[(seed + i) % len(WORDS)] + " " for i in range(self.replyTokens)]
+
+    def __usage(self, messages: list[BaseMessage]) -> UsageMetadata:
+        sizes = [len(str(m.content).split()) for m in messages]
+        prompt = sum(sizes)
+        cached = 0
+        prefix = hashlib.sha256()
+        for i, message in enumerate(messages):
+            prefix.update(f"{message.type}:{message.content}\n".encode())
+            key = prefix.hexdigest()
+            if key in self._seenPrefixes and i < len(messages) - 1:
+                cached = sum(sizes[: i + 1])
+            self._seenPrefixes.add(key)
+        return UsageMetadata(
+            input_tokens=prompt,
+            output_tokens=self.replyTokens,
+            total_tokens=prompt + self.replyTokens,
+            input_token_details={"cache_read": cached},
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latencyMs / 1000 + self.replyTokens / self.tokensPerSecond)
+        message = AIMessage(
+            content="".join(self.__reply(messages)).strip(),
+            usage_metadata=self.__usage(messages),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latencyMs / 1000 + self.replyTokens / self.tokensPerSecond)
+        message = AIMessage(
+            content="".join(self.__reply(messages)).strip(),
+            usage_metadata=self.__usage(messages),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        result = self._generate(messages, stop, **kwargs)
+        yield ChatGenerationChunk(message=AIMessageChunk(content=result.generations[0].text))
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latencyMs / 1000)
+        tokens = self.__reply(messages)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(1 / self.tokensPerSecond)
+            chunk = ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content=token,
+                    usage_metadata=self.__usage(messages) if i == len(tokens) - 1 else None,
+                )
+            )
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema: Any, **kwargs: Any):
+        """Intent classification and order extraction, after the model latency."""
+
+        async def structured(value: Any) -> Any:
+            await asyncio.sleep(self.latencyMs / 1000)
+            text = lastText(value)
+            if schema is IndentSchema:
+                return classify(text)
+            if schema is OrderDetails:
+                return extractOrder(text)
+            raise ValueError(f"FakeChatModel has no structured output for {schema}")
+
+        return RunnableLambda(structured, name="FakeStructuredOutput")
@@ -0,0 +1,131 @@
+# loadServer.py
+"""
+The FastAPI app on offline fixtures, for benchmarks.loadTest.
+Seeds an orders database and a small policy corpus into `--data`, points
+the app at the stub embedding server and replaces the OpenAI model with
+FakeChatModel (graph.LLM is what GraphContext.llm carries into the nodes).
+Uvicorn imports `benchmarks.loadServer:app` in every worker, each one
+builds its own patched app from the env set by `configure`.
+
+    python -m benchmarks.loadServer --data /tmp/asp-load --port 8090 --embedding-url http://127.0.0.1:8081
+    python -m benchmarks.loadServer --data /tmp/asp-load --workers 4
+"""
+
+import argparse
+import os
+from pathlib import Path
+import uvicorn
+
+from benchmarks.benchOrderSearch import build
+
+CORPUS = {
+    "returns.md": """# Returns and refunds
+Items can be returned within 30 days of delivery in their original packaging.
+Damaged or defective items are replaced free of charge, send a photo with the order id.
+Refunds are issued to the original payment method within 5 to 7 working days
+after the returned item reaches our warehouse.
+""",
+    "shipping.md": """# Shipping
+Standard shipping takes 3 to 5 working days, express shipping 1 to 2 working days.
+Orders over 50 dollars ship for free. Tracking details are sent by email once the order ships.
+International orders may be held by customs for up to 10 days.
+""",
+    "warranty.md": """# Warranty
+Electronics carry a 12 month warranty against manufacturing defects.
+Accessories such as belts, wallets and bags carry a 6 month warranty.
+Warranty claims need the order id and a short description of the problem.
+""",
+    "account.md": """# Account and payments
+We accept cards, bank transfers and gift cards. Gift cards never expire.
+Orders can be cancelled free of charge until they are shipped.
+Invoices are available in the orders section of your account.
+""",
+}
+
+
+def seed(data: Path, rows: int) -> None:
+    documents = data / "documents"
+    documents.mkdir(parents=True, exist_ok=True)
+    for name, text in CORPUS.items():
+        (documents / name).write_text(text)
+    inventory = data / "inventory.db"
+    if not inventory.exists():
+        build(inventory, rows)
+
+
+def configure(data: Path, args) -> None:
+    """Env of the app modules, set before they are imported."""
+    os.environ.update(
+        {
+            "ENV": "benchmark",
+            "OPENAI_API_KEY": "offline",
+            "VECTORDB_PATH": str(data / "chromadb"),
+            "VECTORDB_DOCUMENT_PATH": str(data / "documents"),
+            "SQLDB_PATH": str(data / "inventory.db"),
+            "CHECKPOINT_DB_PATH": str(data / "checkpoints.db"),
+            "SESSION_DB_PATH": str(data / "sessions.db"),
+            "EMBEDDING_BACKEND": "tei",
+            "EMBEDDING_URL": args.embedding_url,
+            "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+            "FAKE_LLM_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+            "FAKE_LLM_REPLY_TOKENS": str(args.llm_reply_tokens),
+        }
+    )
+    if args.workers > 1:
+        # Same rule as startServer.py, workers share sessions and checkpoints.
+        os.environ["SESSION_BACKEND"] = "sqlite"
+        os.environ["CHECKPOINTER"] = "sqlite"
+
+
+def buildApp():
+    """app.fastapp with FakeChatModel behind the LLM gateway."""
+    import app.graph as graph
+    from app.fastapp import app
+    from app.instrumentation import LLM_METRICS
+    from app.llmGateway import LLM_ADMISSION, LLM_COALESCER, LlmGateway
+    from benchmarks.fakeChatModel import FakeChatModel
+
+    graph.LLM = LlmGateway(
+        FakeChatModel(
+            latencyMs=float(os.environ["FAKE_LLM_LATENCY_MS"]),
+            tokensPerSecond=float(os.environ["FAKE_LLM_TOKENS_PER_SECOND"]),
+            replyTokens=int(os.environ["FAKE_LLM_REPLY_TOKENS"]),
+            callbacks=[LLM_METRICS],
+        ),
+        LLM_ADMISSION,
+        LLM_COALESCER,
+    )
+    return app
+
+
+def __getattr__(name: str):
+    # Built on first access, after `configure` set the env.
+    if name == "app":
+        return buildApp()
+    raise AttributeError(name)
+
+
+def main(args) -> None:
+    data = Path(args.data)
+    seed(data, args.rows)
+    configure(data, args)
+    uvicorn.run(
+        "benchmarks.loadServer:app",
+        host="127.0.0.1",
+        port=args.port,
+        workers=args.workers,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data", required=True)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--embedding-url", default="http://127.0.0.1:8081")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50)
+    parser.add_argument("--llm-reply-tokens", type=int, default=40)
+    main(parser.parse_args())
@@ -0,0 +1,309 @@
+# loadTest.py
+"""
+Offline end-to-end load test of the /ws pipeline.
+Starts the stub embedding server and benchmarks.loadServer (FakeChatModel,
+seeded orders, sample corpus), then replays Sales, Support and General
+conversations from `--users` concurrent websocket clients. Sales
+conversations without an order id go through interrupt and resume.
+
+Reports throughput and p50/p95/p99 latency and time to first frame per
+step, saves them to `--out` and compares with an earlier run (`--compare`).
+
+    python -m benchmarks.loadTest --users 50 --conversations 10
+    python -m benchmarks.loadTest --users 50 --compare benchmarks/results/load-20260101-120000.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+import httpx
+import websockets
+
+from benchmarks.benchEmbeddings import percentile, waitForServer
+from benchmarks.benchOrderSearch import itemName
+
+FINAL_STATUSES = ("chat", "done", "interrupted", "busy")
+SUPPORT_QUESTIONS = [
+    "What is your return policy for damaged items?",
+    "How long does standard shipping take?",
+    "Is there a warranty on electronics?",
+    "Can I get a refund to my gift card?",
+    "How do I exchange a product that doesn't fit?",
+]
+GENERAL_MESSAGES = [
+    "Hi there!",
+    "Tell me something fun about your company.",
+    "Thanks, that was helpful.",
+    "Who am I talking to?",
+]
+
+
+def conversation(kind: str, rng: random.Random, rows: int) -> list[tuple[str, str, str]]:
+    """Steps of one conversation: (step name, message, socket status)."""
+    if kind == "sales":
+        i = rng.randrange(rows)
+        if rng.random() < 0.5:
+            return [("sales_lookup", f"What is the status of order ORD-{i:08d}?", "chat")]
+        return [
+            ("sales_interrupt", "Where is my order? It hasn't arrived yet.", "chat"),
+            ("sales_resume", f"ORD-{i:08d}, {itemName(i)}", "interrupted"),
+        ]
+    if kind == "support":
+        return [("support", rng.choice(SUPPORT_QUESTIONS), "chat")]
+    return [("general", rng.choice(GENERAL_MESSAGES), "chat")]
+
+
+class Step:
+    __slots__ = ("name", "sent", "firstFrame", "done", "status", "error")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.sent = time.perf_counter()
+        self.firstFrame: Optional[float] = None
+        self.done: Optional[float] = None
+        self.status = ""
+        self.error: Optional[str] = None
+
+
+async def runStep(ws, userId: str, name: str, message: str, status: str, args) -> Step:
+    requestId = str(uuid.uuid4())
+    step = Step(name)
+    await ws.send(
+        json.dumps(
+            {
+                "userId": userId,
+                "requestId": requestId,
+                "userName": "load",
+                "message": message,
+                "status": status,
+                "stream": args.stream,
+            }
+        )
+    )
+    deadline = step.sent + args.timeout
+    while step.done is None:
+        try:
+            raw = await asyncio.wait_for(ws.recv(), timeout=max(0.0, deadline - time.perf_counter()))
+        except asyncio.TimeoutError:
+            step.error = "timeout"
+            break
+        frame = json.loads(raw)
+        if isinstance(frame, str):
+            # Error frames are sent as a JSON string without a request id.
+            frame = json.loads(frame)
+            step.error = frame.get("message", "error")
+            step.done = time.perf_counter()
+            break
+        if frame.get("requestId") != requestId:
+            continue
+        now = time.perf_counter()
+        step.firstFrame = step.firstFrame or now
+        if frame.get("status") in FINAL_STATUSES:
+            step.status = frame["status"]
+            step.done = now
+            if step.status == "busy":
+                step.error = "busy"
+    return step
+
+
+async def virtualUser(index: int, url: str, args, steps: list[Step]) -> None:
+    rng = random.Random(args.seed + index)
+    kinds, weights = zip(*args.mix.items())
+    userId = f"load-{index}-{uuid.uuid4().hex[:6]}"
+    async with websockets.connect(url, origin=args.origin, max_size=None) as ws:
+        for _ in range(args.conversations):
+            kind = rng.choices(kinds, weights)[0]
+            for name, message, status in conversation(kind, rng, args.rows):
+                step = await runStep(ws, userId, name, message, status, args)
+                steps.append(step)
+                if step.error:
+                    break
+                if name == "sales_interrupt" and step.status != "interrupted":
+                    # Answered without asking, nothing to resume.
+                    break
+            if args.think_ms:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+
+
+def summarize(steps: list[Step], elapsed: float) -> dict:
+    byName: dict[str, list[Step]] = defaultdict(list)
+    for step in steps:
+        byName[step.name].append(step)
+
+    def stats(values: list[float]) -> dict:
+        if not values:
+            return {}
+        return {
+            "p50_ms": round(statistics.median(values) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+        }
+
+    report = {
+        "elapsed_s": round(elapsed, 2),
+        "steps": len(steps),
+        "errors": sum(1 for s in steps if s.error),
+        "throughput_rps": round(sum(1 for s in steps if not s.error) / elapsed, 2),
+        "intents": {},
+    }
+    for name, group in sorted(byName.items()):
+        ok = [s for s in group if not s.error and s.done is not None]
+        report["intents"][name] = {
+            "count": len(group),
+            "errors": len(group) - len(ok),
+            "latency": stats([s.done - s.sent for s in ok]),
+            "first_frame": stats([s.firstFrame - s.sent for s in ok if s.firstFrame]),
+        }
+    return report
+
+
+def compare(current: dict, previous: dict) -> None:
+    """Relative change of throughput and latency percentiles, + is slower for latency."""
+
+    def delta(new, old) -> str:
+        if not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(
+        "throughput_rps",
+        current["throughput_rps"],
+        "vs",
+        previous["throughput_rps"],
+        delta(current["throughput_rps"], previous["throughput_rps"]),
+    )
+    for name, intent in current["intents"].items():
+        old = previous["intents"].get(name)
+        if not old:
+            continue
+        for metric in ("latency", "first_frame"):
+            for pct, value in intent[metric].items():
+                before = old[metric].get(pct)
+                print(f"{name:16} {metric:12} {pct:7} {value:9} vs {before} {delta(value, before)}")
+
+
+async def runLoad(url: str, args) -> dict:
+    steps: list[Step] = []
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(virtualUser(i, url, args, steps) for i in range(args.users)),
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if isinstance(r, BaseException)]
+    report = summarize(steps, elapsed)
+    report["failed_users"] = len(failed)
+    if failed:
+        report["first_failure"] = repr(failed[0])
+    return report
+
+
+async def waitForReady(url: str, timeout: float) -> None:
+    """Ingestion and warm up finish before /ready turns 200."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"Load server not ready at {url}")
+
+
+async def main(args) -> None:
+    processes: list[subprocess.Popen] = []
+    folder = None
+    try:
+        if args.url:
+            baseUrl = args.url
+        else:
+            embeddingUrl = f"http://127.0.0.1:{args.embedding_port}"
+            processes.append(
+                subprocess.Popen(
+                    [sys.executable, "-m", "benchmarks.stubEmbeddingServer",
+                     "--port", str(args.embedding_port)]
+                )
+            )
+            await waitForServer(embeddingUrl)
+            if not args.data:
+                folder = tempfile.TemporaryDirectory()
+            processes.append(
+                subprocess.Popen(
+                    [
+                        sys.executable, "-m", "benchmarks.loadServer",
+                        "--data", args.data or folder.name,
+                        "--port", str(args.port),
+                        "--embedding-url", embeddingUrl,
+                        "--rows", str(args.rows),
+                        "--llm-latency-ms", str(args.llm_latency_ms),
+                        "--llm-tokens-per-second", str(args.llm_tokens_per_second),
+                        "--llm-reply-tokens", str(args.llm_reply_tokens),
+                    ]
+                )
+            )
+            baseUrl = f"http://127.0.0.1:{args.port}"
+        await waitForReady(baseUrl, args.ready_timeout)
+
+        wsUrl = baseUrl.replace("http", "ws", 1) + "/ws"
+        report = await runLoad(wsUrl, args)
+        report["args"] = {k: v for k, v in vars(args).items() if k not in ("compare",)}
+        print(json.dumps({k: v for k, v in report.items() if k != "args"}, indent=2))
+
+        out = Path(args.out or f"benchmarks/results/load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2))
+        print(f"Saved {out}")
+        if args.compare:
+            compare(report, json.loads(Path(args.compare).read_text()))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        if folder is not None:
+            folder.cleanup()
+
+
+def parseMix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, weight = part.split("=")
+        if kind not in ("sales", "support", "general"):
+            raise argparse.ArgumentTypeError(f"Unknown conversation kind {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="Use a running server instead of starting one.")
+    parser.add_argument("--data", help="Fixture folder, reused across runs to skip ingestion.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--embedding-port", type=int, default=8081)
+    parser.add_argument("--origin", default="http://localhost")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--mix", type=parseMix, default=parseMix("sales=0.4,support=0.4,general=0.2"))
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--think-ms", type=float, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--ready-timeout", type=float, default=300)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=50)
+    parser.add_argument("--llm-reply-tokens", type=int, default=40)
+    parser.add_argument("--out")
+    parser.add_argument("--compare")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+# stubEmbeddingServer.py
+"""
+Local stand-in for the TEI embedding-engine, no model required.
+Deterministic unit vectors per text, with a fixed per request latency and a
+per text cost to mimic the real server.
+
+    python -m benchmarks.stubEmbeddingServer --port 8081 --latency-ms 8 --per-item-ms 0.3
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+DIMENSIONS = int(os.getenv("STUB_EMBEDDING_DIM", "384"))
+LATENCY_MS = float(os.getenv("STUB_EMBEDDING_LATENCY_MS", "8"))
+PER_ITEM_MS = float(os.getenv("STUB_EMBEDDING_PER_ITEM_MS", "0.3"))
+
+app = FastAPI(title="Stub embedding engine")
+STATS = {"requests": 0, "texts": 0}
+
+
+class EmbedRequest(BaseModel):
+    inputs: str | list[str]
+    truncate: bool = True
+    normalize: bool = True
+
+
+def stubVector(text: str) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIMENSIONS)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@app.get("/health")
+async def health() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/stats")
+async def stats() -> dict:
+    return STATS
+
+
+@app.post("/embed")
+async def embed(request: EmbedRequest) -> list[list[float]]:
+    texts = [request.inputs] if isinstance(request.inputs, str) else request.inputs
+    STATS["requests"] += 1
+    STATS["texts"] += len(texts)
+    await asyncio.sleep((LATENCY_MS + PER_ITEM_MS * len(texts)) / 1000)
+    return [stubVector(text) for text in texts]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--per-item-ms", type=float, default=PER_ITEM_MS)
+    args = parser.parse_args()
+    LATENCY_MS, PER_ITEM_MS = args.latency_ms, args.per_item_ms
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,80 @@
+# traceReport.py
+"""
+Slowest requests of an OTLP/JSON lines trace file (TRACE_PATH) and where
+their time went: the spans of each request sorted by self time, i.e.
+duration minus the time covered by child spans.
+
+    python -m benchmarks.traceReport logs/traces.jsonl --top 10 --spans 5
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+
+def loadSpans(path: str) -> dict[str, list[dict]]:
+    """traceId -> spans, a trace may span several lines (late spans)."""
+    traces: dict[str, list[dict]] = defaultdict(list)
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            for resource in json.loads(line)["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    for span in scope["spans"]:
+                        span["durationMs"] = (
+                            int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])
+                        ) / 1e6
+                        span["attrs"] = {
+                            a["key"]: next(iter(a["value"].values())) for a in span["attributes"]
+                        }
+                        traces[span["traceId"]].append(span)
+    return traces
+
+
+def selfTimes(spans: list[dict]) -> list[tuple[float, dict]]:
+    children: dict[str, float] = defaultdict(float)
+    for span in spans:
+        if span.get("parentSpanId"):
+            children[span["parentSpanId"]] += span["durationMs"]
+    return sorted(
+        ((max(0.0, span["durationMs"] - children[span["spanId"]]), span) for span in spans),
+        key=lambda item: item[0],
+        reverse=True,
+    )
+
+
+def main(args) -> None:
+    traces = loadSpans(args.path)
+    roots = []
+    for spans in traces.values():
+        root = next((s for s in spans if not s.get("parentSpanId")), None)
+        if root is not None:
+            roots.append((root, spans))
+    roots.sort(key=lambda item: item[0]["durationMs"], reverse=True)
+
+    durations = sorted(root["durationMs"] for root, _ in roots)
+    if durations:
+        print(
+            {
+                "requests": len(durations),
+                "p50_ms": round(durations[len(durations) // 2], 1),
+                "p99_ms": round(durations[min(len(durations) - 1, int(len(durations) * 0.99))], 1),
+            }
+        )
+    for root, spans in roots[: args.top]:
+        print(
+            f"\n{root['attrs'].get('request.id')} {root['durationMs']:.1f} ms"
+            f" {root.get('status', {}).get('message', '')}"
+        )
+        for selfMs, span in selfTimes(spans)[: args.spans]:
+            detail = {k: v for k, v in span["attrs"].items() if k != "request.id"}
+            print(f"  {selfMs:9.1f} ms self  {span['durationMs']:9.1f} ms  {span['name']} {detail}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--spans", type=int, default=5)
+    main(parser.parse_args())
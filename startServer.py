@@ -9,13 +9,21 @@ load_dotenv()
 
 if __name__ == "__main__":
     is_development = os.getenv("ENV") == "development"
+    workers = int(os.getenv("WORKERS", "1"))
+
+    if workers > 1:
+        # Every worker must see the same sessions and checkpoints.
+        os.environ.setdefault("SESSION_BACKEND", "sqlite")
+        if os.getenv("SESSION_BACKEND") != "sqlite" or os.getenv("CHECKPOINTER", "sqlite") != "sqlite":
+            raise ValueError("WORKERS > 1 needs SESSION_BACKEND=sqlite and CHECKPOINTER=sqlite")
 
     uvicorn.run(
         "app.fastapp:app",
         # host="localhost", # use localhost when run "python startServer.py"
         host="0.0.0.0",  # for docker containers
         port=8000,
-        reload=is_development,
+        workers=workers,
+        reload=is_development and workers == 1,  # uvicorn can't reload workers
         reload_excludes=[
             ".venu",
             "chromadb",
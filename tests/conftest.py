@@ -0,0 +1,6 @@
+# conftest.py
+
+import os
+
+# ChatOpenAI is created at import, it only checks that a key is set.
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,39 @@
+# test_cache.py
+
+import time
+from app.cache import SemanticCache
+
+
+def test_semantic_cache_threshold():
+    cache = SemanticCache({"Support"}, threshold=0.95)
+    cache.store("Support", 1, [1.0, 0.0, 0.0], "refund policy")
+    # cos = 0.995 and 0.707
+    assert cache.lookup("Support", 1, [1.0, 0.1, 0.0]) == "refund policy"
+    assert cache.lookup("Support", 1, [1.0, 1.0, 0.0]) is None
+    assert cache.enabled("Support") and not cache.enabled("Sales")
+
+
+def test_semantic_cache_partitions_by_intent_and_version():
+    cache = SemanticCache({"Support", "General"}, threshold=0.9)
+    cache.store("Support", 1, [1.0, 0.0], "v1 answer")
+    cache.store("General", 1, [1.0, 0.0], "general answer")
+    assert cache.lookup("Support", 2, [1.0, 0.0]) is None
+    assert cache.lookup("General", 1, [1.0, 0.0]) == "general answer"
+
+    # A new document version drops the answers of the old one.
+    cache.store("Support", 2, [1.0, 0.0], "v2 answer")
+    assert cache.lookup("Support", 2, [1.0, 0.0]) == "v2 answer"
+    assert cache.lookup("Support", 1, [1.0, 0.0]) is None
+    assert cache.lookup("General", 1, [1.0, 0.0]) == "general answer"
+
+
+def test_semantic_cache_evicts_oldest_and_expired():
+    cache = SemanticCache({"General"}, threshold=0.9, maxSize=2, ttl=0.05)
+    cache.store("General", 1, [1.0, 0.0, 0.0], "x")
+    cache.store("General", 1, [0.0, 1.0, 0.0], "y")
+    cache.store("General", 1, [0.0, 0.0, 1.0], "z")
+    assert cache.lookup("General", 1, [1.0, 0.0, 0.0]) is None
+    assert cache.lookup("General", 1, [0.0, 1.0, 0.0]) == "y"
+    assert cache.lookup("General", 1, [0.0, 0.0, 1.0]) == "z"
+    time.sleep(0.1)
+    assert cache.lookup("General", 1, [0.0, 0.0, 1.0]) is None
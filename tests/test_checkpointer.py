@@ -0,0 +1,119 @@
+# test_checkpointer.py
+
+import asyncio
+import operator
+from typing import Annotated, TypedDict
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, interrupt
+from app.checkpointer import CHECKPOINT_COMMITS, BatchedSqliteSaver
+from app.sqlitePool import SqlitePool
+
+
+async def openSaver(path, **kwargs) -> tuple[SqlitePool, BatchedSqliteSaver]:
+    pool = SqlitePool(path, readers=2)
+    await pool.open()
+    saver = BatchedSqliteSaver(pool, pruneInterval=0, **kwargs)
+    await saver.start()
+    return pool, saver
+
+
+async def closeSaver(pool: SqlitePool, saver: BatchedSqliteSaver) -> None:
+    await saver.stop()
+    await pool.close()
+
+
+def threadConfig(threadId: str) -> dict:
+    return {"configurable": {"thread_id": threadId, "checkpoint_ns": ""}}
+
+
+def test_concurrent_writes_share_a_commit(tmp_path):
+    async def main():
+        pool, saver = await openSaver(tmp_path / "c.db", batchWindow=0.05)
+        try:
+            before = CHECKPOINT_COMMITS.value()
+            checkpoints = [empty_checkpoint() for _ in range(20)]
+            await asyncio.gather(
+                *(
+                    saver.aput(threadConfig(f"t{i}"), checkpoint, {"step": i}, {})
+                    for i, checkpoint in enumerate(checkpoints)
+                )
+            )
+            assert CHECKPOINT_COMMITS.value() - before < len(checkpoints)
+            for i, checkpoint in enumerate(checkpoints):
+                stored = await saver.aget_tuple({"configurable": {"thread_id": f"t{i}"}})
+                assert stored.checkpoint["id"] == checkpoint["id"]
+                assert stored.metadata["step"] == i
+        finally:
+            await closeSaver(pool, saver)
+
+    asyncio.run(main())
+
+
+class AskState(TypedDict):
+    answers: Annotated[list[str], operator.add]
+
+
+def ask(state: AskState) -> dict:
+    return {"answers": [interrupt("order id?")]}
+
+
+def askGraph(saver: BatchedSqliteSaver):
+    return (
+        StateGraph(AskState)
+        .add_node("ask", ask)
+        .add_edge(START, "ask")
+        .add_edge("ask", END)
+        .compile(checkpointer=saver)
+    )
+
+
+def test_interrupt_resumes_after_reopen(tmp_path):
+    config = {"configurable": {"thread_id": "user"}}
+
+    async def interrupted():
+        pool, saver = await openSaver(tmp_path / "c.db")
+        try:
+            result = await askGraph(saver).ainvoke({"answers": []}, config)
+            assert result["__interrupt__"][0].value == "order id?"
+        finally:
+            await closeSaver(pool, saver)
+
+    async def resumed():
+        pool, saver = await openSaver(tmp_path / "c.db")
+        try:
+            graph = askGraph(saver)
+            assert (await graph.aget_state(config)).next == ("ask",)
+            result = await graph.ainvoke(Command(resume="ORD-001"), config)
+            assert result["answers"] == ["ORD-001"]
+            assert (await graph.aget_state(config)).next == ()
+        finally:
+            await closeSaver(pool, saver)
+
+    asyncio.run(interrupted())
+    asyncio.run(resumed())
+
+
+def test_prune_keeps_newest_checkpoints(tmp_path):
+    async def main():
+        pool, saver = await openSaver(tmp_path / "c.db", keepCheckpoints=2)
+        try:
+            config = threadConfig("user")
+            ids = []
+            for step in range(5):
+                checkpoint = empty_checkpoint()
+                config = await saver.aput(config, checkpoint, {"step": step}, {})
+                await saver.aput_writes(config, [("answers", step)], f"task{step}")
+                ids.append(checkpoint["id"])
+            assert await saver.prune() == 3
+            kept = [t.checkpoint["id"] async for t in saver.alist(threadConfig("user"))]
+            assert kept == ids[:-3:-1]
+            latest = await saver.aget_tuple(threadConfig("user"))
+            assert latest.pending_writes == [("task4", "answers", 4)]
+            async with pool.reader() as conn:
+                rows = await conn.execute_fetchall("SELECT COUNT(*) FROM writes")
+            assert rows[0][0] == 2
+        finally:
+            await closeSaver(pool, saver)
+
+    asyncio.run(main())
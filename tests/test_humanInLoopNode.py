@@ -0,0 +1,60 @@
+# test_humanInLoopNode.py
+
+import asyncio
+import sqlite3
+import pytest
+import app.nodes.salesNode as salesNode
+from app.nodes.humanInLoopNode import extractOrder
+from app.nodes.salesNode import SqlDb, wordSpans
+from app.utility import OrderDetails
+
+
+@pytest.fixture
+def inventory(tmp_path, monkeypatch):
+    """Seeded inventory database used by getSqlDb()."""
+    path = tmp_path / "inventory.db"
+    monkeypatch.setenv("SQLDB_PATH", str(path))
+
+    async def seed():
+        db = SqlDb()
+        await db.setup()
+        await db.close()
+
+    asyncio.run(seed())
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO orders (orderId, orderItem, status, location)"
+            " VALUES ('ORD-006', 'Leather Bag', 'Shipped', 'Warehouse A')"
+        )
+    monkeypatch.setattr(salesNode, "SQL_DB", SqlDb())
+
+
+def extract(reply: str):
+    async def main():
+        try:
+            return await extractOrder(reply)
+        finally:
+            # Pool connections belong to the loop of this asyncio.run.
+            await salesNode.SQL_DB.close()
+
+    return asyncio.run(main())
+
+
+def test_word_spans_keep_the_original_text():
+    assert wordSpans("my T-shirt", maxSpan=3) == ["my", "my T", "my T-shirt", "T", "T-shirt", "shirt"]
+
+
+@pytest.mark.parametrize(
+    "reply, order",
+    [
+        ("ORD-003", OrderDetails(orderId="ORD-003", orderItem=None)),
+        ("it is order number 552", OrderDetails(orderId="552", orderItem=None)),
+        ("#552", OrderDetails(orderId="552", orderItem=None)),
+        ("the laptop I bought", OrderDetails(orderId=None, orderItem="Laptop")),
+        ("a LEATHER bag, thanks", OrderDetails(orderId=None, orderItem="Leather Bag")),
+        ("my bagpack", None),
+        ("I don't remember", None),
+    ],
+)
+def test_extract_order_from_a_reply(inventory, reply, order):
+    assert extract(reply) == order
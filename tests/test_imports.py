@@ -0,0 +1,17 @@
+# test_imports.py
+
+import importlib
+import pytest
+
+MODULES = [
+    "app.history",
+    "app.llmGateway",
+    "app.graph",
+    "app.fastapp",
+    "benchmarks.benchHistory",
+]
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import(module):
+    importlib.import_module(module)
@@ -0,0 +1,79 @@
+# test_intentClassifier.py
+
+import asyncio
+import pytest
+from app.intentClassifier import CentroidClassifier, classifyByRules
+
+
+@pytest.mark.parametrize(
+    "query, intent, orderId",
+    [
+        ("Hello there!", "General", None),
+        ("thanks so much", "General", None),
+        ("Where is ORD-001?", "Sales", "ORD-001"),
+        ("status of order #552", "Sales", "552"),
+        ("bill no 777 please", "Sales", "777"),
+        ("track order number 12345", "Sales", "12345"),
+    ],
+)
+def test_rules_classify_greetings_and_order_ids(query, intent, orderId):
+    result = classifyByRules(query)
+    assert result is not None
+    assert (result.tier, result.intent, result.orderId) == ("rules", intent, orderId)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "I want to order 500 units",
+        "ORD-001 is broken, how do I fix it?",
+        "hello, where is my laptop?",
+        "What is your return policy?",
+    ],
+)
+def test_rules_defer_everything_else(query):
+    assert classifyByRules(query) is None
+
+
+# One axis per intent, seed examples sit on their intent's axis.
+VECTORS = {
+    "sales": [1.0, 0.0, 0.0],
+    "support": [0.0, 1.0, 0.0],
+    "general": [0.0, 0.0, 1.0],
+    "clear support": [0.1, 1.0, 0.2],
+    "between": [0.0, 1.0, 0.98],
+    "sales like": [1.0, 0.2, 0.0],
+    "unrelated": [0.5, 0.5, 0.5],
+}
+
+
+async def embedQuery(text: str) -> list[float]:
+    return VECTORS[text]
+
+
+def classify(query: str):
+    classifier = CentroidClassifier(
+        embedQuery,
+        examples={"Sales": ["sales"], "Support": ["support"], "General": ["general"]},
+        minSimilarity=0.6,
+        margin=0.05,
+    )
+    return asyncio.run(classifier.classify(query))
+
+
+def test_centroid_keeps_a_clear_winner():
+    result = classify("clear support")
+    assert result is not None
+    assert (result.tier, result.intent) == ("centroid", "Support")
+    assert result.confidence > 0.9
+
+
+def test_centroid_defers_within_the_margin():
+    # Support 0.714 vs General 0.700.
+    assert classify("between") is None
+
+
+def test_centroid_defers_sales_and_low_similarity():
+    assert classify("sales like") is None
+    # 0.577 to every centroid, below minSimilarity.
+    assert classify("unrelated") is None
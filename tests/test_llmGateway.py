@@ -0,0 +1,155 @@
+# test_llmGateway.py
+
+import asyncio
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from app.llmGateway import (
+    LLM_GATEWAY_LIMIT,
+    AdmissionQueue,
+    LlmAdmission,
+    LlmBusyError,
+    LlmCoalescer,
+)
+
+
+def test_admission_queue_grants_by_priority_then_fifo():
+    async def main():
+        queue = AdmissionQueue("test", limit=1, maxQueue=10)
+        await queue.acquire(priority=1, timeout=1)
+        granted: list[str] = []
+
+        async def waiter(name: str, priority: int) -> None:
+            await queue.acquire(priority, timeout=1)
+            granted.append(name)
+            queue.release()
+
+        tasks = []
+        for name, priority in (("low", 2), ("first", 1), ("second", 1), ("resume", 0)):
+            tasks.append(asyncio.create_task(waiter(name, priority)))
+            await asyncio.sleep(0)
+        assert len(queue) == 4
+        queue.release()
+        await asyncio.gather(*tasks)
+        assert granted == ["resume", "first", "second", "low"]
+        assert len(queue) == 0 and queue.active == 0
+
+    asyncio.run(main())
+
+
+def test_admission_queue_timeout_leaves_no_waiter():
+    async def main():
+        queue = AdmissionQueue("test", limit=1, maxQueue=1)
+        await queue.acquire(priority=1, timeout=1)
+        with pytest.raises(LlmBusyError) as timedOut:
+            await queue.acquire(priority=1, timeout=0.01)
+        assert timedOut.value.reason == "timeout"
+        assert len(queue) == 0
+        # The timed out waiter no longer counts against maxQueue.
+        waiting = asyncio.create_task(queue.acquire(priority=1, timeout=1))
+        await asyncio.sleep(0)
+        with pytest.raises(LlmBusyError) as full:
+            await queue.acquire(priority=1, timeout=1)
+        assert full.value.reason == "queue_full"
+        queue.release()
+        await waiting
+        assert queue.active == 1 and len(queue) == 0
+
+    asyncio.run(main())
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_rate_limit_burst_halves_the_limit_once():
+    async def main():
+        admission = LlmAdmission(limit=32, maxRetries=2, backoffBase=0.05, backoffMax=0.05)
+        failed: set[int] = set()
+
+        def call(index: int):
+            async def once() -> str:
+                if index not in failed:
+                    failed.add(index)
+                    raise RateLimitError()
+                return "ok"
+
+            return once
+
+        results = await asyncio.gather(
+            *(admission.run(call(i), "hello", None) for i in range(8))
+        )
+        assert results == ["ok"] * 8
+        assert LLM_GATEWAY_LIMIT.value() == 16
+
+    asyncio.run(main())
+
+
+class TokenRecorder(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.tokens: list[str] = []
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.tokens.append(token)
+
+
+def test_coalescer_replays_tokens_to_followers():
+    async def main():
+        coalescer = LlmCoalescer()
+        firstToken = asyncio.Event()
+        upstreamCalls = 0
+
+        async def call(config) -> AIMessage:
+            nonlocal upstreamCalls
+            upstreamCalls += 1
+            for token in ("Hel", "lo"):
+                for handler in config["callbacks"]:
+                    handler.on_llm_new_token(token)
+                firstToken.set()
+                await asyncio.sleep(0.01)
+            return AIMessage(content="Hello")
+
+        leader = asyncio.create_task(coalescer.run("key", "hi", {}, call))
+        await firstToken.wait()
+        recorder = TokenRecorder()
+        follower = await coalescer.run("key", "hi", {"callbacks": [recorder]}, call)
+        assert (await leader).content == follower.content == "Hello"
+        assert upstreamCalls == 1
+        assert recorder.tokens == ["Hel", "lo"]
+        assert len(coalescer) == 0
+
+    asyncio.run(main())
+
+
+def test_coalescer_cancels_upstream_when_last_waiter_leaves():
+    async def main():
+        coalescer = LlmCoalescer()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def call(config) -> AIMessage:
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return AIMessage(content="late")
+
+        first = asyncio.create_task(coalescer.run("key", "hi", {}, call))
+        await started.wait()
+        second = asyncio.create_task(coalescer.run("key", "hi", {}, call))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled.is_set() and len(coalescer) == 1
+
+        second.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert len(coalescer) == 0
+        for task in (first, second):
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+# test_salesNode.py
+
+import asyncio
+import json
+import sqlite3
+from typing import Optional
+import app.nodes.salesNode as salesNode
+from app.nodes.salesNode import SqlDb, loadSalesTemplates, templatedAnswer
+from app.utility import GraphState, OrderDetails
+
+
+def graphState(query: str, orderId: Optional[str]) -> GraphState:
+    return GraphState(
+        history=[],
+        context=None,
+        response=None,
+        intent="Sales",
+        summary=None,
+        order=OrderDetails(orderId=orderId, orderItem=None),
+        status="",
+        userId="user",
+        requestId="request",
+        query=query,
+    )
+
+
+def orderRow(status: str) -> dict:
+    return {"orderId": "ORD-007", "orderItem": "Belt", "status": status, "location": "Shop"}
+
+
+def test_migrations_upgrade_a_database_with_duplicate_order_ids(tmp_path, monkeypatch):
+    path = tmp_path / "inventory.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " orderId TEXT, orderItem TEXT, status TEXT, location TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO orders (orderId, orderItem, status, location) VALUES (?, ?, ?, ?)",
+            [
+                ("ORD-001", "Laptop", "Delivered", "Hyderabad"),
+                ("ORD-001", "Laptop Bag", "Shipped", "Warehouse B"),
+                ("ORD-002", "Belt", "Processing", "Shop"),
+            ],
+        )
+    monkeypatch.setenv("SQLDB_PATH", str(path))
+
+    async def main():
+        db = SqlDb()
+        try:
+            orders = await db.fetch_orders(OrderDetails(orderId="ORD-001", orderItem=None))
+            byItem = await db.fetch_orders(OrderDetails(orderId=None, orderItem="laptop"))
+        finally:
+            await db.close()
+        return orders, byItem
+
+    orders, byItem = asyncio.run(main())
+    assert {o["orderItem"] for o in orders} == {"Laptop", "Laptop Bag"}
+    assert {o["orderItem"] for o in byItem} == {"Laptop", "Laptop Bag"}
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(salesNode.MIGRATIONS)
+        unique = conn.execute(
+            "SELECT [unique] FROM pragma_index_list('orders') WHERE name = 'idx_orders_orderId'"
+        ).fetchone()
+        assert unique == (0,)
+        matched = conn.execute(
+            "SELECT COUNT(*) FROM orders_fts WHERE orders_fts MATCH 'laptop'"
+        ).fetchone()
+        assert matched == (2,)
+
+
+def test_templated_answer_for_one_order_by_id():
+    answer = templatedAnswer(graphState("where is ORD-007?", "ORD-007"), [orderRow("Shipped")])
+    assert answer == "Your order ORD-007 (Belt) has been shipped and is currently at Shop."
+
+
+def test_templated_answer_falls_back_to_default_template():
+    answer = templatedAnswer(graphState("status of ORD-007", "ORD-007"), [orderRow("Lost")])
+    assert answer == "Your order ORD-007 (Belt) is Lost, location: Shop."
+
+
+def test_templated_answer_leaves_other_questions_to_the_llm():
+    assert templatedAnswer(graphState("refund ORD-007", "ORD-007"), [orderRow("Shipped")]) is None
+    assert templatedAnswer(graphState("my belt", None), [orderRow("Shipped")]) is None
+    rows = [orderRow("Shipped"), orderRow("Delivered")]
+    assert templatedAnswer(graphState("where is ORD-007", "ORD-007"), rows) is None
+
+
+def test_broken_template_is_answered_by_the_llm(tmp_path, monkeypatch):
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps({"Shipped": "Order {orderId} arrives {eta}.", "Lost": "{"}))
+    monkeypatch.setenv("SALES_TEMPLATES_PATH", str(path))
+    templates = loadSalesTemplates()
+    assert templates["Shipped"] is None and templates["Lost"] is None
+    assert templates["Delivered"] == salesNode.DEFAULT_SALES_TEMPLATES["Delivered"]
+
+    monkeypatch.setattr(salesNode, "SALES_TEMPLATES", templates)
+    state = graphState("where is ORD-007", "ORD-007")
+    assert templatedAnswer(state, [orderRow("Shipped")]) is None
+    assert templatedAnswer(state, [orderRow("Lost")]) is None
@@ -0,0 +1,108 @@
+# test_socketSession.py
+
+import asyncio
+import app.socketSession as socketSession
+from app.socketSession import SocketSession
+from app.utility import SocketRequest
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.frames: list = []
+
+    async def send_json(self, data, mode: str = "text") -> None:
+        self.frames.append(data)
+
+
+def request(userId: str, requestId: str, status: str = "chat") -> SocketRequest:
+    return SocketRequest(
+        userId=userId, requestId=requestId, userName=None, message="hi", status=status
+    )
+
+
+def fakeRunGraph(events: list, delay: float):
+    async def runGraph(request: SocketRequest, ws) -> None:
+        events.append(("start", request.requestId))
+        await asyncio.sleep(delay)
+        events.append(("end", request.requestId))
+
+    return runGraph
+
+
+async def settle(session: SocketSession) -> None:
+    while session.inFlight:
+        await asyncio.sleep(0.005)
+
+
+def test_messages_of_one_user_run_in_order(monkeypatch):
+    events: list = []
+    monkeypatch.setattr(socketSession, "runGraph", fakeRunGraph(events, 0.02))
+
+    async def main():
+        session = SocketSession(FakeWebSocket())
+        for requestId in ("a1", "a2", "a3"):
+            await session.submit(request("alice", requestId))
+        await session.submit(request("bob", "b1"))
+        await settle(session)
+        await session.close()
+
+    asyncio.run(main())
+    alice = [event for event in events if event[1].startswith("a")]
+    assert alice == [
+        ("start", "a1"), ("end", "a1"),
+        ("start", "a2"), ("end", "a2"),
+        ("start", "a3"), ("end", "a3"),
+    ]
+    # Another user's thread doesn't wait behind alice's queue.
+    assert events.index(("start", "b1")) < events.index(("end", "a1"))
+
+
+def test_stop_cancels_only_that_user(monkeypatch):
+    events: list = []
+    monkeypatch.setattr(socketSession, "runGraph", fakeRunGraph(events, 0.2))
+    ws = FakeWebSocket()
+
+    async def main():
+        session = SocketSession(ws)
+        await session.submit(request("alice", "a1"))
+        await session.submit(request("alice", "a2"))
+        await session.submit(request("bob", "b1"))
+        await asyncio.sleep(0.01)
+        await session.submit(request("alice", "s1", status="stop"))
+        await settle(session)
+        await session.close()
+
+    asyncio.run(main())
+    assert ("end", "a1") not in events and ("start", "a2") not in events
+    assert ("end", "b1") in events
+    assert ws.frames == [
+        {"status": "stop", "content": "Stopped 2 running request(s).", "requestId": "s1"}
+    ]
+
+
+def test_new_cancels_and_rotates_the_thread(monkeypatch):
+    events: list = []
+    rotated: list = []
+
+    class FakeStore:
+        async def rotate(self, userId: str) -> str:
+            rotated.append(userId)
+            return "thread-2"
+
+    monkeypatch.setattr(socketSession, "runGraph", fakeRunGraph(events, 0.2))
+    monkeypatch.setattr(socketSession, "sessionStore", FakeStore)
+    ws = FakeWebSocket()
+
+    async def main():
+        session = SocketSession(ws)
+        await session.submit(request("alice", "a1"))
+        await asyncio.sleep(0.01)
+        await session.submit(request("alice", "n1", status="new"))
+        await settle(session)
+        await session.close()
+
+    asyncio.run(main())
+    assert rotated == ["alice"]
+    assert ("end", "a1") not in events
+    assert ws.frames[-1]["status"] == "new"
+    assert ws.frames[-1]["requestId"] == "n1"